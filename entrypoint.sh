@@ -7,6 +7,7 @@ until pg_isready -h db -p 5432 -U "$DB_USER" > /dev/null 2>&1; do
 done
 echo "PostgreSQL is ready!"
 
+# ассеты собраны в образе (ASSETS_DIR); тут только копия в staticfiles/ для nginx, без сети
 python manage.py collectstatic --noinput
 python manage.py migrate --noinput
 
@@ -17,6 +18,19 @@ if [ -f /app/db.json ]; then
   python manage.py loaddata /app/db.json || true
 fi
 
+# SERVER_MODE=asgi — uvicorn-воркеры и async-вьюхи (pages/async_views.py);
+# потоки там не нужны, параллельность даёт event loop
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+  echo "Starting Gunicorn (ASGI, uvicorn workers)..."
+  exec gunicorn furniture_site.asgi:application \
+      -k uvicorn_worker.UvicornWorker \
+      --bind 0.0.0.0:8000 \
+      --workers 4 \
+      --timeout 120 \
+      --access-logfile - \
+      --error-logfile -
+fi
+
 echo "Starting Gunicorn..."
 exec gunicorn furniture_site.wsgi:application \
     --bind 0.0.0.0:8000 \
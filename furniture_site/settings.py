@@ -26,12 +26,14 @@ except Exception:
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-et&nwv4aiy%b860*563*^))h)n+md=z32bmvbcjqj0^9z5kjho'
+SECRET_KEY = os.getenv("SECRET_KEY", 'django-insecure-et&nwv4aiy%b860*563*^))h)n+md=z32bmvbcjqj0^9z5kjho')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# из .env (DEBUG=False в проде); без переменной — dev
+DEBUG = os.getenv("DEBUG", "True").lower() in ("1", "true", "yes")
 
-ALLOWED_HOSTS = []
+# в проде — список хостов из .env; в dev без переменной — любой
+ALLOWED_HOSTS = [h.strip() for h in os.getenv("ALLOWED_HOSTS", "").split(",") if h.strip()] or (["*"] if DEBUG else [])
 
 
 # Application definition
@@ -43,10 +45,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'pages',
    "django_summernote",]
 
 MIDDLEWARE = [
+    'pages.timing.TimingMiddleware',  # первыми — время всего запроса; при *_SAMPLE=0 выключены
+    'pages.tracing.TraceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,15 +63,23 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'furniture_site.urls'
 
+# Шаблоны разбираются один раз на процесс (cached.Loader) — при любом DEBUG.
+# runserver сам сбрасывает кеш при правке шаблона; TEMPLATE_CACHE=0 — читать
+# с диска на каждый рендер (правки без рестарта под gunicorn, замеры в manage.py bench_templates).
+TEMPLATE_CACHE = os.getenv("TEMPLATE_CACHE", "1") == "1"
+_TEMPLATE_LOADERS = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+
 TEMPLATES = [{
-    'BACKEND':'django.template.backends.django.DjangoTemplates',
+    'BACKEND':'pages.timing.Templates',  # DjangoTemplates + время рендера в Server-Timing
     'DIRS':[BASE_DIR/'pages'/'templates'],
-    'APP_DIRS':True,
-    'OPTIONS':{'context_processors':[
+    'OPTIONS':{
+      'loaders':[('django.template.loaders.cached.Loader', _TEMPLATE_LOADERS)] if TEMPLATE_CACHE else _TEMPLATE_LOADERS,
+      'context_processors':[
         'django.template.context_processors.debug',
         'django.template.context_processors.request',
         'django.contrib.auth.context_processors.auth',
         'django.contrib.messages.context_processors.messages',
+        'pages.content.active_content',
     ]},
 }]
 
@@ -84,9 +97,34 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
         "HOST": os.getenv("POSTGRES_HOST", "localhost"),
         "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        # постоянные соединения: не платим connect+auth на каждый запрос,
+        # битые отсеивает health check перед переиспользованием
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# DB_POOL=1 — пул psycopg 3 на процесс (gunicorn: max_size >= --threads).
+# С пулом соединения держит он, CONN_MAX_AGE должен быть 0.
+if os.getenv("DB_POOL", "0") == "1":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "4")),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        },
+    }
+
+# SERVER_MODE=asgi (entrypoint.sh) — uvicorn-воркеры под gunicorn и async-вьюхи
+# (pages/async_views.py). Запросы к БД там идут из потоков sync_to_async, которые
+# живут по запросу: постоянные соединения не переиспользуются, а копятся.
+# Соединения держит пул (DB_POOL=1), CONN_MAX_AGE — 0.
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "1" if SERVER_MODE == "asgi" else "0") == "1"
+if SERVER_MODE == "asgi":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -135,7 +173,6 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
-ALLOWED_HOSTS = ["*"]
 SECURE_SSL_REDIRECT = False
 
 SECURE_HSTS_SECONDS = 31536000
@@ -149,11 +186,96 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 STATIC_URL = '/static/'
-STATICFILES_DIRS = [BASE_DIR/'pages'/'static']
+# собранные ассеты (manage.py build_assets): в образе — ASSETS_DIR вне /app, его не перекрывает
+# bind-mount из docker-compose; пусто — прямо в pages/static
+ASSETS_DIR = os.getenv("ASSETS_DIR", "")
+STATICFILES_DIRS = [BASE_DIR/'pages'/'static', *([ASSETS_DIR] if ASSETS_DIR else [])]
 STATIC_ROOT = BASE_DIR/'staticfiles'
 
+# manage.py build_assets: путь к Tailwind CLI (пусто — скачается в .cache/)
+TAILWIND_CLI = os.getenv("TAILWIND_CLI", "")
+
+# хеши содержимого в именах статики — nginx отдаёт их с вечным кешем
+if os.getenv("STATIC_MANIFEST", "0") == "1":
+    STORAGES = {
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage"},
+    }
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR/'media'
+# за nginx: отдавать защищённые файлы через X-Accel-Redirect на эту internal-локацию (pages/sendfile.py);
+# пусто — FileResponse из Python (dev)
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "")
+
+# рендишены картинок (pages/thumbs.py, {% srcset %})
+THUMB_WIDTHS = (480, 960, 1440, 1920)
+THUMB_FORMATS = ("avif", "webp")
+THUMB_DIR = "renditions"  # внутри MEDIA_ROOT; upload_to моделей сюда не пишут
+
+# обработка загрузок (pages/images.py): sync — сразу в процессе, queue — manage.py image_worker
+IMAGE_JOBS_MODE = os.getenv("IMAGE_JOBS_MODE", "sync")
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "2560"))   # px, больше — ужимаем оригинал
+IMAGE_JOB_STALE = 600                                      # сек в running — считаем воркер упавшим
+IMAGE_JOB_MAX_ATTEMPTS = 3
+
+# Cache
+# Общий Redis на все воркеры gunicorn (троттлинг заявок, кеш страниц).
+# Без REDIS_URL — LocMem на процесс, для локальной разработки.
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "pages.timing.RedisCache",  # джанговские + время операций (pages/timing.py)
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "ulvis",
+            "OPTIONS": {"socket_connect_timeout": 1, "socket_timeout": 1},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "pages.timing.LocMemCache",
+        }
+    }
+
+# кеш отрендеренных страниц (pages/pagecache.py), сек; 0 — выключить
+PAGE_CACHE_TIMEOUT = int(os.getenv("PAGE_CACHE_TIMEOUT", "300"))
+
+# кеш кусков шаблонов {% fragment %} (pages/templatetags/fragments.py), сек; 0 — выключить
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", "3600"))
+
+# пагинация каталога: "offset" (номера страниц) или "keyset" (курсоры, pages/keyset.py)
+CATALOG_PAGINATION = os.getenv("CATALOG_PAGINATION", "offset")
+
+# троттлинг формы заявки (pages/views.py); 0 — только для нагрузочных прогонов
+LEAD_THROTTLE = os.getenv("LEAD_THROTTLE", "1") == "1"
+
+# запись трафика для python -m loadtest replay (pages/tracing.py): доля запросов, 0 — выключено
+TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", "0"))
+TRACE_DIR = os.getenv("TRACE_DIR", str(BASE_DIR / "traces"))
+TRACE_EXCLUDE = ("/admin/", "/static/", "/media/")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))  # на файл процесса
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "5"))
+TRACE_BUFFER = 200   # строк в буфере до записи
+TRACE_FLUSH = 5.0    # сек, не реже
+
+# замеры запросов (pages/timing.py): доля запросов с Server-Timing, логом и /metrics; 0 — выключено
+TIMING_SAMPLE = float(os.getenv("TIMING_SAMPLE", "0"))
+TIMING_HEADER = os.getenv("TIMING_HEADER", "1") == "1"
+TIMING_LOG = os.getenv("TIMING_LOG", "1") == "1"
+TIMING_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # сек, гистограмма /metrics
+TIMING_FLUSH = 10.0  # сек, как часто процесс сливает счётчики в Redis
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # если задан — /metrics только с Authorization: Bearer
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"raw": {"format": "%(message)s"}},
+    "handlers": {"timing": {"class": "logging.StreamHandler", "formatter": "raw"}},
+    # строки JSON с замерами — в stderr gunicorn, как access-лог
+    "loggers": {"pages.timing": {"handlers": ["timing"], "level": "INFO", "propagate": False}},
+}
 
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -167,4 +289,20 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 BITRIX_WEBHOOK_URL = os.getenv("BITRIX_WEBHOOK_URL", "https://b24-s3qp8z.bitrix24.ru/rest/1/zpd85dbkoyt8oj04").rstrip("/")  # типа https://your.bitrix24.ru/rest/1/XXXXXX
 BITRIX_DEFAULT_SOURCE_ID = os.getenv("BITRIX_SOURCE_ID", "WEB")       # Источник
 BITRIX_PIPELINE_ID = os.getenv("BITRIX_PIPELINE_ID", "")              # если нужно воронку/направление
-BITRIX_ASSIGNED_BY_ID = int(os.getenv("BITRIX_ASSIGNED_BY_ID", "0"))  # ответственный
\ No newline at end of file
+BITRIX_ASSIGNED_BY_ID = int(os.getenv("BITRIX_ASSIGNED_BY_ID", "0"))  # ответственный
+
+# HTTP-клиент вебхука (pages.bitrix.BitrixClient)
+BITRIX_CONNECT_TIMEOUT = float(os.getenv("BITRIX_CONNECT_TIMEOUT", "2"))
+BITRIX_READ_TIMEOUT = float(os.getenv("BITRIX_READ_TIMEOUT", "4"))
+BITRIX_POOL_MAXSIZE = int(os.getenv("BITRIX_POOL_MAXSIZE", "8"))
+BITRIX_BREAKER_THRESHOLD = int(os.getenv("BITRIX_BREAKER_THRESHOLD", "5"))   # ошибок подряд
+BITRIX_BREAKER_COOLDOWN = float(os.getenv("BITRIX_BREAKER_COOLDOWN", "30"))  # сек
+
+# очередь доставки заявок (pages/delivery.py, manage.py bitrix_worker)
+BITRIX_DELIVERY_MAX_ATTEMPTS = int(os.getenv("BITRIX_DELIVERY_MAX_ATTEMPTS", "8"))
+BITRIX_DELIVERY_BACKOFF = int(os.getenv("BITRIX_DELIVERY_BACKOFF", "30"))          # сек, удваивается с каждой попыткой
+BITRIX_DELIVERY_BACKOFF_MAX = int(os.getenv("BITRIX_DELIVERY_BACKOFF_MAX", "3600"))
+
+# выгрузка заявок в файл (pages/export.py, manage.py export_worker)
+EXPORT_JOB_STALE = int(os.getenv("EXPORT_JOB_STALE", "1800"))  # сек, running дольше — воркер умер
+SITE_URL = os.getenv("SITE_URL", "http://localhost:8000")       # для ссылок в письмах
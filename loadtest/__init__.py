@@ -0,0 +1,20 @@
+# loadtest/__init__.py
+"""
+Нагрузочный инструмент: N процессов с общим стартом, латентность в
+HDR-гистограмме, closed loop или open loop с постоянным темпом,
+соединения потоками или в asyncio. Цели — Redis (GET/SET по заранее
+сгенерированному плану, см. loadtest/plans.py; поштучно или пачками,
+на один узел, шарды или кластер) и страницы сайта, включая POST /lead/
+с CSRF, или повтор трафика, записанного pages/tracing.py.
+Отчёт — JSON; отчёты одновременных прогонов с нескольких машин
+складываются (python -m loadtest merge). Перебор maxmemory и политик
+вытеснения на одном плане — loadtest/sweep.py (python -m loadtest sweep).
+
+    python -m loadtest redis --processes 4 --duration 30 --rate 20000
+    python -m loadtest redis --local-cluster 3 --pipeline 32 --connections 8 --mode asyncio
+    python -m loadtest http --url http://127.0.0.1:8000 \\
+        --routes "/=5,/catalog/=3,POST /lead/=1" --processes 8 --rate 300
+"""
+from .hdr import Histogram, Series  # noqa: F401
+from .runner import merge, run  # noqa: F401
+from .targets import HttpTarget, RedisTarget, ReplayTarget, Target, load_trace  # noqa: F401
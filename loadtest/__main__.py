@@ -0,0 +1,136 @@
+import argparse
+import json
+import sys
+from contextlib import nullcontext
+
+from .runner import merge, run
+from .targets import HttpTarget, RedisTarget, ReplayTarget, load_trace
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m loadtest", description="Нагрузочный прогон: Redis или страницы сайта.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    def common(p):
+        p.add_argument("--processes", type=int, default=1)
+        p.add_argument("--connections", type=int, default=1, help="Соединений на процесс")
+        p.add_argument("--mode", choices=["thread", "asyncio"], default="thread",
+                       help="Как процесс ведёт свои соединения: потоки или один цикл asyncio")
+        p.add_argument("--interval", type=float, default=1.0, help="Шаг ряда ops/s и p99, сек")
+        p.add_argument("--duration", type=float, default=60.0, help="сек (replay — по умолчанию длина трейса)")
+        p.add_argument("--rate", type=float, default=0.0,
+                       help="Операций в секунду на все процессы (open loop); 0 — closed loop")
+        p.add_argument("--out", help="Записать JSON в файл вместо stdout")
+
+    def plan_args(p):
+        p.add_argument("--n-keys", type=int, default=200_000)
+        p.add_argument("--value-size", type=int, default=1024)
+        p.add_argument("--read-p", type=float, default=0.8)
+        p.add_argument("--distribution", choices=["zipf", "random", "sequential", "hotspot"], default="zipf")
+        p.add_argument("--zipf-s", type=float, default=1.2)
+        p.add_argument("--hot-fraction", type=float, default=0.2, help="hotspot: доля горячих ключей")
+        p.add_argument("--hot-p", type=float, default=0.8, help="hotspot: доля операций в горячие ключи")
+        p.add_argument("--seed", type=int)
+        p.add_argument("--plan-size", type=int, default=1_000_000, help="Операций в плане (по кругу)")
+        p.add_argument("--plan", help=".npz: взять план оттуда, если есть, иначе сохранить туда")
+        p.add_argument("--pipeline", type=int, default=1, help="Команд в одной пачке (pipeline)")
+
+    p = sub.add_parser("redis", help="GET/SET по ключам k:<n>")
+    common(p)
+    p.add_argument("--url", default="redis://127.0.0.1:6379/0")
+    plan_args(p)
+    p.add_argument("--populate", choices=["auto", "always", "never"], default="auto")
+    nodes = p.add_mutually_exclusive_group()
+    nodes.add_argument("--shards", help="URL независимых узлов через запятую; ключи раскладывает клиент по слотам")
+    nodes.add_argument("--cluster", action="store_true", help="--url — узел Redis Cluster, раскладка из CLUSTER SLOTS")
+    nodes.add_argument("--local-shards", type=int, metavar="N", help="Поднять N локальных redis-server как шарды")
+    nodes.add_argument("--local-cluster", type=int, metavar="N", help="Поднять локальный кластер из N мастеров")
+
+    p = sub.add_parser("http", help="Страницы сайта; на сервере LEAD_THROTTLE=0, если есть POST /lead/")
+    common(p)
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--routes", default="/=5,/catalog/=3,/contacts/=1,POST /lead/=1",
+                   help='"[МЕТОД ]путь[=вес]" через запятую')
+    p.add_argument("--timeout", type=float, default=30.0)
+
+    p = sub.add_parser("replay", help="Повторить трафик, записанный pages/tracing.py (TRACE_SAMPLE)")
+    common(p)
+    p.set_defaults(duration=None)
+    p.add_argument("trace", nargs="+", help="Файлы trace-*.jsonl (можно маской)")
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--speed", type=float, default=1.0, help="Ускорение: 2 — вдвое плотнее записанного")
+    p.add_argument("--timeout", type=float, default=30.0)
+
+    p = sub.add_parser("sweep", help="maxmemory × политика вытеснения на локальных redis-server, один план")
+    common(p)
+    plan_args(p)
+    p.add_argument("--maxmemory", default="8mb,16mb,32mb,64mb", help="Размеры через запятую; 0 — без лимита")
+    p.add_argument("--policies", help="Через запятую; по умолчанию allkeys-lru,allkeys-lfu,volatile-ttl,noeviction")
+    p.add_argument("--ttl", type=int, default=3600, help="EX для SET — иначе volatile-* не вытесняют")
+    p.add_argument("--csv", help="Строки таблицы в CSV — для графика")
+
+    p = sub.add_parser("merge", help="Сложить JSON-отчёты одновременных прогонов")
+    p.add_argument("reports", nargs="+")
+    p.add_argument("--out")
+
+    args = ap.parse_args(argv)
+    if args.cmd == "merge":
+        reports = []
+        for path in args.reports:
+            with open(path, encoding="utf-8") as f:
+                reports.append(json.load(f))
+        result = merge(*reports)
+    elif args.cmd == "sweep":
+        from . import sweep
+        policies = args.policies.split(",") if args.policies else sweep.POLICIES
+        result = sweep.sweep(args.maxmemory.split(","), policies, plan_path=args.plan, ttl=args.ttl,
+                             processes=args.processes, connections=args.connections, duration=args.duration,
+                             rate=args.rate, mode=args.mode, interval=args.interval, **target_args(args))
+        sys.stderr.write(sweep.table(result["rows"]) + "\n")
+        if args.csv:
+            sweep.write_csv(result["rows"], args.csv)
+        errors = [e for row in result["rows"] for e in row["errors"]]
+        if errors:
+            result["errors"] = errors
+    else:
+        local = nullcontext()
+        if args.cmd == "redis":
+            from . import servers
+            if args.local_shards:
+                local = servers.local_shards(args.local_shards)
+            elif args.local_cluster:
+                local = servers.local_cluster(args.local_cluster)
+            target = RedisTarget(url=args.url, populate=args.populate, plan_path=args.plan, **target_args(args),
+                                 shards=args.shards.split(",") if args.shards else None, cluster=args.cluster)
+        elif args.cmd == "replay":
+            target = ReplayTarget(base_url=args.url, trace=load_trace(args.trace), speed=args.speed,
+                                  timeout=args.timeout)
+            if args.duration is None:
+                args.duration = target.span + 1.0  # весь трейс и секунда на последние ответы
+        else:
+            target = HttpTarget(base_url=args.url, routes=args.routes, timeout=args.timeout)
+        with local as nodes:
+            if args.cmd == "redis" and args.local_shards:
+                target.shards = [node.url for node in nodes]
+            elif args.cmd == "redis" and args.local_cluster:
+                target.url, target.cluster = nodes[0].url, True
+            result = run(target, processes=args.processes, connections=args.connections, duration=args.duration,
+                         rate=args.rate, mode=args.mode, interval=args.interval)
+
+    text = json.dumps(result, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+    return 1 if result.get("errors") else 0
+
+
+def target_args(args) -> dict:
+    return {"n_keys": args.n_keys, "value_size": args.value_size, "read_p": args.read_p,
+            "distribution": args.distribution, "zipf_s": args.zipf_s, "hot_fraction": args.hot_fraction,
+            "hot_p": args.hot_p, "seed": args.seed, "plan_size": args.plan_size, "pipeline": args.pipeline}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
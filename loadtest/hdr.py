@@ -0,0 +1,154 @@
+# loadtest/hdr.py
+"""
+Гистограмма латентности в духе HdrHistogram: целые микросекунды,
+лог-линейные корзины с точностью ~0.1% (3 значащие цифры) на всём
+диапазоне. Память постоянная (~27 тыс. счётчиков до 19 часов),
+запись — пара битовых операций, гистограммы процессов складываются
+без потерь. Вместо списка всех задержек и sort() в конце.
+"""
+SUB_BITS = 11
+SUB_COUNT = 1 << SUB_BITS    # до 2048 мкс — точно, по корзине на микросекунду
+HALF = SUB_COUNT >> 1        # дальше — 1024 корзины на каждую степень двойки
+MAX_SHIFT = 25               # верхняя граница ~2^36 мкс
+SIZE = SUB_COUNT + MAX_SHIFT * HALF
+HIGHEST = ((SUB_COUNT << MAX_SHIFT) - 1)
+
+
+def bucket_of(value: int) -> int:
+    if value < SUB_COUNT:
+        return value if value > 0 else 0
+    value = min(value, HIGHEST)
+    shift = value.bit_length() - SUB_BITS
+    return SUB_COUNT + (shift - 1) * HALF + (value >> shift) - HALF
+
+
+def highest_equivalent(bucket: int) -> int:
+    """Верхняя граница корзины: перцентили отдаём с округлением вверх, как Hdr."""
+    if bucket < SUB_COUNT:
+        return bucket
+    shift, sub = divmod(bucket - SUB_COUNT, HALF)
+    shift += 1
+    return ((sub + HALF + 1) << shift) - 1
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "min", "max", "sum")
+
+    def __init__(self):
+        self.counts = [0] * SIZE
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.sum = 0
+
+    def record(self, us: int, count: int = 1) -> None:
+        self.counts[bucket_of(us)] += count
+        self.total += count
+        self.sum += us * count
+        if us > self.max:
+            self.max = us
+        if self.min is None or us < self.min:
+            self.min = us
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        return self
+
+    def percentile(self, q: float) -> int:
+        """q в процентах (99.9), мкс."""
+        if not self.total:
+            return 0
+        rank = max(1, round(self.total * q / 100.0))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c:
+                seen += c
+                if seen >= rank:
+                    return min(highest_equivalent(i), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """Сводка в миллисекундах — то, что кладём в отчёт."""
+        ms = lambda us: round(us / 1000.0, 3)  # noqa: E731
+        out = {"count": self.total, "min": ms(self.min or 0), "mean": ms(self.sum / self.total if self.total else 0)}
+        for q in (50, 90, 99, 99.9):
+            out[f"p{q:g}"] = ms(self.percentile(q))
+        out["max"] = ms(self.max)
+        return out
+
+    def to_dict(self) -> dict:
+        # разреженно: [корзина, счётчик] только для непустых
+        return {"buckets": [[i, c] for i, c in enumerate(self.counts) if c],
+                "total": self.total, "min": self.min, "max": self.max, "sum": self.sum}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        h = cls()
+        for i, c in data["buckets"]:
+            h.counts[i] = c
+        h.total, h.min, h.max, h.sum = data["total"], data["min"], data["max"], data["sum"]
+        return h
+
+
+def _sparse_percentile(buckets: dict, total: int, q: float) -> int:
+    rank, seen = max(1, round(total * q / 100.0)), 0
+    for b in sorted(buckets):
+        seen += buckets[b]
+        if seen >= rank:
+            return highest_equivalent(b)
+    return 0
+
+
+class Series:
+    """
+    Временной ряд по интервалам от общего старта: на интервал — разреженная
+    гистограмма {корзина: счётчик}. Даёт ops/s и p99 по секундам — там видно
+    провалы (вытеснение, упор в maxmemory), которые итоговая сводка усредняет.
+    """
+    __slots__ = ("interval", "buckets")
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.buckets = {}
+
+    def record(self, index: int, us: int, count: int = 1) -> None:
+        b = self.buckets.get(index)
+        if b is None:
+            b = self.buckets[index] = {}
+        k = bucket_of(us)
+        b[k] = b.get(k, 0) + count
+
+    def merge(self, other: "Series") -> "Series":
+        for index, other_b in other.buckets.items():
+            b = self.buckets.setdefault(index, {})
+            for k, c in other_b.items():
+                b[k] = b.get(k, 0) + c
+        return self
+
+    def summary(self) -> list[dict]:
+        out = []
+        for index in sorted(self.buckets):
+            b = self.buckets[index]
+            ops = sum(b.values())
+            out.append({"t": round(index * self.interval, 3), "ops": ops, "ops_s": round(ops / self.interval, 1),
+                        "p50_ms": round(_sparse_percentile(b, ops, 50) / 1000.0, 3),
+                        "p99_ms": round(_sparse_percentile(b, ops, 99) / 1000.0, 3)})
+        return out
+
+    def to_dict(self) -> dict:
+        return {"interval": self.interval,
+                "buckets": {str(i): [[k, c] for k, c in sorted(b.items())] for i, b in sorted(self.buckets.items())}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Series":
+        s = cls(data["interval"])
+        s.buckets = {int(i): {k: c for k, c in b} for i, b in data["buckets"].items()}
+        return s
@@ -0,0 +1,108 @@
+# loadtest/plans.py
+"""
+Заранее сгенерированные планы операций для RedisTarget.
+
+Раньше каждая операция сама тянула random.random(), считала pow для
+zipf и форматировала f"k:{idx}" — генератор упирался в себя раньше,
+чем в Redis. Теперь миллионы пар (операция, ключ) сэмплируются NumPy
+одним вызовом в компактные массивы (uint8 + uint32), ключи кодируются
+в bytes один раз на уникальный ключ, значение для SET — один общий
+memoryview. В горячем цикле остаётся индексирование списков и сама
+команда.
+
+План детерминирован при заданном seed и сохраняется в .npz — один и
+тот же трейс можно прогнать против разных конфигураций Redis.
+"""
+import json
+from operator import itemgetter
+
+import numpy as np
+
+DISTRIBUTIONS = ("zipf", "random", "sequential", "hotspot")
+
+
+def zipf_cdf(n: int, s: float) -> np.ndarray:
+    """CDF конечного Zipf на 1..n с точным показателем s (в т.ч. s <= 1, где numpy.zipf не годится)."""
+    weights = np.arange(1, n + 1, dtype=np.float64) ** -s
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    return cdf
+
+
+def sample_keys(distribution: str, n_keys: int, size: int, rng: np.random.Generator, *,
+                zipf_s: float = 1.2, hot_fraction: float = 0.2, hot_p: float = 0.8) -> np.ndarray:
+    """Индексы ключей 0..n_keys-1; у zipf и hotspot горячие — младшие."""
+    if distribution == "zipf":
+        return np.searchsorted(zipf_cdf(n_keys, zipf_s), rng.random(size), side="right").astype(np.uint32)
+    if distribution == "random":
+        return rng.integers(0, n_keys, size, dtype=np.uint32)
+    if distribution == "sequential":
+        return (np.arange(size, dtype=np.uint64) % n_keys).astype(np.uint32)
+    if distribution == "hotspot":
+        # hot_p операций — в первые hot_fraction ключей, остальное — равномерно по прочим
+        hot = max(1, min(n_keys - 1, int(n_keys * hot_fraction)))
+        in_hot = rng.random(size) < hot_p
+        return np.where(in_hot, rng.integers(0, hot, size), rng.integers(hot, n_keys, size)).astype(np.uint32)
+    raise ValueError(f"unknown distribution: {distribution}")
+
+
+class Plan:
+    """sets[i] — SET (иначе GET), keys[i] — индекс ключа k:<n>."""
+
+    def __init__(self, sets: np.ndarray, keys: np.ndarray, meta: dict):
+        self.sets, self.keys, self.meta = sets, keys, meta
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, distribution: str = "zipf", n_keys: int = 200_000, size: int = 1_000_000, read_p: float = 0.8,
+              seed: int | None = None, **params) -> "Plan":
+        rng = np.random.default_rng(seed)
+        keys = sample_keys(distribution, n_keys, size, rng, **params)
+        sets = (rng.random(size) >= read_p).astype(np.uint8)
+        meta = {"distribution": distribution, "n_keys": n_keys, "size": size, "read_p": read_p, "seed": seed, **params}
+        return cls(sets, keys, meta)
+
+    def save(self, path: str):
+        np.savez_compressed(path, sets=self.sets, keys=self.keys, meta=np.array(json.dumps(self.meta)))
+
+    @classmethod
+    def load(cls, path: str) -> "Plan":
+        with np.load(path) as data:
+            return cls(data["sets"], data["keys"], json.loads(str(data["meta"])))
+
+    def describe(self) -> dict:
+        return {**self.meta, "unique_keys": int(len(np.unique(self.keys))), "set_share": round(float(self.sets.mean()), 4)}
+
+    def materialize(self, offset: int = 0) -> tuple[list[bool], tuple[bytes, ...]]:
+        """
+        Для горячего цикла: флаги SET и ключи как объекты Python, начиная
+        с offset (по кругу). Ключ кодируется один раз — дальше в списке
+        ссылки на один и тот же bytes.
+        """
+        offset %= len(self)
+        keys = np.roll(self.keys, -offset)
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        encoded = [b"k:%d" % i for i in uniq.tolist()]
+        keys = itemgetter(*inverse.tolist())(encoded) if len(inverse) > 1 else (encoded[0],)
+        return np.roll(self.sets, -offset).astype(bool).tolist(), keys
+
+    def _node_ids(self, owner: np.ndarray) -> np.ndarray:
+        """Узел для каждой позиции плана: слот CRC16 считаем один раз на уникальный ключ."""
+        from redis.crc import key_slot
+        uniq, inverse = np.unique(self.keys, return_inverse=True)
+        slots = np.fromiter((key_slot(b"k:%d" % i) for i in uniq.tolist()), dtype=np.int64, count=len(uniq))
+        return owner[slots][inverse]
+
+    def nodes(self, owner: np.ndarray) -> list[int]:
+        return self._node_ids(owner).tolist()
+
+    def node_share(self, owner: np.ndarray, n: int) -> list[float]:
+        """Доля операций на каждый узел — перекос горячих ключей виден до прогона."""
+        return [round(float(x), 4) for x in np.bincount(self._node_ids(owner), minlength=n) / len(self)]
+
+
+def payload(value_size: int) -> memoryview:
+    """Одно значение на все SET: redis-py пишет memoryview в сокет без копии в bytes."""
+    return memoryview(b"a" * value_size)
@@ -0,0 +1,347 @@
+# loadtest/runner.py
+"""
+N процессов-воркеров с общим стартом, в каждом — connections соединений.
+
+Каждый воркер открывает соединения, ждёт остальных на барьере и
+стартует в один и тот же момент (time.time() общий, дальше каждый
+считает по своему perf_counter_ns). Соединения внутри процесса — потоки
+(mode="thread") или корутины одного цикла asyncio (mode="asyncio", цели
+с aconnect/aop). Режимы нагрузки:
+
+* closed loop (rate=0) — следующая операция сразу после ответа;
+  столько, сколько вытянет цель;
+* open loop (rate>0) — операции по расписанию с постоянным темпом
+  или по графику самой цели (повтор записанного трейса, schedule()).
+  Латентность считается от запланированного момента, а не от
+  фактической отправки: если цель встала, очередь опоздавших операций
+  попадает в гистограмму (coordinated omission), а не прячется.
+  Время самой операции — отдельно, в service.
+
+Если op() отправляет пачку (target.batch > 1, pipeline), каждая её
+операция получает время всей пачки: так честно сравнивать с поштучной
+отправкой. Время пачек целиком — отдельно, в batch. Кроме итоговой
+сводки — ряд по интервалам (ops/s, p50/p99) и, если цель умеет
+snapshot(), снимки сервера с тем же шагом.
+"""
+import asyncio
+import copy
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+from .hdr import Histogram, Series
+
+START_DELAY = 0.2  # сек от прохода барьера до старта — успеть всем проснуться
+
+
+class _Stats:
+    """Счётчики одного соединения."""
+
+    def __init__(self, batch: int, open_loop: bool, interval: float):
+        self.latency, self.series = Histogram(), Series(interval)
+        self.service = Histogram() if open_loop else None
+        self.batch = Histogram() if batch > 1 else None
+        self.interval_ns = interval * 1e9
+        self.outcomes, self.ops, self.elapsed = {}, 0, 0.0
+
+    def record(self, res, t0: int, done: int, planned: int, start: int) -> None:
+        outcomes = self.outcomes
+        if isinstance(res, dict):
+            n = 0
+            for k, v in res.items():
+                outcomes[k] = outcomes.get(k, 0) + v
+                n += v
+        else:
+            n = 1
+            outcomes[res] = outcomes.get(res, 0) + 1
+        if not n:
+            return
+        us = int(done - planned) // 1000
+        self.latency.record(us, n)
+        self.series.record(int((done - start) // self.interval_ns), us, n)
+        if self.service is not None:
+            self.service.record((done - t0) // 1000, n)
+        if self.batch is not None:
+            self.batch.record((done - t0) // 1000)
+        self.ops += n
+
+    def dump(self, worker: int) -> dict:
+        return {"worker": worker, "ops": self.ops, "elapsed": self.elapsed, "outcomes": self.outcomes,
+                "latency": self.latency.to_dict(), "series": self.series.to_dict(),
+                "service": self.service.to_dict() if self.service else None,
+                "batch": self.batch.to_dict() if self.batch else None}
+
+
+def _start_ns(start_at: float) -> int:
+    return time.perf_counter_ns() + int((start_at - time.time()) * 1e9)
+
+
+def _sync_start(barrier, start_at) -> float:
+    # все открыли соединения; один назначает общий старт, второй барьер — чтобы все его увидели
+    if barrier.wait() == 0:
+        start_at.value = time.time() + START_DELAY
+    barrier.wait()
+    return start_at.value
+
+
+def _worker(target, worker, processes, connections, duration, rate, mode, interval, barrier, start_at, results):
+    try:
+        target.open(worker, processes)
+        slots = processes * connections
+        # у каждого соединения своя копия цели: общий план, свои клиент и смещение
+        sessions = [(copy.copy(target), worker * connections + c) for c in range(connections)]
+        if mode == "asyncio":
+            stats = asyncio.run(_arun(sessions, slots, duration, rate, interval, barrier, start_at))
+        else:
+            stats = _run_threads(sessions, slots, duration, rate, interval, barrier, start_at)
+        total = stats[0]
+        for s in stats[1:]:
+            total.latency.merge(s.latency)
+            total.series.merge(s.series)
+            if total.service is not None:
+                total.service.merge(s.service)
+            if total.batch is not None:
+                total.batch.merge(s.batch)
+            for k, v in s.outcomes.items():
+                total.outcomes[k] = total.outcomes.get(k, 0) + v
+            total.ops += s.ops
+            total.elapsed = max(total.elapsed, s.elapsed)
+        out = total.dump(worker)
+    except Exception as e:
+        barrier.abort()
+        out = {"worker": worker, "error": f"{type(e).__name__}: {e}"}
+    results.put(out)
+
+
+def _run_threads(sessions, slots, duration, rate, interval, barrier, start_at) -> list:
+    for session, slot in sessions:
+        session.connect(slot, slots)
+    start = _sync_start(barrier, start_at)
+    if len(sessions) == 1:
+        session, slot = sessions[0]
+        stats = [_loop(session, slot, slots, duration, rate, interval, start)]
+    else:
+        stats, errors = [None] * len(sessions), []
+
+        def body(n, session, slot):
+            try:
+                stats[n] = _loop(session, slot, slots, duration, rate, interval, start)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=body, args=(n, s, slot)) for n, (s, slot) in enumerate(sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+    for session, _ in sessions:
+        session.close()
+    return stats
+
+
+def _schedule(target, slot, slots, rate, start, end):
+    """(номер операции, плановый момент в ns): свой график цели (повтор трейса) или ровный темп rate."""
+    own = target.schedule(slot, slots)
+    if own is not None:
+        for i, offset in own:
+            planned = start + offset
+            if planned >= end:
+                return
+            yield i, planned
+        return
+    batch = target.batch
+    step = 1e9 * batch * slots / rate
+    # соединения сдвинуты друг от друга на долю шага — суммарный поток ровный
+    planned, calls = start + step * slot / slots, 0
+    while planned < end:
+        yield calls * batch, planned
+        calls += 1
+        planned += step
+
+
+def _loop(target, slot, slots, duration, rate, interval, start_at) -> _Stats:
+    perf_ns = time.perf_counter_ns
+    start = _start_ns(start_at)
+    while perf_ns() < start:
+        time.sleep(max(0.0, (start - perf_ns()) / 1e9 - 0.001))
+    end = start + int(duration * 1e9)
+
+    batch, op = target.batch, target.op
+    if rate > 0 or target.scheduled:
+        stats = _Stats(batch, True, interval)
+        plan = _schedule(target, slot, slots, rate, start, end)
+        for i, planned in plan:
+            now = perf_ns()
+            if now >= end:
+                # цель не успевала: хвост расписания не отправлен — в исходы, а не молча
+                stats.outcomes["unsent"] = (1 + sum(1 for _ in plan)) * batch
+                break
+            if now < planned:
+                time.sleep((planned - now) / 1e9)
+            t0 = perf_ns()
+            res = op(i)
+            stats.record(res, t0, perf_ns(), planned, start)
+    else:
+        stats, calls = _Stats(batch, False, interval), 0
+        while True:
+            t0 = perf_ns()
+            if t0 >= end:
+                break
+            res = op(calls * batch)
+            stats.record(res, t0, perf_ns(), t0, start)
+            calls += 1
+    stats.elapsed = (perf_ns() - start) / 1e9
+    return stats
+
+
+async def _arun(sessions, slots, duration, rate, interval, barrier, start_at) -> list:
+    await asyncio.gather(*(session.aconnect(slot, slots) for session, slot in sessions))
+    start = _sync_start(barrier, start_at)  # блокирует цикл, но он и так ждёт только старта
+    try:
+        return await asyncio.gather(*(_aloop(session, slot, slots, duration, rate, interval, start)
+                                      for session, slot in sessions))
+    finally:
+        await asyncio.gather(*(session.aclose() for session, _ in sessions))
+
+
+async def _aloop(target, slot, slots, duration, rate, interval, start_at) -> _Stats:
+    perf_ns = time.perf_counter_ns
+    start = _start_ns(start_at)
+    await asyncio.sleep(max(0.0, (start - perf_ns()) / 1e9))
+    end = start + int(duration * 1e9)
+
+    batch, op = target.batch, target.aop
+    if rate > 0 or target.scheduled:
+        stats = _Stats(batch, True, interval)
+        plan = _schedule(target, slot, slots, rate, start, end)
+        for i, planned in plan:
+            now = perf_ns()
+            if now >= end:
+                stats.outcomes["unsent"] = (1 + sum(1 for _ in plan)) * batch
+                break
+            if now < planned:
+                await asyncio.sleep((planned - now) / 1e9)
+            t0 = perf_ns()
+            res = await op(i)
+            stats.record(res, t0, perf_ns(), planned, start)
+    else:
+        stats, calls = _Stats(batch, False, interval), 0
+        while True:
+            t0 = perf_ns()
+            if t0 >= end:
+                break
+            res = await op(calls * batch)
+            stats.record(res, t0, perf_ns(), t0, start)
+            calls += 1
+    stats.elapsed = (perf_ns() - start) / 1e9
+    return stats
+
+
+def run(target, *, processes: int = 1, connections: int = 1, duration: float = 10.0, rate: float = 0.0,
+        mode: str = "thread", interval: float = 1.0, timeout: float = 60.0) -> dict:
+    """
+    Прогон target в processes процессах по connections соединений. rate —
+    суммарно операций в секунду (0 — closed loop), interval — шаг ряда, сек.
+    Результат — словарь, готовый к json.dumps и merge().
+    """
+    if mode not in ("thread", "asyncio"):
+        raise ValueError(f"unknown mode: {mode}")
+    target.prepare()
+    before = target.snapshot()
+
+    ctx = mp.get_context("spawn")  # без унаследованных соединений и потоков родителя
+    barrier, start_at, results = ctx.Barrier(processes), ctx.Value("d", 0.0), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(target, i, processes, connections, duration, rate, mode, interval,
+                                               barrier, start_at, results), daemon=True)
+             for i in range(processes)]
+    for p in procs:
+        p.start()
+
+    # пока воркеры работают, родитель снимает состояние сервера с тем же шагом
+    parts, server_series, next_at = [], [], None
+    deadline = time.monotonic() + duration + timeout
+    while len(parts) < processes and time.monotonic() < deadline:
+        wait = 0.1
+        if before and start_at.value:
+            if next_at is None:
+                next_at = start_at.value + interval
+            now = time.time()
+            if next_at <= now and next_at <= start_at.value + duration + interval / 2:
+                snap = target.snapshot()
+                server_series.append({"t": round(now - start_at.value, 3),
+                                      **{k: v for k, v in snap.items() if k != "nodes"}})
+                next_at += interval
+            wait = min(wait, max(0.01, next_at - time.time()))
+        try:
+            parts.append(results.get(timeout=wait))
+        except queue.Empty:
+            pass
+    for p in procs:
+        p.join(timeout=5)
+        if p.is_alive():
+            p.terminate()
+
+    after = target.snapshot()
+    errors = [p["error"] for p in parts if "error" in p]
+    if len(parts) < processes:
+        errors.append(f"{processes - len(parts)} worker(s) did not report")
+    report = {"target": target.describe(), "processes": processes, "connections": connections, "mode": mode,
+              "duration": duration, "rate": rate, "interval": interval,
+              **_combine([p for p in parts if "error" not in p], interval)}
+    if before or after:
+        report["server"] = target.report(before, after)
+    if server_series:
+        report["server_series"] = server_series
+    if errors:
+        report["errors"] = errors
+    return report
+
+
+def _combine(parts: list[dict], interval: float = 1.0) -> dict:
+    latency, service, batch, series, outcomes = Histogram(), Histogram(), Histogram(), Series(interval), {}
+    for part in parts:
+        latency.merge(Histogram.from_dict(part["latency"]))
+        if part.get("service"):
+            service.merge(Histogram.from_dict(part["service"]))
+        if part.get("batch"):
+            batch.merge(Histogram.from_dict(part["batch"]))
+        if part.get("series"):
+            series.merge(Series.from_dict(part["series"]))
+        for k, v in part["outcomes"].items():
+            outcomes[k] = outcomes.get(k, 0) + v
+    ops = sum(p["ops"] for p in parts)
+    elapsed = max((p["elapsed"] for p in parts), default=0.0)
+    out = {
+        "ops": ops,
+        "elapsed": elapsed,
+        "throughput": round(ops / elapsed, 1) if elapsed else 0.0,
+        "outcomes": dict(sorted(outcomes.items())),
+        "latency_ms": latency.summary(),
+        "latency": latency.to_dict(),
+        "service": service.to_dict() if service.total else None,
+        "batch": batch.to_dict() if batch.total else None,
+        "timeline": series.summary(),
+        "series": series.to_dict(),
+    }
+    if service.total:
+        out["service_ms"] = service.summary()
+    if batch.total:
+        out["batch_ms"] = batch.summary()
+    return out
+
+
+def merge(*reports: dict) -> dict:
+    """
+    Отчёты одновременных прогонов (например, генераторы на нескольких
+    машинах) — в один: гистограммы, ряды и счётчики складываются, сводка
+    пересчитывается.
+    """
+    merged = {**reports[0], "processes": sum(r["processes"] for r in reports), "rate": sum(r["rate"] for r in reports),
+              **_combine(reports, reports[0].get("interval", 1.0))}
+    errors = [e for r in reports for e in r.get("errors", [])]
+    if errors:
+        merged["errors"] = errors
+    return merged
@@ -0,0 +1,111 @@
+# loadtest/servers.py
+"""
+Локальные redis-server для прогонов: одиночный узел, N независимых
+шардов или настоящий кластер (cluster-enabled, слоты поровну, MEET) —
+замена многоузловой инсталляции на одной машине. Бинарник — из PATH
+или REDIS_SERVER. Данные не сохраняются, каталог временный.
+"""
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+
+import redis
+
+SLOTS = 16384
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalRedis:
+    def __init__(self, port: int | None = None, *, maxmemory: str | int | None = None, policy: str | None = None,
+                 cluster: bool = False, options: dict | None = None):
+        self.port = port or free_port()
+        self.options = {"save": "", "appendonly": "no", **(options or {})}
+        if maxmemory is not None:
+            self.options["maxmemory"] = maxmemory
+        if policy:
+            self.options["maxmemory-policy"] = policy
+        if cluster:
+            self.options.update({"cluster-enabled": "yes", "cluster-config-file": "nodes.conf"})
+        self.proc = self.dir = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.port}/0"
+
+    def client(self) -> redis.Redis:
+        return redis.Redis(port=self.port)
+
+    def start(self, timeout: float = 10.0) -> "LocalRedis":
+        self.dir = tempfile.mkdtemp(prefix=f"redis-{self.port}-")
+        cmd = [os.getenv("REDIS_SERVER", "redis-server"), "--port", str(self.port), "--bind", "127.0.0.1",
+               "--dir", self.dir]
+        for key, value in self.options.items():
+            cmd += [f"--{key}", str(value)]
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.client().ping()
+                return self
+            except redis.ConnectionError:
+                if self.proc.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"redis-server on :{self.port} did not start")
+                time.sleep(0.05)
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            self.proc.wait(timeout=10)
+        if self.dir:
+            shutil.rmtree(self.dir, ignore_errors=True)
+        self.proc = self.dir = None
+
+
+@contextmanager
+def local_redis(**kwargs):
+    node = LocalRedis(**kwargs).start()
+    try:
+        yield node
+    finally:
+        node.stop()
+
+
+@contextmanager
+def local_shards(n: int, **kwargs):
+    """N независимых узлов; ключи по ним раскладывает клиент (RedisTarget shards=...)."""
+    with ExitStack() as stack:
+        yield [stack.enter_context(local_redis(**kwargs)) for _ in range(n)]
+
+
+@contextmanager
+def local_cluster(n: int, timeout: float = 20.0, **kwargs):
+    """Кластер из N мастеров без реплик: слоты поровну, узлы знакомятся через MEET."""
+    with ExitStack() as stack:
+        nodes = [stack.enter_context(local_redis(cluster=True, **kwargs)) for _ in range(n)]
+        for i, node in enumerate(nodes):
+            slots = list(range(SLOTS * i // n, SLOTS * (i + 1) // n))
+            for start in range(0, len(slots), 1000):
+                node.client().execute_command("CLUSTER ADDSLOTS", *slots[start:start + 1000])
+        for node in nodes[1:]:
+            node.client().execute_command("CLUSTER MEET", "127.0.0.1", nodes[0].port)
+        deadline = time.monotonic() + timeout
+        while not all(_cluster_ok(node, n) for node in nodes):
+            if time.monotonic() > deadline:
+                raise RuntimeError("local cluster did not converge")
+            time.sleep(0.1)
+        yield nodes
+
+
+def _cluster_ok(node: LocalRedis, n: int) -> bool:
+    fields = node.client().cluster("info")  # redis-py разбирает в словарь
+    return fields.get("cluster_state") == "ok" and int(fields.get("cluster_known_nodes", 0)) == n
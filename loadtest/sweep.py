@@ -0,0 +1,104 @@
+# loadtest/sweep.py
+"""
+Перебор maxmemory × maxmemory-policy: на каждую конфигурацию — свежий
+локальный redis-server (servers.local_redis), наполнение и прогон одного
+и того же плана из .npz. На выходе строка на конфигурацию: hit ratio,
+throughput, p99, вытеснено, занято памяти, отказы по OOM — таблица для
+глаз и CSV/JSON для графика hit ratio / память / throughput. По нему
+выбираем maxmemory для Redis сайта.
+
+    python -m loadtest sweep --plan trace.npz --maxmemory 16mb,32mb,64mb \\
+        --policies allkeys-lru,allkeys-lfu --duration 20 --csv sweep.csv
+"""
+import csv
+import os
+import re
+import tempfile
+
+from .runner import run
+from .servers import local_redis
+from .targets import RedisTarget
+
+POLICIES = ("allkeys-lru", "allkeys-lfu", "volatile-ttl", "noeviction")
+COLUMNS = ("maxmemory", "policy", "fill", "hit_ratio", "throughput", "p50_ms", "p99_ms", "evicted_keys",
+           "used_memory", "oom", "populated")
+_UNITS = {"": 1, "k": 1000, "kb": 1024, "m": 1000**2, "mb": 1024**2, "g": 1000**3, "gb": 1024**3}
+
+
+def parse_size(text: str | int) -> int:
+    """Размер в синтаксисе redis.conf: 1k = 1000, 1kb = 1024."""
+    m = re.fullmatch(r"\s*(\d+)\s*([kmg]?b?)\s*", str(text).lower())
+    if not m or m.group(2) == "b":
+        raise ValueError(f"bad size: {text}")
+    return int(m.group(1)) * _UNITS[m.group(2)]
+
+
+def sweep(maxmemory, policies=POLICIES, *, plan_path: str | None = None, ttl: int = 3600, processes: int = 1,
+          connections: int = 1, duration: float = 10.0, rate: float = 0.0, mode: str = "thread",
+          interval: float = 1.0, **target_kwargs) -> dict:
+    """
+    maxmemory — список размеров ("16mb", 0 — без лимита), policies — политики.
+    target_kwargs уходят в RedisTarget (n_keys, value_size, distribution,
+    seed, pipeline...). План строится один раз (или берётся из plan_path)
+    и дальше только читается — трейс у всех конфигураций одинаковый.
+    """
+    tmp = None
+    if not plan_path:
+        tmp = tempfile.mkdtemp(prefix="sweep-")
+        plan_path = os.path.join(tmp, "plan.npz")
+    base = RedisTarget(plan_path=plan_path, **target_kwargs)
+    base.build_plan()
+    data_bytes = base.n_keys * base.value_size
+
+    rows = []
+    try:
+        for size in maxmemory:
+            for policy in policies:
+                with local_redis(maxmemory=size, policy=policy) as node:
+                    # свежий сервер: наполняем всегда; политикам volatile-* нужен TTL
+                    target = RedisTarget(url=node.url, plan_path=plan_path, populate="always", ttl=ttl,
+                                         **target_kwargs)
+                    report = run(target, processes=processes, connections=connections, duration=duration,
+                                 rate=rate, mode=mode, interval=interval)
+                rows.append(_row(size, policy, data_bytes, report))
+    finally:
+        if tmp:
+            os.remove(plan_path)
+            os.rmdir(tmp)
+    return {"plan": base.plan.describe(), "data_bytes": data_bytes, "rows": rows}
+
+
+def _row(size, policy: str, data_bytes: int, report: dict) -> dict:
+    server = report.get("server", {})
+    deltas, after = server.get("deltas", {}), server.get("info_after", {})
+    limit = parse_size(size)
+    return {
+        "maxmemory": str(size),
+        "maxmemory_bytes": limit,
+        "policy": policy,
+        # доля данных, которая влезает по лимиту; без лимита — None
+        "fill": round(limit / data_bytes, 3) if limit and data_bytes else None,
+        "hit_ratio": server.get("hit_ratio", 0.0),
+        "throughput": report["throughput"],
+        "p50_ms": report["latency_ms"]["p50"],
+        "p99_ms": report["latency_ms"]["p99"],
+        "evicted_keys": deltas.get("evicted_keys", 0),
+        "used_memory": after.get("used_memory", 0),
+        "oom": report["outcomes"].get("oom", 0),
+        "populated": report["target"].get("populated", {}).get("keys", 0),
+        "errors": report.get("errors", []),
+    }
+
+
+def table(rows: list[dict]) -> str:
+    """Выровненная текстовая таблица, столбцы — COLUMNS."""
+    cells = [COLUMNS] + [tuple("-" if row[c] is None else str(row[c]) for c in COLUMNS) for row in rows]
+    widths = [max(len(r[i]) for r in cells) for i in range(len(COLUMNS))]
+    return "\n".join("  ".join(v.rjust(w) for v, w in zip(r, widths)) for r in cells)
+
+
+def write_csv(rows: list[dict], path: str):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=[k for k in rows[0] if k != "errors"], extrasaction="ignore")
+        w.writeheader()
+        w.writerows(rows)
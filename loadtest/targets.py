@@ -0,0 +1,485 @@
+# loadtest/targets.py
+"""
+Цели нагрузки. Объект цели — только конфиг: его pickle'ом отправляют
+в процессы-воркеры, соединения открываются уже там.
+
+Протокол:
+    prepare()              — один раз в родителе до старта (прогрев данных);
+    snapshot() -> dict     — состояние сервера (до/после прогона и по интервалам) или {};
+    report(before, after)  — что из снимков положить в отчёт;
+    open(worker, processes) — в воркере: общее на процесс (план и т.п.);
+    connect(slot, slots)   — на соединение: у каждого своя копия цели
+                             (copy.copy после open), slot — сквозной номер;
+    op(i) -> str | dict    — одна операция (исход) или пачка из batch
+                             операций ({исход: сколько});
+    schedule(slot, slots)  — свой график [(i, смещение от старта в ns)]
+                             вместо ровного темпа (scheduled = True);
+    close()
+    aconnect / aop / aclose — то же для asyncio-режима;
+    describe() -> dict     — параметры для отчёта.
+"""
+import asyncio
+import glob
+import json
+import os
+import random
+import time
+
+
+class Target:
+    name = "target"
+    batch = 1  # операций за один op()
+    scheduled = False  # True — open loop по schedule(), а не по rate
+
+    def prepare(self):
+        pass
+
+    def snapshot(self) -> dict:
+        return {}
+
+    def open(self, worker: int, processes: int = 1):
+        pass
+
+    def connect(self, slot: int, slots: int):
+        pass
+
+    def schedule(self, slot: int, slots: int):
+        return None
+
+    def op(self, i: int):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    async def aconnect(self, slot: int, slots: int):
+        raise NotImplementedError(f"{self.name}: no asyncio mode")
+
+    async def aop(self, i: int):
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+    def describe(self) -> dict:
+        return {"name": self.name}
+
+    def report(self, before: dict, after: dict) -> dict:
+        return {"before": before, "after": after}
+
+
+# --- Redis -------------------------------------------------------------------
+
+INFO_FIELDS = ("keyspace_hits", "keyspace_misses", "evicted_keys", "expired_keys", "used_memory")
+SLOTS = 16384
+
+
+def gen_key(idx: int) -> bytes:
+    return b"k:%d" % idx
+
+
+def gather_info(r) -> dict:
+    info = r.info()
+    return {k: int(info.get(k, 0)) for k in INFO_FIELDS}
+
+
+def even_slots(n: int):
+    """Слоты поровну на n узлов, диапазонами — как раздаёт redis-cli --cluster create."""
+    import numpy as np
+    return np.arange(SLOTS) * n // SLOTS
+
+
+def cluster_layout(url: str):
+    """Узлы-мастера и владелец каждого слота из CLUSTER SLOTS."""
+    import numpy as np
+    import redis
+    seed = redis.Redis.from_url(url)
+    host = seed.connection_pool.connection_kwargs.get("host", "127.0.0.1")
+    owner, urls = np.full(SLOTS, -1), []
+    for row in seed.execute_command("CLUSTER SLOTS", **{"NEVER_DECODE": True}):
+        start, end, (node_host, node_port, *_) = row[0], row[1], row[2]
+        node_host = node_host.decode() if isinstance(node_host, bytes) else node_host
+        node_url = f"redis://{node_host or host}:{node_port}/0"
+        if node_url not in urls:
+            urls.append(node_url)
+        owner[start:end + 1] = urls.index(node_url)
+    if (owner < 0).any():
+        raise RuntimeError("cluster has unassigned slots")
+    return urls, owner
+
+
+def _outcome(res) -> str:
+    if res is None:
+        return "miss"
+    if res is True:
+        return "set"
+    if isinstance(res, Exception):
+        # OOM — maxmemory с noeviction; MOVED — топология поменялась посреди прогона
+        return "oom" if type(res).__name__ == "OutOfMemoryError" else type(res).__name__
+    return "hit"
+
+
+class RedisTarget(Target):
+    """
+    GET/SET по ключам k:<n>. Операции и ключи берутся из заранее
+    сгенерированного плана (loadtest/plans.py): zipf / random /
+    sequential / hotspot. plan_path — взять план из .npz или сохранить
+    туда новый, чтобы прогнать тот же трейс ещё раз.
+
+    pipeline=N — op() отправляет пачку из N команд; в отчёте латентность
+    и на операцию (время пачки каждой из её N операций), и на пачку.
+    shards=[url, ...] — независимые узлы, ключи по слотам (CRC16, как у
+    кластера) раскладывает клиент; cluster=True — url указывает на узел
+    Redis Cluster, раскладка берётся из CLUSTER SLOTS. В обоих случаях
+    каждое соединение держит по клиенту на узел и ходит напрямую.
+    ttl — SET с EX: без него политикам volatile-* нечего вытеснять.
+    """
+    name = "redis"
+
+    def __init__(self, url="redis://127.0.0.1:6379/0", n_keys=200_000, value_size=1024, read_p=0.8,
+                 distribution="zipf", zipf_s=1.2, hot_fraction=0.2, hot_p=0.8, populate="auto", seed=None,
+                 plan_size=1_000_000, plan_path=None, pipeline=1, shards=None, cluster=False, ttl=None):
+        from .plans import DISTRIBUTIONS
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"unknown distribution: {distribution}")
+        self.url, self.n_keys, self.value_size, self.read_p = url, n_keys, value_size, read_p
+        self.distribution, self.populate, self.seed = distribution, populate, seed
+        self.params = {"zipf": {"zipf_s": zipf_s}, "hotspot": {"hot_fraction": hot_fraction, "hot_p": hot_p}
+                       }.get(distribution, {})
+        self.plan_size, self.plan_path = plan_size, plan_path
+        self.batch = max(1, int(pipeline))
+        self.shards, self.cluster, self.ttl = list(shards or []), cluster, ttl
+        self.plan = self.populated = self.urls = self.owner = None
+
+    def build_plan(self):
+        from .plans import Plan
+        if self.plan_path and os.path.exists(self.plan_path):
+            self.plan = Plan.load(self.plan_path)
+            self.n_keys = self.plan.meta["n_keys"]
+            return
+        # seed фиксируем всегда — по отчёту план можно воспроизвести
+        seed = self.seed if self.seed is not None else random.randrange(2**32)
+        self.plan = Plan.build(self.distribution, self.n_keys, self.plan_size, self.read_p, seed, **self.params)
+        if self.plan_path:
+            self.plan.save(self.plan_path)
+
+    def build_layout(self):
+        if self.cluster:
+            self.urls, self.owner = cluster_layout(self.url)
+        elif self.shards:
+            self.urls, self.owner = self.shards, even_slots(len(self.shards))
+        else:
+            self.urls, self.owner = [self.url], None
+
+    def clients(self, asyncio_mode=False) -> list:
+        if asyncio_mode:
+            import redis.asyncio as aioredis
+            return [aioredis.Redis.from_url(u, decode_responses=False) for u in self.urls]
+        import redis
+        return [redis.Redis.from_url(u, decode_responses=False) for u in self.urls]
+
+    def node_of(self, key: bytes) -> int:
+        from redis.crc import key_slot
+        return 0 if self.owner is None else int(self.owner[key_slot(key)])
+
+    def prepare(self):
+        self.build_plan()
+        self.build_layout()
+        clients = self.clients()
+        for r in clients:
+            r.ping()
+        # auto — только если ключей меньше половины; always — перезаписать
+        if self.populate == "never" or (
+                self.populate == "auto" and sum(r.dbsize() for r in clients) >= self.n_keys // 2):
+            return
+        from .plans import payload
+        value = payload(self.value_size)
+        started, written, full = time.perf_counter(), 0, [False] * len(clients)
+        pipes = [r.pipeline(transaction=False) for r in clients]
+        for start in range(0, self.n_keys, 1000):
+            for i in range(start, min(start + 1000, self.n_keys)):
+                key = gen_key(i)
+                node = self.node_of(key)
+                if not full[node]:
+                    pipes[node].set(key, value, ex=self.ttl)
+            for node, pipe in enumerate(pipes):
+                if len(pipe):
+                    results = pipe.execute(raise_on_error=False)
+                    written += sum(res is True for res in results)
+                    # maxmemory + noeviction: на этот узел дальше не влезет
+                    full[node] = full[node] or any(_outcome(res) == "oom" for res in results)
+            if all(full):
+                break
+        self.populated = {"keys": written, "sec": round(time.perf_counter() - started, 3)}
+
+    def snapshot(self) -> dict:
+        import redis
+        try:
+            nodes = [gather_info(r) for r in self.clients()]
+        except redis.exceptions.ResponseError:
+            # INFO бывает закрыт (rename-command у облачных Redis) — отчёт без серверной части
+            return {}
+        totals = {k: sum(n[k] for n in nodes) for k in INFO_FIELDS}
+        return {**totals, "nodes": nodes} if len(nodes) > 1 else totals
+
+    def open(self, worker: int, processes: int = 1):
+        from .plans import payload
+        self.sets, self.keys = self.plan.materialize()
+        self.size = len(self.keys)
+        self.nodes = self.plan.nodes(self.owner) if self.owner is not None else None
+        self.payload = payload(self.value_size)
+
+    def connect(self, slot: int, slots: int):
+        # каждое соединение идёт по плану со своего места, чтобы не дублировать соседей
+        self.offset = self.size * slot // slots
+        self.conns = self.clients()
+        self.pipes = [r.pipeline(transaction=False) for r in self.conns]
+        self.op = self._op_batch if self.batch > 1 else self._op_one
+
+    def _op_one(self, i: int) -> str:
+        j = (i + self.offset) % self.size
+        r = self.conns[self.nodes[j]] if self.nodes else self.conns[0]
+        try:
+            if self.sets[j]:
+                return _outcome(r.set(self.keys[j], self.payload, ex=self.ttl))
+            return _outcome(r.get(self.keys[j]))
+        except Exception as e:
+            if type(e).__module__.startswith("redis"):
+                return _outcome(e)
+            raise
+
+    def _queue_batch(self, i: int, pipes: list) -> None:
+        sets, keys, nodes, size, value, ttl = self.sets, self.keys, self.nodes, self.size, self.payload, self.ttl
+        start = i + self.offset
+        for j in range(start, start + self.batch):
+            j %= size
+            pipe = pipes[nodes[j]] if nodes else pipes[0]
+            if sets[j]:
+                pipe.set(keys[j], value, ex=ttl)
+            else:
+                pipe.get(keys[j])
+
+    @staticmethod
+    def _count(results_per_node) -> dict:
+        out = {}
+        for results in results_per_node:
+            for res in results:
+                k = _outcome(res)
+                out[k] = out.get(k, 0) + 1
+        return out
+
+    def _op_batch(self, i: int) -> dict:
+        self._queue_batch(i, self.pipes)
+        return self._count(p.execute(raise_on_error=False) for p in self.pipes if len(p))
+
+    def close(self):
+        for r in self.conns:
+            r.close()
+
+    async def aconnect(self, slot: int, slots: int):
+        self.offset = self.size * slot // slots
+        self.conns = self.clients(asyncio_mode=True)
+        self.pipes = [r.pipeline(transaction=False) for r in self.conns]
+        self.aop = self._aop_batch if self.batch > 1 else self._aop_one
+
+    async def _aop_one(self, i: int) -> str:
+        j = (i + self.offset) % self.size
+        r = self.conns[self.nodes[j]] if self.nodes else self.conns[0]
+        try:
+            if self.sets[j]:
+                return _outcome(await r.set(self.keys[j], self.payload, ex=self.ttl))
+            return _outcome(await r.get(self.keys[j]))
+        except Exception as e:
+            if type(e).__module__.startswith("redis"):
+                return _outcome(e)
+            raise
+
+    async def _aop_batch(self, i: int) -> dict:
+        self._queue_batch(i, self.pipes)
+        # пачки на разные узлы — параллельно
+        return self._count(await asyncio.gather(*(p.execute(raise_on_error=False) for p in self.pipes if len(p))))
+
+    async def aclose(self):
+        for r in self.conns:
+            await r.aclose()
+
+    def describe(self) -> dict:
+        out = {"name": self.name, "url": self.url, "value_size": self.value_size, "pipeline": self.batch, "ttl": self.ttl}
+        if self.urls and len(self.urls) > 1:
+            out["nodes"] = self.urls
+            out["cluster"] = self.cluster
+        if self.plan is not None:
+            out["plan"] = self.plan.describe()
+            if self.owner is not None:
+                out["node_share"] = self.plan.node_share(self.owner, len(self.urls))
+        if self.populated:
+            out["populated"] = self.populated
+        return out
+
+    def report(self, before: dict, after: dict) -> dict:
+        deltas = {k: after.get(k, 0) - before.get(k, 0) for k in INFO_FIELDS}
+        lookups = deltas["keyspace_hits"] + deltas["keyspace_misses"]
+        return {"info_before": before, "info_after": after, "deltas": deltas,
+                "hit_ratio": round(deltas["keyspace_hits"] / lookups, 4) if lookups else 0.0}
+
+
+# --- HTTP --------------------------------------------------------------------
+
+LEAD_SOURCE = "loadtest"  # так помечены заявки прогона — потом их можно удалить
+
+
+def parse_routes(spec: str) -> list[tuple[str, str, float]]:
+    """
+    "/=5,/catalog/=3,POST /lead/=1" -> [(метод, путь, вес), ...]
+    """
+    routes = []
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        item, _, weight = item.partition("=")
+        method, _, path = item.strip().rpartition(" ")
+        routes.append(((method or "GET").upper(), path, float(weight or 1)))
+    return routes
+
+
+class HttpTarget(Target):
+    """
+    Страницы сайта по весам. POST /lead/ — настоящая форма заявки: кука
+    csrftoken берётся с главной, телефоны уникальные. На сервере на время
+    прогона нужен LEAD_THROTTLE=0, иначе почти всё упрётся в 429.
+    """
+    name = "http"
+
+    def __init__(self, base_url="http://127.0.0.1:8000", routes="/", timeout=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.routes = parse_routes(routes) if isinstance(routes, str) else list(routes)
+        self.timeout = timeout
+
+    def open(self, worker: int, processes: int = 1):
+        self.cum_weights, total = [], 0.0
+        for _, _, weight in self.routes:
+            total += weight
+            self.cum_weights.append(total)
+        self.needs_token = any(method == "POST" for method, _, _ in self.routes)
+
+    def connect(self, slot: int, slots: int):
+        import httpx
+        self._error = httpx.HTTPError
+        self.client = httpx.Client(base_url=self.base_url, timeout=self.timeout)
+        self.rng, self.slot, self.token = random.Random(), slot, ""
+        if self.needs_token:
+            self.client.get("/")
+            self.token = self.client.cookies.get("csrftoken", "")
+
+    def _request(self, i: int) -> tuple[str, str, dict]:
+        method, path, _ = self.rng.choices(self.routes, cum_weights=self.cum_weights)[0]
+        return method, path, self._form(method, path, i)
+
+    def _form(self, method: str, path: str, i: int) -> dict:
+        data = {}
+        if method != "GET":
+            data["csrfmiddlewaretoken"] = self.token
+            if path.split("?")[0].rstrip("/").endswith("/lead"):
+                # +7 9ss nnnnnnn: соединение и номер операции — без повторов
+                data.update(name="Нагрузка", source=LEAD_SOURCE, phone=f"+79{self.slot % 100:02d}{i % 10**7:07d}")
+        return data
+
+    def _post_headers(self) -> dict:
+        return {"X-Requested-With": "XMLHttpRequest", "Referer": self.base_url + "/"}
+
+    def op(self, i: int) -> str:
+        method, path, data = self._request(i)
+        try:
+            if method == "GET":
+                resp = self.client.get(path)
+            else:
+                resp = self.client.post(path, data=data, headers=self._post_headers())
+        except self._error as e:
+            return type(e).__name__
+        return str(resp.status_code)
+
+    def close(self):
+        self.client.close()
+
+    async def aconnect(self, slot: int, slots: int):
+        import httpx
+        self._error = httpx.HTTPError
+        self.client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout)
+        self.rng, self.slot, self.token = random.Random(), slot, ""
+        if self.needs_token:
+            await self.client.get("/")
+            self.token = self.client.cookies.get("csrftoken", "")
+
+    async def aop(self, i: int) -> str:
+        method, path, data = self._request(i)
+        try:
+            if method == "GET":
+                resp = await self.client.get(path)
+            else:
+                resp = await self.client.post(path, data=data, headers=self._post_headers())
+        except self._error as e:
+            return type(e).__name__
+        return str(resp.status_code)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def describe(self) -> dict:
+        return {"name": self.name, "base_url": self.base_url,
+                "routes": [f"{m} {p}={w:g}" for m, p, w in self.routes]}
+
+
+def load_trace(patterns) -> list[tuple[float, str, str]]:
+    """
+    Записи pages/tracing.py (несколько файлов, включая ротированные .1, .2)
+    -> [(ts, метод, путь), ...] по времени.
+    """
+    records = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        records.append((rec["ts"], rec["method"], rec["path"]))
+    records.sort()
+    return records
+
+
+class ReplayTarget(HttpTarget):
+    """
+    Повтор записанного трафика: те же пути в том же порядке и с теми же
+    интервалами, ускоренными в speed раз. Записи раздаются соединениям
+    по кругу; латентность — от момента из трейса, так что нехватка
+    соединений видна как рост латентности, а не как сжатый поток.
+    POST /lead/ — с синтезированной заявкой, как у HttpTarget.
+    """
+    name = "replay"
+    scheduled = True
+
+    def __init__(self, base_url="http://127.0.0.1:8000", trace=(), speed=1.0, timeout=30.0):
+        super().__init__(base_url, routes=(), timeout=timeout)
+        self.speed = speed
+        self.trace = [(ts - trace[0][0], method, path) for ts, method, path in trace] if trace else []
+
+    @property
+    def span(self) -> float:
+        """Длительность трейса с учётом ускорения, сек."""
+        return self.trace[-1][0] / self.speed if self.trace else 0.0
+
+    def open(self, worker: int, processes: int = 1):
+        self.needs_token = any(method == "POST" for _, method, _ in self.trace)
+
+    def schedule(self, slot: int, slots: int):
+        return ((i, int(self.trace[i][0] * 1e9 / self.speed)) for i in range(slot, len(self.trace), slots))
+
+    def _request(self, i: int) -> tuple[str, str, dict]:
+        _, method, path = self.trace[i]
+        return method, path, self._form(method, path, i)
+
+    def describe(self) -> dict:
+        mix = {}
+        for _, method, path in self.trace:
+            key = f"{method} {path.split('?')[0]}"
+            mix[key] = mix.get(key, 0) + 1
+        top = sorted(mix.items(), key=lambda kv: -kv[1])[:20]
+        return {"name": self.name, "base_url": self.base_url, "records": len(self.trace), "speed": self.speed,
+                "span": round(self.span, 3), "mix": dict(top)}
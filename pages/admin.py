@@ -1,10 +1,15 @@
-import csv
-import datetime
 from django.contrib import admin
-from django.http import HttpResponse
-from .models import AboutSection, CategoryPhoto, ContactPage, HeroSlide,Category, Lead, LeadSection, OfferPage, PrivacyPage, USPItem, USPSection, GallerySection, GalleryImage, ReviewSection, Review
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.utils import timezone
+from .models import AboutSection, CategoryPhoto, ContactPage, HeroSlide,Category, ExportJob, ImageJob, Lead, LeadDelivery, LeadSection, OfferPage, PrivacyPage, USPItem, USPSection, GallerySection, GalleryImage, ReviewSection, Review
 from django.db import models
+from django.db.models.functions import Reverse
 from django_summernote.widgets import SummernoteWidget
+from . import export, sendfile
+from .bitrix import phone_digits_ru
 @admin.register(HeroSlide)
 class HeroSlideAdmin(admin.ModelAdmin):
     list_display = ("__str__", "is_active", "order")
@@ -97,20 +102,26 @@ def make_done(modeladmin, request, queryset):
 
 @admin.action(description="Экспорт в CSV")
 def export_csv(modeladmin, request, queryset):
-    resp = HttpResponse(content_type="text/csv; charset=utf-8")
-    ts = datetime.now().strftime("%Y-%m-%d_%H-%M")
-    resp["Content-Disposition"] = f'attachment; filename="leads_{ts}.csv"'
-    writer = csv.writer(resp, delimiter=";")
-    writer.writerow(["Дата", "Имя", "Телефон", "Сообщение", "Статус",
-                     "Источник", "UTM source", "UTM medium", "UTM campaign", "Referer", "IP"])
-    for l in queryset.iterator():
-        writer.writerow([
-            l.created_at.strftime("%Y-%m-%d %H:%M"),
-            l.name, l.phone, (l.message or "").replace("\n", " "),
-            l.status, getattr(l, "source", ""),
-            l.utm_source, l.utm_medium, l.utm_campaign, l.referer, l.ip
-        ])
-    return resp
+    return export.stream_response(queryset, "csv")
+
+@admin.action(description="Экспорт в XLSX")
+def export_xlsx(modeladmin, request, queryset):
+    return export.stream_response(queryset, "xlsx")
+
+def _export_to_file(modeladmin, request, queryset, fmt):
+    job = export.enqueue(queryset, fmt, user=request.user)
+    url = reverse("admin:pages_exportjob_change", args=[job.pk])
+    modeladmin.message_user(request, format_html(
+        'Выгрузка поставлена в очередь — файл появится в <a href="{}">«Выгрузках заявок»</a>, '
+        'ссылка придёт на почту.', url))
+
+@admin.action(description="Экспорт в CSV (в фоне, файлом)")
+def export_csv_file(modeladmin, request, queryset):
+    _export_to_file(modeladmin, request, queryset, "csv")
+
+@admin.action(description="Экспорт в XLSX (в фоне, файлом)")
+def export_xlsx_file(modeladmin, request, queryset):
+    _export_to_file(modeladmin, request, queryset, "xlsx")
 
 
 @admin.register(Lead)
@@ -128,13 +139,22 @@ class LeadAdmin(admin.ModelAdmin):
 
     # фильтры/поиск
     list_filter = ("status", "source", "utm_source", "created_at")
-    search_fields = ("name", "phone", "message", "utm_campaign", "utm_source")
-    # нормализуем поиск по телефону: можно искать "7999", "8 999", "(999)"
+    search_fields = ("name", "message", "utm_campaign", "utm_source")
+    search_help_text = "Имя, комментарий, UTM или телефон: от 3 цифр — любой кусок номера, 1–2 цифры — его конец."
+    # телефон ищем по нормализованному phone_digits: можно "7999", "8 999", "(999)", "4567"
     def get_search_results(self, request, queryset, search_term):
         qs, use_distinct = super().get_search_results(request, queryset, search_term)
         t = "".join(ch for ch in search_term if ch.isdigit())
-        if t:
-            qs |= queryset.filter(phone__regex=r".*%s.*" % t)
+        if len(t) >= 10:
+            # номер целиком — точное совпадение по btree
+            qs |= queryset.filter(phone_digits=phone_digits_ru(t))
+        elif len(t) >= 3:
+            # кусок номера — LIKE '%t%', на Postgres его берёт триграммный GIN
+            qs |= queryset.filter(phone_digits__contains=t)
+        elif t:
+            # 1-2 цифры триграммам мало — хвост по перевёрнутому индексу
+            # префикс — константой: LIKE 'x%' по индексу с text_pattern_ops (lead_phone_rev_idx)
+            qs |= queryset.alias(rev=Reverse("phone_digits")).filter(rev__startswith=t[::-1])
         return qs, use_distinct
 
     # read-only и группы полей
@@ -146,7 +166,7 @@ class LeadAdmin(admin.ModelAdmin):
     )
 
     # действия
-    actions = [make_in_work, make_done, export_csv]
+    actions = [make_in_work, make_done, export_csv, export_xlsx, export_csv_file, export_xlsx_file]
 
     # красивый телефон
     @admin.display(description="Телефон", ordering="phone")
@@ -157,6 +177,21 @@ class LeadAdmin(admin.ModelAdmin):
             d = ("7" + d[-10:]) if d[0] in "89" else d[:11]
             return f"+{d[0]} ({d[1:4]}) {d[4:7]}-{d[7:9]}-{d[9:11]}"
         return obj.phone
+
+
+@admin.action(description="Отправить в Bitrix повторно")
+def retry_delivery(modeladmin, request, queryset):
+    queryset.exclude(status="sent").update(status="pending", attempts=0, next_attempt_at=timezone.now())
+
+
+@admin.register(LeadDelivery)
+class LeadDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "lead", "status", "attempts", "next_attempt_at", "bitrix_id")
+    list_filter = ("status",)
+    search_fields = ("bitrix_id", "last_error")
+    list_select_related = ("lead",)
+    readonly_fields = ("lead", "data", "attempts", "bitrix_id", "last_error", "created_at", "sent_at")
+    actions = [retry_delivery]
     
 
 class CategoryPhotoInline(admin.TabularInline):
@@ -226,3 +261,47 @@ class PrivacyAdmin(admin.ModelAdmin):
     list_editable = ("is_active",)
     prepopulated_fields = {"slug": ("title",)}
     readonly_fields = ("updated_at",)
+
+
+@admin.action(description="Обработать повторно")
+def retry_image_job(modeladmin, request, queryset):
+    queryset.update(status="pending", attempts=0, error="")
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "name", "model", "status", "attempts", "finished_at")
+    list_filter = ("status", "model")
+    search_fields = ("name",)
+    readonly_fields = ("model", "object_id", "field", "name", "attempts", "error",
+                       "created_at", "started_at", "finished_at")
+    actions = [retry_image_job]
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "user", "fmt", "status", "finished_at", "download_link")
+    list_filter = ("status", "fmt")
+    readonly_fields = ("user", "fmt", "status", "download_link", "error", "created_at", "started_at", "finished_at")
+    exclude = ("query", "file")
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="Файл")
+    def download_link(self, obj):
+        if obj.status != "done" or not obj.file:
+            return "—"
+        return format_html('<a href="{}">Скачать</a>', reverse("admin:pages_exportjob_download", args=[obj.pk]))
+
+    def get_urls(self):
+        urls = [path("<int:pk>/download/", self.admin_site.admin_view(self.download_view),
+                     name="pages_exportjob_download")]
+        return urls + super().get_urls()
+
+    def download_view(self, request, pk):
+        # сам файл из /media/exports/ nginx наружу не отдаёт — только через права админки
+        job = get_object_or_404(ExportJob, pk=pk, status="done")
+        if not self.has_view_permission(request, job) or not job.file:
+            raise Http404
+        return sendfile.serve(job.file, as_attachment=True)
@@ -0,0 +1,141 @@
+# pages/async_views.py
+"""
+Async-версии публичных вьюх для ASGI-режима (SERVER_MODE=asgi, uvicorn-воркеры
+под gunicorn). Подключаются в pages/urls.py при ASYNC_VIEWS.
+
+Под ASGI синхронная вьюха целиком уходит в поток sync_to_async — вместе
+с рендером и ожиданием кеша. Здесь в поток попадают запросы к БД (async
+ORM в Django пока устроен так же) и сам рендер (pagecache.arender):
+{% fragment %} ходит в синхронный кеш, а галерея и отзывы главной
+грузятся лениво, только на промахе фрагмента. Остальное контексту
+и контекст-процессору догружается заранее (ActiveContent.aload).
+
+Целиком в потоке остаются:
+* сохранение заявки — транзакция Lead + LeadDelivery (outbox), а у async
+  ORM транзакций нет; лучше одна короткая транзакция в потоке, чем заявка
+  без строки доставки;
+* троттлинг и ETag/Last-Modified — синхронный кеш/БД, см. conditional_page;
+* keyset-пагинация каталога.
+В Битрикс из запроса мы давно не ходим (outbox + manage.py bitrix_worker),
+так что HTTP-клиент на пути заявки не нужен.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import Http404
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+
+from . import keyset, search, sendfile
+from .conditional import conditional_page
+from .content import get_content
+from .models import Category, OfferPage, PrivacyPage
+from .pagecache import arender, arender_cached
+from .views import INDEX_STEPS, _check_lead, _lead_error, _lead_fields, _lead_ok, _save_lead
+
+# что берёт base.html через контекст-процессор; generation — ключ {% fragment %} хедера/футера
+_BASE_PARTS = ("cta", "contact", "generation")
+
+
+@conditional_page("index")
+async def index(request):
+    success = "1" if request.GET.get("success") else None
+
+    async def build_ctx():
+        content = get_content(request)
+        # галерея и отзывы — лениво, внутри {% fragment %}: на его попадании в БД не идём
+        await content.aload("slides", "top_categories", "usp", "about", *_BASE_PARTS)
+        usp = content.usp
+        return {
+            "slides": content.slides,
+            "categories_db": content.top_categories,
+            "usp": usp,
+            "about": content.about,
+            "usp_items": usp.active_items if usp else [],
+            "gallery": SimpleLazyObject(lambda: content.gallery),
+            "rev_sec": SimpleLazyObject(lambda: content.reviews_section),
+            "success": success,
+            "steps": INDEX_STEPS,
+        }
+
+    return await arender_cached(request, "index", "pages/index.html", build_ctx,
+                                variant=("s1" if success else "s0",))
+
+
+async def lead_submit(request):
+    if request.method != "POST":
+        return redirect(reverse("index") + "#lead")
+
+    if (request.POST.get("website") or "").strip():
+        return _lead_ok(request, "Заявка принята.")
+
+    fields = _lead_fields(request)
+    # только кеш, БД не трогает — можно в любом потоке пула
+    error = await sync_to_async(_check_lead, thread_sensitive=False)(fields)
+    if error:
+        return _lead_error(request, *error)
+    await sync_to_async(_save_lead)(fields)
+    return _lead_ok(request)
+
+
+@conditional_page("catalog")
+async def catalog(request):
+    q = (request.GET.get("q") or "").strip()
+    qs = search.search_categories(Category.objects.filter(is_active=True).defer("search_vector"), q)
+    if settings.CATALOG_PAGINATION == "keyset" and not q:
+        page_obj = await sync_to_async(keyset.paginate)(qs, request.GET.get("cursor"), 12, count_name="catalog")
+    else:
+        paginator = Paginator(qs, 12)
+        paginator.count = await qs.acount()  # иначе get_page посчитает синхронно
+        page_obj = paginator.get_page(request.GET.get("page"))
+        page_obj.object_list = [c async for c in page_obj.object_list]
+    await get_content(request).aload(*_BASE_PARTS)
+    ctx = {
+        "q": q,
+        "page_obj": page_obj,
+        "categories": page_obj.object_list,
+        "meta_title": "Каталог — ULVIS",
+        "meta_description": "Каталог категорий: кухни, шкафы, гардеробные, столы и другое. Индивидуальные проекты ULVIS.",
+    }
+    return await arender(request, "pages/catalog_list.html", ctx)
+
+
+@conditional_page("category_detail")
+async def category_detail(request, slug):
+    category = await Category.objects.filter(slug=slug, is_active=True).afirst()
+    if category is None:
+        raise Http404("Категория не найдена")
+    photos = [p async for p in category.photos.filter(is_active=True).order_by("order", "id")]
+    await get_content(request).aload(*_BASE_PARTS)
+    ctx = {
+        "category": category,
+        "photos": photos,
+        "meta_title": category.meta_title or f"{category.title} — Каталог",
+        "meta_description": category.meta_description or (category.description[:150] if category.description else ""),
+    }
+    return await arender(request, "pages/category_detail.html", ctx)
+
+
+@conditional_page("contacts")
+async def contacts(request):
+    content = get_content(request)
+    await content.aload(*_BASE_PARTS)
+    return await arender(request, "pages/contacts.html", {"page": content.contact, "tel_href": content.tel_href})
+
+
+@conditional_page("offer", forms=False)
+async def offer_page(request):
+    offer = await OfferPage.objects.filter(is_active=True).afirst()
+    if not offer or not offer.file:
+        raise Http404("Файл оферты не найден")
+    return await sendfile.aserve(offer.file, as_attachment=False)
+
+
+@conditional_page("privacy", forms=False)
+async def privacy_page(request, slug="privacy"):
+    page = await PrivacyPage.objects.filter(is_active=True, slug=slug).afirst()
+    if not page:
+        raise Http404("Политика не найдена")
+    await get_content(request).aload(*_BASE_PARTS)
+    return await arender(request, "pages/privacy.html", {"page": page})
@@ -0,0 +1,265 @@
+# pages/bench.py
+"""
+Бенчмарк публичных страниц: запросы к БД, p50/p95 времени ответа, размер.
+
+Данные — db.json (loaddata) или синтетика seed_synthetic() на тысячи
+категорий/фото/отзывов. Каждая страница из pages/urls.py гоняется через
+тестовый клиент: первый запрос — холодный (кеш страниц пуст), дальше
+repeat тёплых. Результат сверяется с базовой линией BASELINE_PATH:
+больше запросов, другой статус или p95 сильно медленнее — регрессия.
+
+    python manage.py bench_views                     # сверка с базовой линией
+    python manage.py bench_views --update-baseline   # перезаписать её
+
+Рендер шаблонов до/после cached.Loader и {% fragment %} — run_templates():
+
+    python manage.py bench_templates
+"""
+import gc
+import json
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from . import search, timing
+from .models import (AboutSection, Category, CategoryPhoto, ContactPage, GalleryImage, GallerySection, HeroSlide,
+                     LeadSection, OfferPage, PrivacyPage, Review, ReviewSection, USPItem, USPSection)
+
+BASELINE_PATH = Path(__file__).with_name("bench_baseline.json")
+
+# набор данных по умолчанию для синтетики (и для тестов)
+DATASET = {"categories": 1000, "photos": 3, "reviews": 500, "gallery": 24}
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# bench_templates: до — шаблоны с диска на каждый рендер и без {% fragment %}, после — как в проде
+TEMPLATE_MODES = {
+    "disk": {"cached_loader": False, "fragments": False},
+    "cached_loader": {"cached_loader": True, "fragments": False},
+    "cached_loader+fragments": {"cached_loader": True, "fragments": True},
+}
+_LOADERS = ["django.template.loaders.filesystem.Loader", "django.template.loaders.app_directories.Loader"]
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+@contextmanager
+def isolated_db(media: bool = True):
+    """
+    Отдельная тестовая БД, свой LocMem-кеш и (media=True) временный MEDIA_ROOT:
+    боевые данные и закешированные страницы замер не трогает.
+    """
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with tempfile.TemporaryDirectory() as tmp, \
+                override_settings(CACHES=LOCMEM, **({"MEDIA_ROOT": tmp} if media else {})):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def seed_synthetic(categories=1000, photos=3, reviews=500, gallery=24):
+    """
+    Наполняет пустую БД. bulk_create — мимо сигналов: ни ImageJob,
+    ни нарезки для несуществующих картинок не будет.
+    """
+    HeroSlide.objects.bulk_create(
+        HeroSlide(title=f"Слайд {i}", subtitle="Мебель на заказ", image="slides/bench.jpg", order=i)
+        for i in range(3))
+
+    cats = Category.objects.bulk_create(
+        Category(title=f"Категория {i}", slug=f"cat-{i}", image="categories/bench.jpg",
+                 description="Кухни, шкафы и гардеробные по индивидуальным размерам. " * 4,
+                 is_active=i % 10 != 9, order=i)
+        for i in range(categories))
+    CategoryPhoto.objects.bulk_create(
+        CategoryPhoto(category=c, image="category_photos/bench.jpg", title=f"{c.title}, фото {j}", order=j)
+        for c in cats for j in range(photos))
+    search.update_vectors()
+
+    usp = USPSection.objects.create()
+    USPItem.objects.bulk_create(
+        USPItem(section=usp, title=f"Преимущество {i}", text="Коротко о главном", order=i) for i in range(4))
+    AboutSection.objects.create(subtitle="Собственное производство")
+
+    gs = GallerySection.objects.create()
+    GalleryImage.objects.bulk_create(
+        GalleryImage(section=gs, image="gallery/bench.jpg", alt=f"Интерьер {i}", order=i) for i in range(gallery))
+
+    rs = ReviewSection.objects.create()
+    Review.objects.bulk_create(
+        Review(section=rs, author=f"Клиент {i}", city="Москва", text="Всё сделали в срок, качество отличное. " * 3,
+               is_active=i % 5 != 4, order=i)
+        for i in range(reviews))
+
+    LeadSection.objects.create(subtitle="Перезвоним за 15 минут")
+    ContactPage.objects.create(phone="8 (999) 123-45-67", address="г. Москва, ул. Примерная, 1",
+                               email="info@example.com", schedule="Пн–Пт 10:00–20:00")
+    PrivacyPage.objects.create(content="<p>Текст политики.</p>" * 50)
+    name = default_storage.save("legal/bench-offer.pdf", ContentFile(b"%PDF-1.4\n" + b"0" * 20000))
+    OfferPage.objects.create(file=name)
+
+
+def default_specs() -> list[dict]:
+    """Все маршруты pages/urls.py. lead_submit — POST, каждый раз с нового IP и номера, чтобы не упереться в троттл."""
+    cat = (Category.objects.filter(is_active=True).order_by("order", "id").values_list("slug", flat=True).first()
+           or "missing")
+    return [
+        {"name": "index", "path": "/"},
+        {"name": "catalog", "path": "/catalog/"},
+        {"name": "catalog_page", "path": "/catalog/?page=5"},
+        {"name": "catalog_search", "path": "/catalog/?q=" + "Категория 1"},
+        {"name": "category_detail", "path": f"/catalog/{cat}/"},
+        {"name": "contacts", "path": "/contacts/"},
+        {"name": "lead_submit", "path": "/lead/", "method": "post"},
+        {"name": "offer", "path": "/offer/"},
+        {"name": "privacy", "path": "/privacy/"},
+    ]
+
+
+def _request(client, spec, i):
+    if spec.get("method") == "post":
+        return client.post(spec["path"], {"name": "Бенч", "phone": f"+7 999 {i:07d}", "message": "bench"},
+                           REMOTE_ADDR=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")
+    return client.get(spec["path"])
+
+
+def _size(resp) -> int:
+    if resp.streaming:
+        return sum(len(chunk) for chunk in resp.streaming_content)
+    return len(resp.content)
+
+
+def measure(spec: dict, repeat: int = 20, client: Client | None = None) -> dict:
+    client = client or Client(raise_request_exception=False)
+    seq = 0
+
+    with CaptureQueriesContext(connection) as cq:
+        resp = _request(client, spec, seq)
+        size = _size(resp)
+    out = {"status": resp.status_code, "queries_cold": len(cq.captured_queries), "bytes": size}
+
+    # как timeit: полная сборка мусора, попавшая в один запрос, — это p95 не той страницы
+    queries, timings = 0, []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            seq += 1
+            with CaptureQueriesContext(connection) as cq:
+                t0 = time.perf_counter()
+                resp = _request(client, spec, seq)
+                _size(resp)
+                timings.append((time.perf_counter() - t0) * 1000)
+            queries = max(queries, len(cq.captured_queries))
+    finally:
+        gc.enable()
+    out.update(queries=queries, p50_ms=round(_pct(timings, 0.5), 3), p95_ms=round(_pct(timings, 0.95), 3))
+    return out
+
+
+def run(specs: list[dict] | None = None, repeat: int = 20) -> dict:
+    return {spec["name"]: measure(spec, repeat) for spec in (specs or default_specs())}
+
+
+def template_settings(cached_loader: bool, fragments: bool) -> dict:
+    """
+    Настройки для override_settings: загрузчики шаблонов и фрагменты.
+    Кеш страниц выключен — меряем сам рендер, а не чтение готового HTML.
+    """
+    engine = dict(settings.TEMPLATES[0])
+    engine["OPTIONS"] = {**engine["OPTIONS"],
+                         "loaders": [("django.template.loaders.cached.Loader", _LOADERS)] if cached_loader else _LOADERS}
+    engine.pop("APP_DIRS", None)
+    return {"TEMPLATES": [engine], "PAGE_CACHE_TIMEOUT": 0,
+            "FRAGMENT_CACHE_TIMEOUT": settings.FRAGMENT_CACHE_TIMEOUT if fragments else 0}
+
+
+def measure_render(spec: dict, repeat: int = 20) -> dict:
+    """
+    Время рендера шаблона (tpl из pages/timing.py — вместе с ленивыми
+    запросами из шаблона) и всего ответа. Первый запрос — холодный: разбор
+    шаблонов для cached.Loader и наполнение фрагментов.
+    """
+    client = Client(raise_request_exception=False)
+    with timing.collect() as t:
+        t0 = time.perf_counter()
+        resp = _request(client, spec, 0)
+        cold_ms = (time.perf_counter() - t0) * 1000
+    out = {"status": resp.status_code, "cold_ms": round(cold_ms, 3), "cold_tpl_ms": round(t.spent.get("tpl", 0) * 1000, 3)}
+
+    queries, tpl, total = 0, [], []
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(1, repeat + 1):
+            with CaptureQueriesContext(connection) as cq, timing.collect() as t:
+                t0 = time.perf_counter()
+                _size(_request(client, spec, i))
+                total.append((time.perf_counter() - t0) * 1000)
+            tpl.append(t.spent.get("tpl", 0) * 1000)
+            queries = max(queries, len(cq.captured_queries))
+    finally:
+        gc.enable()
+    out.update(queries=queries, tpl_p50_ms=round(_pct(tpl, 0.5), 3), p50_ms=round(_pct(total, 0.5), 3),
+               p95_ms=round(_pct(total, 0.95), 3))
+    return out
+
+
+def run_templates(specs: list[dict] | None = None, repeat: int = 20, modes=TEMPLATE_MODES) -> dict:
+    """{режим: {страница: measure_render}}; только GET-страницы с шаблоном (без заявки и оферты)."""
+    specs = specs or [s for s in default_specs() if s.get("method") != "post" and s["name"] != "offer"]
+    report = {}
+    for mode, flags in modes.items():
+        with override_settings(**template_settings(**flags)):
+            report[mode] = {spec["name"]: measure_render(spec, repeat) for spec in specs}
+    return report
+
+
+def compare(results: dict, baseline: dict, time_factor: float | None = 2.0, slack_ms: float = 10.0) -> list[str]:
+    """
+    Регрессии против базовой линии. Запросы и статус — строго, время —
+    p95 > базовый * time_factor + slack_ms (таймеры на CI шумят);
+    time_factor=None — время не сверяем.
+    """
+    problems = []
+    for name, base in baseline.items():
+        got = results.get(name)
+        if got is None:
+            problems.append(f"{name}: not measured")
+            continue
+        if got["status"] != base["status"]:
+            problems.append(f"{name}: status {got['status']} != {base['status']}")
+        for key in ("queries_cold", "queries"):
+            if got[key] > base[key]:
+                problems.append(f"{name}: {key} {got[key]} > {base[key]}")
+        if time_factor is None:
+            continue
+        limit = base["p95_ms"] * time_factor + slack_ms
+        if got["p95_ms"] > limit:
+            problems.append(f"{name}: p95 {got['p95_ms']}ms > {limit:.1f}ms")
+    return problems
+
+
+def load_baseline(path=BASELINE_PATH) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def save_baseline(data: dict, path=BASELINE_PATH):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False, indent=2, sort_keys=True)
+        fh.write("\n")
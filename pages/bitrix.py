@@ -1,9 +1,130 @@
 # pages/bitrix.py
-import logging, requests
+import logging, os, threading, time
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
 
+from . import timing
+
 log = logging.getLogger(__name__)
 
+# больше 50 команд batch Bitrix не принимает
+BATCH_LIMIT = 50
+
+
+class BitrixUnavailable(Exception):
+    """Предохранитель разомкнут — в сеть не ходим."""
+
+
+class BitrixClient:
+    """
+    Клиент вебхука с долгоживущей requests.Session: DNS/TCP/TLS платим
+    один раз на процесс, дальше keep-alive из пула.
+
+    Предохранитель: после breaker_threshold ошибок подряд (сеть или 5xx)
+    breaker_cooldown секунд сразу кидаем BitrixUnavailable, потом пускаем
+    пробный запрос. Счётчики — в stats().
+    """
+
+    def __init__(self, base_url: str, *, connect_timeout: float = 2.0, read_timeout: float = 4.0,
+                 pool_maxsize: int = 8, breaker_threshold: int = 5, breaker_cooldown: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        self.session = requests.Session()
+        # повторяем только неудачный connect — запрос до Bitrix не дошёл, дубля лида не будет
+        retry = Retry(total=1, connect=1, read=0, status=0, other=0)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_until = 0.0
+        self._stats = {"requests": 0, "errors": 0, "short_circuited": 0,
+                       "latency_ms_total": 0.0, "latency_ms_max": 0.0}
+
+    def call(self, method: str, payload: dict, read_timeout: float | None = None) -> tuple[int, dict]:
+        """
+        POST {base}/{method}.json. Возвращает (HTTP-статус, json-ответ).
+        Сетевые ошибки пробрасывает, при разомкнутом предохранителе — BitrixUnavailable.
+        """
+        with self._lock:
+            if time.monotonic() < self._opened_until:
+                self._stats["short_circuited"] += 1
+                raise BitrixUnavailable("circuit open")
+
+        t0 = time.perf_counter()
+        try:
+            r = self.session.post(f"{self.base_url}/{method}.json", json=payload,
+                                  timeout=(self.connect_timeout, read_timeout or self.read_timeout))
+            data = r.json()
+        except Exception:
+            self._record(t0, ok=False)
+            raise
+        self._record(t0, ok=r.status_code < 500)
+        return r.status_code, data
+
+    def _record(self, t0: float, ok: bool):
+        ms = (time.perf_counter() - t0) * 1000
+        timing.add("http", ms / 1000)
+        with self._lock:
+            st = self._stats
+            st["requests"] += 1
+            st["latency_ms_total"] += ms
+            st["latency_ms_max"] = max(st["latency_ms_max"], ms)
+            if ok:
+                self._failures = 0
+                return
+            st["errors"] += 1
+            self._failures += 1
+            if self._failures >= self.breaker_threshold:
+                if self._opened_until <= time.monotonic():
+                    log.warning("Bitrix circuit open for %ss after %s errors", self.breaker_cooldown, self._failures)
+                self._opened_until = time.monotonic() + self.breaker_cooldown
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._opened_until
+
+    def stats(self) -> dict:
+        with self._lock:
+            st = dict(self._stats)
+        st["latency_ms_avg"] = st["latency_ms_total"] / st["requests"] if st["requests"] else 0.0
+        st["circuit_open"] = self.is_open
+        return st
+
+
+_client: BitrixClient | None = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_client() -> BitrixClient:
+    """
+    Клиент на процесс. После fork (gunicorn --preload) заводим новый —
+    сокеты пула родителя делить нельзя.
+    """
+    global _client, _client_pid
+    base = settings.BITRIX_WEBHOOK_URL
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid() or _client.base_url != base.rstrip("/"):
+            _client = BitrixClient(
+                base,
+                connect_timeout=settings.BITRIX_CONNECT_TIMEOUT,
+                read_timeout=settings.BITRIX_READ_TIMEOUT,
+                pool_maxsize=settings.BITRIX_POOL_MAXSIZE,
+                breaker_threshold=settings.BITRIX_BREAKER_THRESHOLD,
+                breaker_cooldown=settings.BITRIX_BREAKER_COOLDOWN,
+            )
+            _client_pid = os.getpid()
+        return _client
+
 def normalize_phone_ru(phone: str) -> str:
     import re
     d = re.sub(r"\D+", "", phone or "")
@@ -11,15 +132,15 @@ def normalize_phone_ru(phone: str) -> str:
     if not d.startswith("7"): d = "7" + d
     return f"+{d}" if d else ""
 
-def send_lead_to_bitrix(*, name: str, phone: str, message: str = "",
-                        utm: dict | None = None, source: str = "", referer: str = "") -> tuple[bool, str]:
+def phone_digits_ru(phone: str) -> str:
+    """Только цифры нормализованного номера (79991234567); без цифр — пустая строка."""
+    return normalize_phone_ru(phone)[1:] if any(ch.isdigit() for ch in phone or "") else ""
+
+def build_lead_payload(*, name: str, phone: str, message: str = "",
+                       utm: dict | None = None, source: str = "", referer: str = "") -> dict:
     """
-    Шлёт crm.lead.add через вебхук. Возвращает (ok, err_msg)
+    Тело crm.lead.add из данных заявки.
     """
-    base = settings.BITRIX_WEBHOOK_URL
-    if not base:
-        return False, "BITRIX_WEBHOOK_URL is empty"
-    url = f"{base}/crm.lead.add.json"
     payload = {
         "fields": {
             "TITLE": f"ULVIS заявка: {name or phone}",
@@ -42,17 +163,87 @@ def send_lead_to_bitrix(*, name: str, phone: str, message: str = "",
     for k in ("utm_source","utm_medium","utm_campaign","utm_content","utm_term"):
         if utm.get(k):
             payload["fields"][k.upper()] = utm[k]
+    return payload
+
+def send_lead_to_bitrix(*, name: str, phone: str, message: str = "",
+                        utm: dict | None = None, source: str = "", referer: str = "") -> tuple[bool, str]:
+    """
+    Шлёт crm.lead.add через вебхук. Возвращает (ok, err_msg)
+    """
+    base = settings.BITRIX_WEBHOOK_URL
+    if not base:
+        return False, "BITRIX_WEBHOOK_URL is empty"
+    payload = build_lead_payload(name=name, phone=phone, message=message,
+                                 utm=utm, source=source, referer=referer)
 
     try:
-        r = requests.post(url, json=payload, timeout=4.0)
-        data = r.json()
-        if r.ok and data.get("result"):
+        status, data = get_client().call("crm.lead.add", payload)
+        if status < 400 and data.get("result"):
             return True, ""
         err = (data.get("error_description")
                or data.get("error")
-               or f"HTTP {r.status_code}")
+               or f"HTTP {status}")
         log.warning("Bitrix lead failed: %s", err)
         return False, str(err)
+    except BitrixUnavailable as e:
+        return False, str(e)
     except Exception as e:
         log.exception("Bitrix lead exception")
         return False, str(e)
+
+def http_build_query(data, prefix: str = "") -> str:
+    """
+    PHP-шный http_build_query: команды batch Bitrix передаются строкой
+    вида crm.lead.add?fields[NAME]=...&fields[PHONE][0][VALUE]=...
+    """
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, (list, tuple)):
+        items = enumerate(data)
+    else:
+        return f"{quote(prefix, safe='[]')}={quote(str(data), safe='')}"
+    parts = []
+    for k, v in items:
+        key = f"{prefix}[{k}]" if prefix else str(k)
+        parts.append(http_build_query(v, key))
+    return "&".join(p for p in parts if p)
+
+def send_lead_batch(payloads: dict[str, dict], timeout: float = 10.0) -> dict[str, tuple[bool, str]]:
+    """
+    Шлёт пачку crm.lead.add одним вызовом batch.
+    payloads: {cmd_key: payload}. Возвращает {cmd_key: (ok, lead_id | err_msg)}
+    """
+    if len(payloads) > BATCH_LIMIT:
+        raise ValueError(f"batch is limited to {BATCH_LIMIT} commands")
+    base = settings.BITRIX_WEBHOOK_URL
+    if not base:
+        return {k: (False, "BITRIX_WEBHOOK_URL is empty") for k in payloads}
+
+    cmd = {k: "crm.lead.add?" + http_build_query(p) for k, p in payloads.items()}
+    try:
+        status, data = get_client().call("batch", {"halt": 0, "cmd": cmd}, read_timeout=timeout)
+    except BitrixUnavailable as e:
+        return {k: (False, str(e)) for k in payloads}
+    except Exception as e:
+        log.exception("Bitrix batch exception")
+        return {k: (False, str(e)) for k in payloads}
+
+    body = data.get("result") if status < 400 else None
+    if not isinstance(body, dict):
+        err = str(data.get("error_description") or data.get("error") or f"HTTP {status}")
+        log.warning("Bitrix batch failed: %s", err)
+        return {k: (False, err) for k in payloads}
+
+    # пустые result/result_error Bitrix отдаёт списком, а не объектом
+    results = body.get("result") or {}
+    errors = body.get("result_error") or {}
+    out = {}
+    for k in payloads:
+        if isinstance(results, dict) and results.get(k):
+            out[k] = (True, str(results[k]))
+        else:
+            e = errors.get(k) if isinstance(errors, dict) else None
+            if isinstance(e, dict):
+                e = e.get("error_description") or e.get("error")
+            out[k] = (False, str(e or "no result"))
+    return out
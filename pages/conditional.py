@@ -0,0 +1,90 @@
+# pages/conditional.py
+"""
+Условный GET для публичных страниц: ETag/Last-Modified и 304 без рендера.
+
+Last-Modified — максимум updated_at по моделям, от которых страница
+зависит (DEPENDS); считается раз на поколение контента и лежит в кеше.
+ETag — поколение + полный путь (+ CSRF-секрет): удаление записи (updated_at
+его не видит) двигает поколение, а новый секрет — это новый токен в форме,
+старое тело отдавать нельзя. Страницы без форм (оферта, политика) —
+forms=False: без секрета, без куки и Vary: Cookie, ETag общий для всех.
+"""
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Value
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+from .models import (AboutSection, Category, CategoryPhoto, ContactPage, GalleryImage, GallerySection, HeroSlide,
+                     LeadSection, OfferPage, PrivacyPage, Review, ReviewSection, USPItem, USPSection)
+from .pagecache import get_generation
+
+# base.html у всех: CTA и контакты в хедере/футере
+_BASE = [LeadSection, ContactPage]
+DEPENDS = {
+    "index": [HeroSlide, Category, USPSection, USPItem, AboutSection, GallerySection, GalleryImage,
+              ReviewSection, Review, *_BASE],
+    "catalog": [Category, *_BASE],
+    "category_detail": [Category, CategoryPhoto, *_BASE],
+    "contacts": _BASE,
+    "privacy": [PrivacyPage, *_BASE],
+    "offer": [OfferPage],
+}
+_EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def last_modified(name: str) -> datetime:
+    key = f"pages:lastmod:{name}:{get_generation()}"
+    value = cache.get(key)
+    if value is None:
+        # MAX по каждой модели, все одним UNION ALL
+        parts = [m.objects.order_by().annotate(k=Value(1)).values("k").annotate(v=Max("updated_at")).values_list("v")
+                 for m in DEPENDS[name]]
+        stamps = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+        value = max((v for (v,) in stamps if v), default=_EPOCH)
+        cache.set(key, value, settings.PAGE_CACHE_TIMEOUT or None)
+    return value
+
+
+def etag(name: str, request, forms: bool = True) -> str:
+    parts = [name, str(get_generation()), request.get_full_path()]
+    if forms:
+        # секрет заводим сразу: без куки он уйдёт в этом же ответе, и следующий запрос совпадёт
+        get_token(request)
+        parts.append(request.META.get("CSRF_COOKIE", ""))
+    raw = "|".join(parts)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def conditional_page(name: str, forms: bool = True):
+    """
+    @conditional_page("contacts") — ETag/Last-Modified на ответ, 304 вместо рендера.
+    forms=False — в теле нет CSRF-токена, ETag от куки не зависит.
+    """
+    def decorator(view):
+        if not iscoroutinefunction(view):
+            return condition(
+                etag_func=lambda request, *a, **kw: etag(name, request, forms),
+                last_modified_func=lambda request, *a, **kw: last_modified(name),
+            )(view)
+
+        # condition() зовёт эти функции синхронно прямо в event loop, а last_modified
+        # на промахе кеша идёт в БД — считаем оба значения заранее, в потоке
+        checked = condition(
+            etag_func=lambda request, *a, **kw: request._conditional[0],
+            last_modified_func=lambda request, *a, **kw: request._conditional[1],
+        )(view)
+
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            request._conditional = await sync_to_async(lambda: (etag(name, request, forms), last_modified(name)))()
+            return await checked(request, *args, **kwargs)
+
+        return inner
+
+    return decorator
@@ -0,0 +1,97 @@
+# pages/content.py
+"""
+Активный контент сайта: секции лендинга, CTA, контакты.
+
+Один объект на запрос (get_content), каждая часть грузится при первом
+обращении и дальше берётся из памяти. Дети секций (преимущества, картинки
+галереи, отзывы) приходят prefetch'ем вместе с секцией — по запросу на
+уровень, без N+1. Контекст-процессор active_content отдаёт в любой шаблон
+cta/contact/tel_href, так что вьюхам их больше не нужно собирать самим.
+Async-вьюхи (pages/async_views.py) зовут await content.aload(...) до рендера.
+"""
+from functools import cached_property
+
+from django.db.models import Prefetch
+from django.utils.functional import SimpleLazyObject
+
+from .bitrix import normalize_phone_ru
+from .models import (AboutSection, Category, ContactPage, GalleryImage, GallerySection, HeroSlide,
+                     LeadSection, Review, ReviewSection, USPItem, USPSection)
+from .pagecache import aget_generation, get_generation
+
+
+def _active(model):
+    return model.objects.filter(is_active=True).order_by("order", "id")
+
+
+def _with_children(model, relation, child, to_attr):
+    return _active(model).prefetch_related(Prefetch(relation, queryset=_active(child), to_attr=to_attr))
+
+
+# часть -> (queryset, True — весь список, False — первая запись)
+PARTS = {
+    "slides": (lambda: _active(HeroSlide), True),
+    "top_categories": (lambda: _active(Category)[:6], True),
+    "usp": (lambda: _with_children(USPSection, "items", USPItem, "active_items"), False),
+    "about": (lambda: _active(AboutSection), False),
+    "gallery": (lambda: _with_children(GallerySection, "images", GalleryImage, "active_images"), False),
+    "reviews_section": (lambda: _with_children(ReviewSection, "reviews", Review, "active_reviews"), False),
+    "cta": (lambda: _active(LeadSection), False),
+    "contact": (lambda: ContactPage.objects.filter(is_active=True), False),
+}
+
+
+class ActiveContent:
+    def __getattr__(self, name):
+        # сюда попадаем только на промахе: загруженная часть уже лежит в __dict__
+        try:
+            make, many = PARTS[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        qs = make()
+        value = self.__dict__[name] = list(qs) if many else qs.first()
+        return value
+
+    async def aload(self, *names):
+        """
+        Для async-вьюх: загрузить части через async ORM (поколение — через
+        async-кеш) заранее, чтобы шаблон и контекст-процессор уже не ходили
+        в БД и кеш из event loop.
+        """
+        for name in names:
+            if name in self.__dict__:
+                continue
+            if name == "generation":
+                # для {% fragment %}: cached_property возьмёт готовое из __dict__
+                self.generation = await aget_generation()
+                continue
+            make, many = PARTS[name]
+            qs = make()
+            self.__dict__[name] = [obj async for obj in qs] if many else await qs.afirst()
+
+    @cached_property
+    def generation(self):
+        """Поколение контента — одно на запрос, сколько бы {% fragment %} ни спросили."""
+        return get_generation()
+
+    @cached_property
+    def tel_href(self):
+        page = self.contact
+        return normalize_phone_ru(page.phone) if page and page.phone else None
+
+
+def get_content(request) -> ActiveContent:
+    content = getattr(request, "_active_content", None)
+    if content is None:
+        content = request._active_content = ActiveContent()
+    return content
+
+
+def active_content(request):
+    """Контекст-процессор. Ленивый: админка и страницы без base.html в БД не ходят."""
+    content = get_content(request)
+    return {
+        "cta": SimpleLazyObject(lambda: content.cta),
+        "contact": SimpleLazyObject(lambda: content.contact),
+        "tel_href": SimpleLazyObject(lambda: content.tel_href),
+    }
@@ -0,0 +1,108 @@
+# pages/delivery.py
+"""
+Доставка заявок в Bitrix через outbox-таблицу LeadDelivery.
+
+Вьюха только кладёт строку в той же транзакции, что и Lead; отправляет
+воркер (manage.py bitrix_worker) пачками через batch, с экспоненциальной
+паузой между попытками. Доставка at-least-once: если воркер упал между
+ответом Bitrix и записью статуса, заявка уйдёт ещё раз.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bitrix import BATCH_LIMIT, build_lead_payload, send_lead_batch
+from .models import LeadDelivery
+
+log = logging.getLogger(__name__)
+
+# пока воркер держит пачку, другие её не берут; упал — через LEASE возьмут снова
+LEASE = timedelta(minutes=2)
+
+
+def enqueue(lead, *, utm: dict | None = None, source: str = "", referer: str = "") -> LeadDelivery:
+    return LeadDelivery.objects.create(
+        lead=lead,
+        data={
+            "name": lead.name,
+            "phone": lead.phone,
+            "message": lead.message,
+            "utm": utm or {},
+            "source": source,
+            "referer": referer,
+        },
+    )
+
+
+def backoff(attempts: int) -> timedelta:
+    """30с, 1м, 2м, 4м… до BITRIX_DELIVERY_BACKOFF_MAX, плюс джиттер до 10%."""
+    delay = min(settings.BITRIX_DELIVERY_BACKOFF * 2 ** max(attempts - 1, 0),
+                settings.BITRIX_DELIVERY_BACKOFF_MAX)
+    return timedelta(seconds=delay * (1 + random.random() * 0.1))
+
+
+def claim_due(limit: int) -> list[LeadDelivery]:
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            LeadDelivery.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=now)
+            .select_related("lead")
+            .order_by("next_attempt_at", "id")[:limit]
+        )
+        if batch:
+            LeadDelivery.objects.filter(pk__in=[d.pk for d in batch]).update(next_attempt_at=now + LEASE)
+    return batch
+
+
+def _mark_sent(d: LeadDelivery, bitrix_id: str, now):
+    d.status = "sent"
+    d.bitrix_id = bitrix_id[:32]
+    d.sent_at = now
+    d.last_error = ""
+    d.save(update_fields=["status", "bitrix_id", "sent_at", "last_error", "attempts"])
+
+
+def _mark_failed(d: LeadDelivery, err: str, now):
+    d.last_error = err
+    if d.attempts >= settings.BITRIX_DELIVERY_MAX_ATTEMPTS:
+        d.status = "failed"
+        # как и раньше — отметка в заметке лида, чтобы менеджер увидел
+        lead = d.lead
+        lead.admin_note = (lead.admin_note or "") + f"\n[BITRIX FAIL] {err}"
+        lead.save(update_fields=["admin_note"])
+        log.warning("Bitrix delivery %s gave up after %s attempts: %s", d.pk, d.attempts, err)
+    else:
+        d.next_attempt_at = now + backoff(d.attempts)
+    d.save(update_fields=["status", "last_error", "next_attempt_at", "attempts"])
+
+
+def deliver_due(batch_size: int = BATCH_LIMIT) -> tuple[int, int]:
+    """
+    Одна итерация воркера: берёт пачку созревших доставок и шлёт её.
+    Возвращает (sent, failed).
+    """
+    batch = claim_due(min(batch_size, BATCH_LIMIT))
+    if not batch:
+        return 0, 0
+
+    # data хранит ровно kwargs build_lead_payload (см. enqueue)
+    payloads = {f"lead{d.pk}": build_lead_payload(**d.data) for d in batch}
+    results = send_lead_batch(payloads)
+
+    now = timezone.now()
+    sent = failed = 0
+    for d in batch:
+        d.attempts += 1
+        ok, res = results.get(f"lead{d.pk}", (False, "no result"))
+        if ok:
+            _mark_sent(d, res, now)
+            sent += 1
+        else:
+            _mark_failed(d, res, now)
+            failed += 1
+    return sent, failed
@@ -0,0 +1,219 @@
+# pages/export.py
+"""
+Выгрузка заявок в CSV/XLSX.
+
+Строки идут генератором из values_list().iterator(chunk_size) — без
+моделей и без всего набора в памяти; наружу отдаём кусками по ~64 КБ:
+
+* stream_response() — StreamingHttpResponse прямо из экшена админки;
+* ExportJob + manage.py export_worker — для больших диапазонов: файл
+  пишется в MEDIA_ROOT/exports/, автору уходит письмо со ссылкой.
+
+XLSX собирается руками (zip с data descriptor'ами пишется в поток без
+seek), отдельная библиотека не нужна.
+"""
+import csv
+import logging
+import pickle
+import re
+import secrets
+import tempfile
+import zipfile
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.mail import send_mail
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ExportJob, Lead
+
+log = logging.getLogger(__name__)
+
+COLUMNS = [
+    ("Дата", "created_at"), ("Имя", "name"), ("Телефон", "phone"), ("Сообщение", "message"),
+    ("Статус", "status"), ("Источник", "source"), ("UTM source", "utm_source"),
+    ("UTM medium", "utm_medium"), ("UTM campaign", "utm_campaign"), ("Referer", "referer"), ("IP", "ip"),
+]
+CHUNK_ROWS = 2000
+FLUSH_BYTES = 64 * 1024
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def rows(queryset, chunk_size: int = CHUNK_ROWS):
+    for created_at, *rest in queryset.values_list(*(f for _, f in COLUMNS)).iterator(chunk_size=chunk_size):
+        rest[2] = (rest[2] or "").replace("\n", " ")  # message
+        yield [timezone.localtime(created_at).strftime("%Y-%m-%d %H:%M"), *("" if v is None else str(v) for v in rest)]
+
+
+class _Buffer:
+    """Файлоподобный приёмник: csv.writer/zipfile пишут сюда, генератор забирает накопленное."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.pos = 0
+
+    def write(self, b):
+        if isinstance(b, str):
+            b = b.encode("utf-8")
+        self.data += b
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        out = bytes(self.data)
+        self.data.clear()
+        return out
+
+
+def csv_chunks(queryset):
+    buf = _Buffer()
+    writer = csv.writer(buf, delimiter=";")
+    writer.writerow([title for title, _ in COLUMNS])
+    for row in rows(queryset):
+        writer.writerow(row)
+        if len(buf.data) >= FLUSH_BYTES:
+            yield buf.take()
+    yield buf.take()
+
+
+_XML_BAD = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Заявки" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'),
+}
+
+
+def _xlsx_row(values) -> bytes:
+    cells = "".join(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_XML_BAD.sub("", v))}</t></is></c>'
+                    for v in values)
+    return f"<row>{cells}</row>".encode("utf-8")
+
+
+def xlsx_chunks(queryset):
+    buf = _Buffer()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in _XLSX_STATIC.items():
+            zf.writestr(name, xml)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(_xlsx_row(title for title, _ in COLUMNS))
+            for row in rows(queryset):
+                sheet.write(_xlsx_row(row))
+                if len(buf.data) >= FLUSH_BYTES:
+                    yield buf.take()
+            sheet.write(b"</sheetData></worksheet>")
+    yield buf.take()
+
+
+WRITERS = {"csv": csv_chunks, "xlsx": xlsx_chunks}
+
+
+def filename(fmt: str) -> str:
+    return f"leads_{timezone.localtime().strftime('%Y-%m-%d_%H-%M')}.{fmt}"
+
+
+def stream_response(queryset, fmt: str) -> StreamingHttpResponse:
+    resp = StreamingHttpResponse(WRITERS[fmt](queryset), content_type=CONTENT_TYPES[fmt])
+    resp["Content-Disposition"] = f'attachment; filename="{filename(fmt)}"'
+    return resp
+
+
+# --- выгрузка в файл -------------------------------------------------------
+
+def enqueue(queryset, fmt: str, user=None) -> ExportJob:
+    # фильтры/поиск/выделение из админки — через pickle Query (поддерживается Django)
+    return ExportJob.objects.create(user=user, fmt=fmt, query=pickle.dumps(queryset.query))
+
+
+def claim(limit: int = 1) -> list[ExportJob]:
+    """pending и зависшие running (воркер умер посреди выгрузки)."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.EXPORT_JOB_STALE)
+    with transaction.atomic():
+        jobs = list(
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(status__in=["pending", "running"])
+            .exclude(status="running", started_at__gt=stale)
+            .order_by("created_at", "id")[:limit]
+        )
+        for job in jobs:
+            job.status, job.started_at = "running", now
+            job.save(update_fields=["status", "started_at"])
+    return jobs
+
+
+def run(job: ExportJob) -> ExportJob:
+    try:
+        qs = Lead.objects.all()
+        qs.query = pickle.loads(job.query)
+        with tempfile.TemporaryFile() as tmp:
+            for chunk in WRITERS[job.fmt](qs):
+                tmp.write(chunk)
+            tmp.seek(0)
+            # случайный каталог: /media/ отдаётся nginx'ом, имя не должно угадываться
+            name = default_storage.save(f"exports/{secrets.token_urlsafe(16)}/{filename(job.fmt)}", File(tmp))
+    except Exception as e:
+        log.exception("export job %s failed", job.pk)
+        job.status, job.error = "failed", str(e)
+    else:
+        job.status, job.error, job.file = "done", "", name
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "file", "finished_at"])
+    notify(job)
+    return job
+
+
+def notify(job: ExportJob):
+    if not (job.user and job.user.email):
+        return
+    link = settings.SITE_URL.rstrip("/") + reverse("admin:pages_exportjob_download", args=[job.pk])
+    if job.status == "done":
+        subject, body = "Выгрузка заявок готова", f"Файл: {link}"
+    else:
+        subject, body = "Выгрузка заявок не удалась", job.error
+    try:
+        send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [job.user.email])
+    except Exception:
+        log.exception("export job %s: notification failed", job.pk)
@@ -0,0 +1,192 @@
+# pages/images.py
+"""
+Обработка загруженных картинок вне запроса.
+
+На сохранение модели с ImageField заводится ImageJob (уникален по файлу,
+так что повторные сохранения ничего не стоят). Дальше:
+
+* IMAGE_JOBS_MODE = "sync"  — обрабатываем сразу после коммита, в том же
+  процессе (dev, тесты);
+* IMAGE_JOBS_MODE = "queue" — обрабатывает manage.py image_worker пулом
+  процессов; задачи, зависшие в running дольше IMAGE_JOB_STALE, берутся
+  заново, так что упавший воркер ничего не теряет.
+
+Обработка: поворот по EXIF, вырезание метаданных, ужатие до IMAGE_MAX_SIDE,
+перекодирование в тот же формат и нарезка рендишенов (pages/thumbs.py).
+Уже нормализованный файл повторно не пережимается.
+"""
+import logging
+from datetime import timedelta
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import thumbs
+from .models import ImageJob
+from .pagecache import bump_generation
+
+log = logging.getLogger(__name__)
+
+# формат -> параметры Image.save при перекодировании оригинала
+REENCODE = {
+    "JPEG": {"quality": 85, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 85, "method": 4},
+}
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment")
+
+
+def _needs_normalize(im: Image.Image) -> bool:
+    if im.format not in REENCODE:
+        return False
+    if max(im.size) > settings.IMAGE_MAX_SIDE:
+        return True
+    if im.getexif().get(0x0112, 1) != 1:  # Orientation
+        return True
+    return any(k in im.info for k in METADATA_KEYS)
+
+
+def normalize(storage, name: str) -> str:
+    """
+    Поворот/ужатие/чистка метаданных оригинала. Новый файл пишется рядом,
+    под новым именем (storage.save на занятое имя даёт свободное); старый
+    не трогаем — его удаляет finish() уже после переключения поля, так что
+    страница между записью и сменой ссылки не ловит 404, а упавшая запись
+    не теряет картинку. Возвращает имя нового файла или name, если менять нечего.
+    """
+    with storage.open(name, "rb") as fh:
+        im = Image.open(fh)
+        fmt = im.format
+        if not _needs_normalize(im):
+            return name
+        icc = im.info.get("icc_profile")
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((settings.IMAGE_MAX_SIDE, settings.IMAGE_MAX_SIDE), Image.LANCZOS)
+        im.load()
+
+    if fmt == "JPEG" and im.mode not in ("RGB", "L"):
+        im = im.convert("RGB")
+    buf = BytesIO()
+    opts = dict(REENCODE[fmt])
+    if icc:
+        opts["icc_profile"] = icc  # цветовой профиль оставляем, остальное выкидываем
+    im.save(buf, format=fmt, **opts)
+
+    return storage.save(name, ContentFile(buf.getvalue()))
+
+
+def _storage(model_label: str, field: str):
+    return apps.get_model(model_label)._meta.get_field(field).storage
+
+
+def _discard(storage, name: str):
+    """Удалить файл вместе с его рендишенами."""
+    for fmt in thumbs.ENCODERS:
+        for _, rname in thumbs.renditions(storage, name, fmt):
+            storage.delete(rname)
+    storage.delete(name)
+
+
+def process_file(model_label: str, field: str, name: str) -> dict:
+    """
+    Чистая файловая работа, без БД — её и гоняет пул процессов.
+    """
+    storage = _storage(model_label, field)
+    if not storage.exists(name):
+        return {"name": name, "missing": True, "written": []}
+    new_name = normalize(storage, name)
+    # оригинал переписан — старые рендишены уже не о том
+    written = thumbs.generate_file(storage, new_name, force=new_name != name)
+    return {"name": new_name, "missing": False, "written": written}
+
+
+def enqueue_for_instance(instance) -> list[ImageJob]:
+    label = instance._meta.label_lower
+    jobs = []
+    for field in thumbs.image_fields(type(instance)):
+        ff = getattr(instance, field)
+        if not ff or thumbs.is_rendition(ff.name):
+            continue
+        try:
+            with transaction.atomic():
+                job, created = ImageJob.objects.get_or_create(
+                    model=label, object_id=instance.pk, field=field, name=ff.name)
+        except IntegrityError:
+            # параллельное сохранение уже завело задачу
+            continue
+        if created:
+            jobs.append(job)
+
+    if jobs and settings.IMAGE_JOBS_MODE == "sync":
+        transaction.on_commit(lambda: run_inline(jobs, instance))
+    return jobs
+
+
+def run_inline(jobs, instance=None):
+    """instance — тот, что сохраняли: ему же проставим новое имя файла, чтобы повторный save() не вернул старое."""
+    for job in jobs:
+        job.status, job.attempts, job.started_at = "running", job.attempts + 1, timezone.now()
+        job.save(update_fields=["status", "attempts", "started_at"])
+        try:
+            result = process_file(job.model, job.field, job.name)
+        except Exception as e:
+            log.exception("image job %s failed", job.pk)
+            finish(job, error=str(e))
+        else:
+            name = finish(job, result=result)
+            if instance is not None and name:
+                getattr(instance, job.field).name = name
+
+
+def claim(limit: int) -> list[ImageJob]:
+    """Берёт pending и зависшие running (воркер упал посреди задачи)."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.IMAGE_JOB_STALE)
+    with transaction.atomic():
+        jobs = list(
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(status__in=["pending", "running"])
+            .exclude(status="running", started_at__gt=stale)
+            .order_by("created_at", "id")[:limit]
+        )
+        for job in jobs:
+            job.status, job.attempts, job.started_at = "running", job.attempts + 1, now
+            job.save(update_fields=["status", "attempts", "started_at"])
+    return jobs
+
+
+def finish(job: ImageJob, result: dict | None = None, error: str = "") -> str | None:
+    """Итог задачи. Возвращает имя, на которое теперь указывает поле (None — ошибка или поле уже чужое)."""
+    job.finished_at = timezone.now()
+    if error:
+        job.error = error
+        job.status = "failed" if job.attempts >= settings.IMAGE_JOB_MAX_ATTEMPTS else "pending"
+        job.save(update_fields=["status", "error", "finished_at"])
+        return
+
+    job.status, job.error = "done", ""
+    renamed, stale, current = result["name"] != job.name, None, result["name"]
+    if renamed:
+        # новый файл уже записан: переключаем поле (без сигналов, чтобы не завести новую задачу),
+        # старый удаляем в самом конце. Поле успели сменить на другую загрузку — лишним стал новый.
+        model = apps.get_model(job.model)
+        swapped = model.objects.filter(pk=job.object_id, **{job.field: job.name}).update(**{job.field: result["name"]})
+        stale = job.name if swapped else result["name"]
+        current = result["name"] if swapped else None
+        job.name = result["name"]
+    try:
+        job.save(update_fields=["status", "error", "finished_at", "name"])
+    except IntegrityError:
+        job.delete()  # задача на новое имя уже есть
+    if result["written"] or renamed:
+        # новые рендишены — пусть страницы перерендерятся с srcset
+        bump_generation()
+    if stale:
+        # страницы со старой ссылкой уже вне кеша — файл больше никому не нужен
+        _discard(_storage(job.model, job.field), stale)
+    return current
@@ -0,0 +1,94 @@
+# pages/keyset.py
+"""
+Keyset-пагинация по (order, id) — Meta.ordering категорий.
+
+Страница — «per_page строк после/до ключа», без OFFSET и COUNT(*) на
+каждый запрос: глубокая страница стоит как первая. Курсор в урле
+непрозрачный (base64 от [направление, order, id]); битый — первая
+страница. Общее число приблизительное: COUNT кешируется до следующего
+сохранения контента (поколение pagecache).
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .pagecache import get_generation
+
+
+class KeysetPage:
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(direction: str, obj) -> str:
+    raw = json.dumps([direction, obj.order, obj.pk], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str | None):
+    """(направление, order, id) или None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        direction, order, pk = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if direction not in ("n", "p") or not isinstance(order, int) or not isinstance(pk, int):
+        return None
+    return direction, order, pk
+
+
+def approx_total(qs, name: str) -> int:
+    key = f"keyset:count:{name}:{get_generation()}"
+    total = cache.get(key)
+    if total is None:
+        total = qs.count()
+        cache.set(key, total, settings.PAGE_CACHE_TIMEOUT or None)
+    return total
+
+
+def paginate(qs, token: str | None, per_page: int, count_name: str | None = None) -> KeysetPage:
+    cursor = decode_cursor(token)
+    total = approx_total(qs, count_name) if count_name else None
+    if cursor and cursor[0] == "p":
+        _, order, pk = cursor
+        rows = list(qs.filter(order__lte=order).exclude(order=order, pk__gte=pk)
+                    .order_by("-order", "-pk")[:per_page + 1])
+        more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        prev_cur = encode_cursor("p", rows[0]) if more else None
+        next_cur = encode_cursor("n", rows[-1]) if rows else None
+    else:
+        if cursor:
+            _, order, pk = cursor
+            # не (a > x OR a = x AND b > y): диапазон по order индекс берёт напрямую
+            qs = qs.filter(order__gte=order).exclude(order=order, pk__lte=pk)
+        rows = list(qs.order_by("order", "pk")[:per_page + 1])
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        next_cur = encode_cursor("n", rows[-1]) if more else None
+        prev_cur = encode_cursor("p", rows[0]) if cursor and rows else None
+    return KeysetPage(rows, next_cur, prev_cur, total)
@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from pages import bench, keyset
+from pages.models import Category
+
+PER_PAGE = 12
+
+
+class Command(BaseCommand):
+    help = (
+        "Каталог на большом наборе категорий (отдельная тестовая БД): "
+        "offset-пагинация против keyset на разной глубине страниц."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=100_000)
+        parser.add_argument("--pages", default="1,10,100,1000,5000",
+                            help="Номера страниц через запятую")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, categories=100_000, pages="1,10,100,1000,5000", repeat=20, **options):
+        pages = [int(p) for p in pages.split(",")]
+        report = {"categories": categories, "per_page": PER_PAGE, "offset": {}, "keyset": {}}
+
+        with bench.isolated_db():
+            bench.seed_synthetic(categories=categories, photos=0, reviews=0, gallery=0)
+            active = Category.objects.filter(is_active=True).order_by("order", "id")
+            last_page = (active.count() - 1) // PER_PAGE + 1
+
+            for page in (p for p in pages if p <= last_page):
+                with override_settings(CATALOG_PAGINATION="offset"):
+                    report["offset"][page] = bench.measure({"path": f"/catalog/?page={page}"}, repeat)
+
+                path = "/catalog/"
+                if page > 1:
+                    # курсор «после последней строки предыдущей страницы» — как по ссылке «Вперёд»
+                    prev = active[(page - 1) * PER_PAGE - 1]
+                    path += "?cursor=" + keyset.encode_cursor("n", prev)
+                with override_settings(CATALOG_PAGINATION="keyset"):
+                    report["keyset"][page] = bench.measure({"path": path}, repeat)
+
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
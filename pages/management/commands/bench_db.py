@@ -0,0 +1,73 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Цена соединения с БД на главной: запросы с новым соединением на каждый "
+        "(как при CONN_MAX_AGE=0) против переиспользуемого (CONN_MAX_AGE / пул). "
+        "Кеш страниц на время замера выключен."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--path", default="/")
+
+    def handle(self, *args, requests=200, path="/", **options):
+        client = Client()
+        pooled = "pool" in connection.settings_dict.get("OPTIONS", {})
+        report = {"vendor": connection.vendor, "pool": pooled, "requests": requests, "path": path}
+
+        connect_ms = []
+        for _ in range(min(requests, 50)):
+            connection.close()
+            t0 = time.perf_counter()
+            connection.ensure_connection()
+            connect_ms.append((time.perf_counter() - t0) * 1000)
+        report["connect_ms_p50"] = round(_pct(connect_ms, 0.5), 3)
+
+        opened = []
+        connection_created.connect(lambda sender, **kw: opened.append(sender), weak=False,
+                                   dispatch_uid="bench_db:opened")
+        try:
+            with override_settings(PAGE_CACHE_TIMEOUT=0):
+                # тестовый Client отключает close_old_connections от request_started/finished,
+                # так что CONN_MAX_AGE=0 тут ничего бы не закрыл — закрываем сами, как это
+                # сделал бы request_finished (с пулом — возврат в пул)
+                for mode, per_request in (("per_request", True), ("persistent", False)):
+                    connection.close()
+                    client.get(path)  # прогрев шаблонов
+                    opened.clear()
+                    timings = []
+                    for _ in range(requests):
+                        t0 = time.perf_counter()
+                        if per_request:
+                            connection.close()
+                        resp = client.get(path)
+                        timings.append((time.perf_counter() - t0) * 1000)
+                        if resp.status_code != 200:
+                            raise CommandError(f"{path} -> {resp.status_code}")
+                    report[mode] = {
+                        "connections": len(opened),
+                        "mean_ms": round(statistics.fmean(timings), 3),
+                        "p50_ms": round(_pct(timings, 0.5), 3),
+                        "p95_ms": round(_pct(timings, 0.95), 3),
+                    }
+        finally:
+            connection_created.disconnect(dispatch_uid="bench_db:opened")
+            connection.close()
+
+        report["saved_per_request_ms"] = round(
+            report["per_request"]["mean_ms"] - report["persistent"]["mean_ms"], 3)
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
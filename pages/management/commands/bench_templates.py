@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from pages import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Время рендера страниц (отдельная тестовая БД, кеш страниц выключен): "
+        "шаблоны с диска, cached.Loader, cached.Loader + {% fragment %}."
+    )
+
+    def add_arguments(self, parser):
+        for key, value in bench.DATASET.items():
+            parser.add_argument(f"--{key}", type=int, default=value, help="Синтетика: сколько создать")
+        parser.add_argument("--repeat", type=int, default=30, help="Тёплых запросов на страницу")
+
+    def handle(self, *args, **opts):
+        dataset = {k: opts[k] for k in bench.DATASET}
+        with bench.isolated_db():
+            bench.seed_synthetic(**dataset)
+            report = bench.run_templates(repeat=opts["repeat"])
+        self.stdout.write(json.dumps({"dataset": dataset, "modes": report}, ensure_ascii=False, indent=2))
+
+        # коротко: tpl p50 (мс) / запросы по режимам
+        modes = list(report)
+        self.stderr.write("page".ljust(18) + "".join(m.rjust(26) for m in modes))
+        for page in report[modes[0]]:
+            cells = (f"{report[m][page]['tpl_p50_ms']:.2f}ms / {report[m][page]['queries']}q" for m in modes)
+            self.stderr.write(page.ljust(18) + "".join(c.rjust(26) for c in cells))
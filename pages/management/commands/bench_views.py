@@ -0,0 +1,54 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from pages import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Запросы к БД, p50/p95 и размер ответа для всех страниц pages/urls.py "
+        "на отдельной тестовой БД. Код выхода 1 — регрессия против базовой линии."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fixture", help="Данные из фикстуры (например db.json) вместо синтетики")
+        for key, value in bench.DATASET.items():
+            parser.add_argument(f"--{key}", type=int, default=value, help="Синтетика: сколько создать")
+        parser.add_argument("--repeat", type=int, default=30, help="Тёплых запросов на страницу")
+        parser.add_argument("--baseline", default=str(bench.BASELINE_PATH))
+        parser.add_argument("--update-baseline", action="store_true", help="Записать результат как базовую линию")
+        parser.add_argument("--time-factor", type=float, default=2.0)
+        parser.add_argument("--slack-ms", type=float, default=10.0)
+
+    def handle(self, *args, **opts):
+        dataset = {"fixture": opts["fixture"]} if opts["fixture"] else {k: opts[k] for k in bench.DATASET}
+
+        # картинки фикстуры лежат в настоящем MEDIA_ROOT
+        with bench.isolated_db(media=not opts["fixture"]):
+            if opts["fixture"]:
+                call_command("loaddata", opts["fixture"], verbosity=0)
+            else:
+                bench.seed_synthetic(**dataset)
+            results = bench.run(repeat=opts["repeat"])
+
+        report = {"vendor": connection.vendor, "dataset": dataset, "results": results}
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+        if opts["update_baseline"]:
+            bench.save_baseline({"dataset": dataset, "results": results}, opts["baseline"])
+            self.stderr.write(f"baseline written to {opts['baseline']}")
+            return
+
+        try:
+            baseline = bench.load_baseline(opts["baseline"])
+        except FileNotFoundError:
+            raise CommandError(f"no baseline at {opts['baseline']}, run with --update-baseline")
+        if baseline["dataset"] != dataset:
+            self.stderr.write(f"warning: baseline was measured on {baseline['dataset']}")
+        problems = bench.compare(results, baseline["results"], opts["time_factor"], opts["slack_ms"])
+        if problems:
+            raise CommandError("regressions:\n  " + "\n  ".join(problems))
+        self.stderr.write("no regressions")
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pages.bitrix import BATCH_LIMIT
+from pages.delivery import deliver_due
+
+
+class Command(BaseCommand):
+    help = "Отправляет заявки из очереди LeadDelivery в Bitrix (batch, ретраи с backoff)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Один проход по очереди и выход")
+        parser.add_argument("--batch-size", type=int, default=BATCH_LIMIT)
+        parser.add_argument("--interval", type=float, default=2.0,
+                            help="Пауза между опросами пустой очереди, сек")
+
+    def handle(self, *args, once=False, batch_size=BATCH_LIMIT, interval=2.0, **options):
+        while True:
+            # долгий цикл вне запроса: CONN_MAX_AGE и health check отрабатываем сами
+            close_old_connections()
+            sent, failed = deliver_due(batch_size)
+            if sent or failed:
+                self.stdout.write(f"sent={sent} failed={failed}")
+            if once:
+                # в --once вычерпываем всё созревшее
+                if not (sent or failed):
+                    return
+                continue
+            if not (sent or failed):
+                time.sleep(interval)
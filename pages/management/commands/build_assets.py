@@ -0,0 +1,83 @@
+import hashlib
+import platform
+import stat
+import subprocess
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+TAILWIND_VERSION = "3.4.17"
+TAILWIND_URL = "https://github.com/tailwindlabs/tailwindcss/releases/download/v{version}/tailwindcss-{plat}"
+
+# версии прибиты: обновление — правкой здесь и пересборкой
+VENDOR = [
+    ("https://cdn.jsdelivr.net/npm/swiper@11.2.10/swiper-bundle.min.js", "vendor/swiper-bundle.min.js"),
+    ("https://cdn.jsdelivr.net/npm/swiper@11.2.10/swiper-bundle.min.css", "vendor/swiper-bundle.min.css"),
+    ("https://cdn.jsdelivr.net/npm/glightbox@3.3.1/dist/js/glightbox.min.js", "vendor/glightbox.min.js"),
+    ("https://cdn.jsdelivr.net/npm/glightbox@3.3.1/dist/css/glightbox.min.css", "vendor/glightbox.min.css"),
+]
+
+
+def _download(url: str, timeout: float = 60) -> bytes:
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+        return r.read()
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает css/tailwind.css (только классы из pages/templates/**, минифицировано) "
+        "и кладёт Swiper/GLightbox в vendor/ (pages/static или ASSETS_DIR). Хеши в именах добавит "
+        "collectstatic с ManifestStaticFilesStorage (STATIC_MANIFEST=1)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tailwind", default=settings.TAILWIND_CLI,
+                            help="Путь к standalone Tailwind CLI; по умолчанию скачивается в .cache/")
+        parser.add_argument("--skip-vendor", action="store_true", help="Не перекачивать JS/CSS библиотек")
+
+    def handle(self, *args, tailwind="", skip_vendor=False, **options):
+        app_dir = Path(__file__).resolve().parents[2]
+        # ASSETS_DIR — при сборке образа (Dockerfile), иначе рядом с остальной статикой
+        static_dir = Path(settings.ASSETS_DIR) if settings.ASSETS_DIR else app_dir / "static"
+
+        if not skip_vendor:
+            for url, rel in VENDOR:
+                data = _download(url)
+                dest = static_dir / rel
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                dest.write_bytes(data)
+                self.stdout.write(f"{rel}  {len(data)} B  sha256:{hashlib.sha256(data).hexdigest()[:16]}")
+
+        # tailwind.css пишется последним: по нему шаблоны понимают, что сборка есть
+        cli = Path(tailwind) if tailwind else self._fetch_tailwind()
+        out = static_dir / "css" / "tailwind.css"
+        cmd = [
+            str(cli),
+            "-i", str(app_dir / "assets" / "tailwind.css"),
+            "-o", str(out),
+            "--content", str(app_dir / "templates" / "**" / "*.html"),
+            "--minify",
+        ]
+        res = subprocess.run(cmd, capture_output=True, text=True)
+        if res.returncode:
+            raise CommandError(f"tailwind failed: {res.stderr.strip()}")
+        self.stdout.write(f"css/tailwind.css  {out.stat().st_size} B")
+
+    def _fetch_tailwind(self) -> Path:
+        system = {"Linux": "linux", "Darwin": "macos"}.get(platform.system())
+        arch = {"x86_64": "x64", "amd64": "x64", "aarch64": "arm64", "arm64": "arm64"}.get(platform.machine().lower())
+        if not system or not arch:
+            raise CommandError("нет сборки Tailwind CLI под эту платформу, укажите --tailwind")
+        plat = f"{system}-{arch}"
+
+        path = Path(settings.BASE_DIR) / ".cache" / f"tailwindcss-{TAILWIND_VERSION}-{plat}"
+        if not path.exists():
+            self.stdout.write(f"downloading tailwindcss {TAILWIND_VERSION} ({plat})")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".part")
+            tmp.write_bytes(_download(TAILWIND_URL.format(version=TAILWIND_VERSION, plat=plat), timeout=300))
+            tmp.chmod(tmp.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+            tmp.rename(path)
+        return path
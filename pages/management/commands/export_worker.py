@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pages import export
+
+
+class Command(BaseCommand):
+    help = "Выгружает заявки в файлы по очереди ExportJob (экшены «в фоне» в админке)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Разобрать очередь и выйти")
+        parser.add_argument("--interval", type=float, default=5.0,
+                            help="Пауза между опросами пустой очереди, сек")
+
+    def handle(self, *args, once=False, interval=5.0, **options):
+        while True:
+            close_old_connections()
+            jobs = export.claim()
+            for job in jobs:
+                job = export.run(job)
+                self.stdout.write(f"export {job.pk}: {job.status} {job.file.name if job.file else job.error}")
+            if not jobs:
+                if once:
+                    return
+                time.sleep(interval)
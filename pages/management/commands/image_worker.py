@@ -0,0 +1,48 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pages.images import claim, finish, process_file
+
+
+def _init_worker(settings_module):
+    # дочерний процесс: только файлы и Pillow, в БД не ходит
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Обрабатывает очередь ImageJob пулом процессов (EXIF, ужатие, рендишены)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 2)
+        parser.add_argument("--once", action="store_true", help="Разобрать очередь и выйти")
+        parser.add_argument("--interval", type=float, default=2.0,
+                            help="Пауза между опросами пустой очереди, сек")
+
+    def handle(self, *args, processes=2, once=False, interval=2.0, **options):
+        settings_module = os.environ.get("DJANGO_SETTINGS_MODULE", "furniture_site.settings")
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(settings_module,)) as pool:
+            while True:
+                close_old_connections()
+                jobs = claim(processes * 2)
+                if not jobs:
+                    if once:
+                        return
+                    time.sleep(interval)
+                    continue
+
+                futures = {pool.submit(process_file, j.model, j.field, j.name): j for j in jobs}
+                for fut in as_completed(futures):
+                    job = futures[fut]
+                    try:
+                        finish(job, result=fut.result())
+                        self.stdout.write(f"done {job.name}")
+                    except Exception as e:
+                        finish(job, error=str(e))
+                        self.stderr.write(f"failed {job.name}: {e}")
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from itertools import count
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from pages.models import Lead
+
+SOURCE = "loadtest"  # так помечаем заявки прогона, потом удаляем
+SERVERS = {
+    "wsgi": ["furniture_site.wsgi:application"],
+    "asgi": ["furniture_site.asgi:application", "-k", "uvicorn_worker.UvicornWorker"],
+}
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный прогон WSGI против ASGI: по очереди поднимает gunicorn в каждом режиме "
+        "(sync-воркеры с потоками / uvicorn + async-вьюхи) на текущей БД и гоняет страницы и "
+        "POST /lead/ (с CSRF, без троттлинга). Заявки прогона потом удаляются. Не на проде: "
+        "bitrix_worker, если запущен, успеет их отправить."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", default="wsgi,asgi")
+        parser.add_argument("--paths", default="/,/catalog/,/lead/",
+                            help="Через запятую; /lead/ — POST формы, остальное GET")
+        parser.add_argument("--requests", type=int, default=2000, help="На каждый путь")
+        parser.add_argument("--concurrency", type=int, default=200, help="Одновременных запросов")
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=4, help="Потоков на sync-воркер (wsgi)")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--keep-leads", action="store_true")
+
+    def handle(self, *args, **opts):
+        modes = [m.strip() for m in opts["modes"].split(",") if m.strip()]
+        if unknown := set(modes) - set(SERVERS):
+            raise CommandError(f"unknown modes: {', '.join(sorted(unknown))}")
+        paths = [p.strip() for p in opts["paths"].split(",") if p.strip()]
+        base = f"http://127.0.0.1:{opts['port']}"
+
+        report = {"vendor": connection.vendor,
+                  "requests": opts["requests"], "concurrency": opts["concurrency"],
+                  "workers": opts["workers"], "results": {}}
+        try:
+            for mode in modes:
+                server = self.start(mode, opts)
+                try:
+                    self.wait_ready(base, server)
+                    report["results"][mode] = {
+                        path: asyncio.run(self.load(base, path, opts["requests"], opts["concurrency"]))
+                        for path in paths
+                    }
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+        finally:
+            if not opts["keep_leads"]:
+                Lead.objects.filter(source=SOURCE).delete()
+
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+    def start(self, mode, opts):
+        cmd = [sys.executable, "-m", "gunicorn", *SERVERS[mode], "--bind", f"127.0.0.1:{opts['port']}",
+               "--workers", str(opts["workers"]), "--log-level", "warning"]
+        if mode == "wsgi":
+            cmd += ["--threads", str(opts["threads"])]
+        env = {**os.environ, "SERVER_MODE": mode, "LEAD_THROTTLE": "0"}
+        if mode == "wsgi":
+            env.pop("ASYNC_VIEWS", None)
+        self.stderr.write(f"{mode}: {' '.join(cmd[2:])}")
+        return subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env)
+
+    def wait_ready(self, base, server, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"server exited with {server.returncode}")
+            try:
+                httpx.get(base + "/", timeout=1.0)
+                return
+            except httpx.TransportError:
+                time.sleep(0.2)
+        raise CommandError("server did not start")
+
+    async def load(self, base, path, total, concurrency):
+        post = path.rstrip("/") == "/lead"
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60.0) as client:
+            token = ""
+            if post:
+                # кука csrftoken с главной; её же секрет годится как токен формы
+                await client.get("/")
+                token = client.cookies.get("csrftoken", "")
+            phones = count(1)
+            todo = iter(range(total))
+            timings, statuses = [], {}
+
+            async def one():
+                if post:
+                    data = {"csrfmiddlewaretoken": token, "name": "Нагрузка", "source": SOURCE,
+                            "phone": f"+7999{next(phones):07d}"}
+                    return await client.post(path, data=data, headers={"X-Requested-With": "XMLHttpRequest",
+                                                                         "Referer": base + "/"})
+                return await client.get(path)
+
+            async def worker():
+                for _ in todo:
+                    t0 = time.perf_counter()
+                    try:
+                        status = (await one()).status_code
+                    except httpx.HTTPError as e:
+                        status = type(e).__name__
+                    timings.append((time.perf_counter() - t0) * 1000)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+            elapsed = time.perf_counter() - started
+
+        return {
+            "rps": round(total / elapsed, 1),
+            "p50_ms": round(_pct(timings, 0.5), 1),
+            "p95_ms": round(_pct(timings, 0.95), 1),
+            "p99_ms": round(_pct(timings, 0.99), 1),
+            "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        }
@@ -0,0 +1,25 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from pages.pagecache import bump_generation
+from pages.thumbs import generate_for_instance, image_fields
+
+
+class Command(BaseCommand):
+    help = "Создаёт WebP/AVIF-рендишены для уже загруженных картинок."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Перегенерировать существующие")
+
+    def handle(self, *args, force=False, **options):
+        total = 0
+        for model in apps.get_app_config("pages").get_models():
+            fields = image_fields(model)
+            if not fields:
+                continue
+            for obj in model.objects.only("pk", *fields).iterator():
+                total += len(generate_for_instance(obj, force=force))
+        if total:
+            # страницы и запомненные списки рендишенов (srcset) — заново
+            bump_generation()
+        self.stdout.write(f"written={total}")
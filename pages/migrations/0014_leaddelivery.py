@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0013_alter_privacypage_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(default=dict, verbose_name='Данные для Bitrix')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('sent', 'Отправлена'), ('failed', 'Не доставлена')], default='pending', max_length=12, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('bitrix_id', models.CharField(blank=True, max_length=32, verbose_name='ID лида в Bitrix')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Отправлено')),
+                ('lead', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='delivery', to='pages.lead', verbose_name='Заявка')),
+            ],
+            options={
+                'verbose_name': 'Доставка в Bitrix',
+                'verbose_name_plural': 'Доставки в Bitrix',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='leaddelivery_due_idx')],
+            },
+        ),
+    ]
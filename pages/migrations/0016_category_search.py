@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:25
+
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+# индексы только для Postgres: на SQLite нет ни GIN, ни pg_trgm
+INDEXES = [
+    ("category_search_gin", "CREATE INDEX IF NOT EXISTS category_search_gin ON pages_category USING gin (search_vector)"),
+    ("category_title_trgm", "CREATE INDEX IF NOT EXISTS category_title_trgm ON pages_category USING gin (title gin_trgm_ops)"),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for _, sql in INDEXES:
+        schema_editor.execute(sql)
+
+    Category = apps.get_model("pages", "Category")
+    CategoryPhoto = apps.get_model("pages", "CategoryPhoto")
+    photos = (CategoryPhoto.objects.filter(category=OuterRef("pk"), is_active=True)
+              .order_by().values("category").annotate(t=StringAgg("title", " ")).values("t"))
+    Category.objects.update(search_vector=(
+        SearchVector("title", weight="A", config="russian")
+        + SearchVector("description", weight="B", config="russian")
+        + SearchVector(Subquery(photos), weight="C", config="russian")
+    ))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0015_imagejob'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='category',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:28
+
+import re
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+# копия pages.bitrix.phone_digits_ru на момент миграции — код приложения может поменяться
+def phone_digits_ru(phone):
+    d = re.sub(r"\D+", "", phone or "")
+    if not d:
+        return ""
+    if d.startswith("8"):
+        d = "7" + d[1:]
+    if not d.startswith("7"):
+        d = "7" + d
+    return d
+
+
+def fill_phone_digits(apps, schema_editor):
+    Lead = apps.get_model("pages", "Lead")
+    batch = []
+    for lead in Lead.objects.only("pk", "phone").iterator(chunk_size=2000):
+        lead.phone_digits = phone_digits_ru(lead.phone)
+        batch.append(lead)
+        if len(batch) >= 2000:
+            Lead.objects.bulk_update(batch, ["phone_digits"])
+            batch = []
+    if batch:
+        Lead.objects.bulk_update(batch, ["phone_digits"])
+
+
+# подстрока из середины номера — GIN по триграммам (pg_trgm включён в 0016), только Postgres
+def create_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS lead_phone_trgm ON pages_lead USING gin (phone_digits gin_trgm_ops)")
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS lead_phone_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0016_category_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32, verbose_name='Телефон (цифры)'),
+        ),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(django.db.models.functions.text.Reverse('phone_digits'), name='lead_phone_rev_idx'),
+        ),
+        migrations.RunPython(create_trgm_index, drop_trgm_index),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0017_lead_phone_digits'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order', 'id'], name='category_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='categoryphoto',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'order', 'id'], name='catphoto_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='galleryimage',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['section', 'order', 'id'], name='galleryimg_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='heroslide',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order', 'id'], name='heroslide_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['-created_at'], name='lead_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['status', '-created_at'], name='lead_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['source', '-created_at'], name='lead_source_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['utm_source', '-created_at'], name='lead_utm_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['section', 'order', 'id'], name='review_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uspitem',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['section', 'order', 'id'], name='uspitem_active_order_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:05
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+# text_pattern_ops — только на Postgres; на прочих базах остаётся индекс по выражению из 0017
+def pattern_ops(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS lead_phone_rev_idx")
+        schema_editor.execute(
+            "CREATE INDEX lead_phone_rev_idx ON pages_lead ((reverse(phone_digits)) text_pattern_ops)")
+
+
+def plain(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS lead_phone_rev_idx")
+        schema_editor.execute("CREATE INDEX lead_phone_rev_idx ON pages_lead ((reverse(phone_digits)))")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0020_updated_at'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(model_name='lead', name='lead_phone_rev_idx'),
+                migrations.AddIndex(
+                    model_name='lead',
+                    index=models.Index(
+                        django.contrib.postgres.indexes.OpClass(
+                            django.db.models.functions.text.Reverse('phone_digits'), name='text_pattern_ops'),
+                        name='lead_phone_rev_idx'),
+                ),
+            ],
+            database_operations=[migrations.RunPython(pattern_ops, plain)],
+        ),
+    ]
@@ -1,7 +1,21 @@
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Reverse
+from django.utils import timezone
 from django.utils.text import slugify
 from ckeditor_uploader.fields import RichTextUploadingField
 
+from .bitrix import phone_digits_ru
+
+
+def active_order_index(name, *prefix):
+    """
+    Частичный индекс (prefix..., order, id) WHERE is_active — ровно под
+    публичные filter(is_active=True).order_by("order", "id"): без сортировки и без скрытых строк.
+    """
+    return models.Index(fields=[*prefix, "order", "id"], condition=models.Q(is_active=True), name=name)
+
 # Create your models here.
 class HeroSlide(models.Model):
     title = models.CharField("Заголовок", max_length=120, blank=True)
@@ -11,9 +25,11 @@ class HeroSlide(models.Model):
     image = models.ImageField("Фон", upload_to="slides/")
     is_active = models.BooleanField("Показывать", default=True)
     order = models.PositiveIntegerField("Порядок", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["order", "id"]
+        indexes = [active_order_index("heroslide_active_order_idx")]
         verbose_name = "Слайд хиро"
         verbose_name_plural = "Слайды хиро"
 
@@ -34,12 +50,16 @@ class Category(models.Model):
     # SEO (по желанию)
     meta_title = models.CharField("SEO Title", max_length=160, blank=True)
     meta_description = models.CharField("SEO Description", max_length=240, blank=True)
+    # поиск: пересчитывают сигналы (pages/search.py), заполняется только на Postgres
+    search_vector = SearchVectorField(null=True, editable=False)
 
     is_active = models.BooleanField("Показывать", default=True)
     order = models.PositiveIntegerField("Порядок", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["order", "id"]
+        indexes = [active_order_index("category_active_order_idx")]
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
 
@@ -68,10 +88,12 @@ class CategoryPhoto(models.Model):
     size       = models.CharField("Размер в сетке", max_length=12, choices=Size.choices, default=Size.NORMAL)
     is_active  = models.BooleanField("Показывать", default=True)
     order      = models.PositiveIntegerField("Порядок", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ("order","id")
+        indexes = [active_order_index("catphoto_active_order_idx", "category")]
         verbose_name = "Фото категории"
         verbose_name_plural = "Фото категории"
 
@@ -86,6 +108,7 @@ class USPSection(models.Model):
     image = models.ImageField("Изображение слева", upload_to="usp/", blank=True, null=True)
     is_active = models.BooleanField("Показывать", default=True)
     order = models.PositiveIntegerField("Порядок", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["order", "id"]
@@ -112,9 +135,11 @@ class USPItem(models.Model):
     icon = models.CharField("Иконка", max_length=24, choices=ICON_CHOICES, default="star")
     is_active = models.BooleanField("Показывать", default=True)
     order = models.PositiveIntegerField("Порядок", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["order", "id"]
+        indexes = [active_order_index("uspitem_active_order_idx", "section")]
         verbose_name = "Преимущество"
         verbose_name_plural = "Преимущества"
 
@@ -125,6 +150,7 @@ class USPItem(models.Model):
 class AboutSection(models.Model):
     is_active = models.BooleanField("Показывать секцию", default=True)
     order = models.PositiveIntegerField("Порядок", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     title = models.CharField("Заголовок", max_length=120, default="О компании")
     subtitle = models.CharField("Подзаголовок", max_length=255, blank=True)
@@ -149,6 +175,7 @@ class GallerySection(models.Model):
     title = models.CharField("Заголовок", max_length=160, default="Наша мебель в интерьере")
     is_active = models.BooleanField("Показывать секцию", default=True)
     order = models.PositiveIntegerField("Порядок", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["order", "id"]
@@ -172,9 +199,11 @@ class GalleryImage(models.Model):
     size = models.CharField("Размер в сетке", max_length=8, choices=SIZE_CHOICES, default="auto")
     is_active = models.BooleanField("Показывать", default=True)
     order = models.PositiveIntegerField("Порядок", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["order", "id"]
+        indexes = [active_order_index("galleryimg_active_order_idx", "section")]
         verbose_name = "Картинка галереи"
         verbose_name_plural = "Картинки галереи"
 
@@ -186,6 +215,7 @@ class GalleryImage(models.Model):
 class ReviewSection(models.Model):
     is_active   = models.BooleanField("Показывать секцию", default=True)
     order       = models.PositiveIntegerField("Порядок", default=0)
+    updated_at  = models.DateTimeField(auto_now=True)
     title       = models.CharField("Заголовок", max_length=160, default="Отзывы клиентов")
     subtitle    = models.CharField("Подзаголовок", max_length=255, blank=True)
     bg_image    = models.ImageField("Фоновое изображение", upload_to="reviews/", blank=True, null=True)
@@ -211,10 +241,12 @@ class Review(models.Model):
     avatar      = models.ImageField("Аватар", upload_to="reviews/avatars/", blank=True, null=True)
     is_active   = models.BooleanField("Показывать", default=True)
     order       = models.PositiveIntegerField("Порядок", default=0)
+    updated_at  = models.DateTimeField(auto_now=True)
     date        = models.DateField("Дата", blank=True, null=True)
 
     class Meta:
         ordering = ["order", "id"]
+        indexes = [active_order_index("review_active_order_idx", "section")]
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
 
@@ -229,6 +261,7 @@ from django.core.validators import RegexValidator
 class LeadSection(models.Model):
     is_active  = models.BooleanField("Показывать секцию", default=True)
     order      = models.PositiveIntegerField("Порядок", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
     title      = models.CharField("Заголовок", max_length=160, default="Мы спроектируем и изготовим, доставим бесплатно")
     subtitle   = models.CharField("Подзаголовок", max_length=255, blank=True)
     bg_image   = models.ImageField("Фон", upload_to="cta/", blank=True, null=True)
@@ -248,6 +281,8 @@ ru_phone_validator = RegexValidator(
 class Lead(models.Model):
     name      = models.CharField("Имя", max_length=120)
     phone     = models.CharField("Телефон", max_length=32, validators=[ru_phone_validator])
+    # для поиска в админке: 79991234567, заполняется в save()
+    phone_digits = models.CharField("Телефон (цифры)", max_length=32, blank=True, editable=False, db_index=True)
     message   = models.TextField("Сообщение", blank=True)
     utm_source = models.CharField("utm_source", max_length=80, blank=True)
     utm_medium = models.CharField("utm_medium", max_length=80, blank=True)
@@ -264,9 +299,50 @@ class Lead(models.Model):
         ordering = ["-created_at"]
         verbose_name = "Заявка"
         verbose_name_plural = "Заявки"
+        indexes = [
+            # поиск по хвосту номера ("последние 4 цифры") — префикс перевёрнутой строки;
+            # text_pattern_ops: иначе LIKE 'x%' под не-C collation индекс не берёт (в БД — см. 0021)
+            models.Index(OpClass(Reverse("phone_digits"), name="text_pattern_ops"), name="lead_phone_rev_idx"),
+            # список в админке: сортировка, date_hierarchy и фильтры сайдбара
+            models.Index(fields=["-created_at"], name="lead_created_idx"),
+            models.Index(fields=["status", "-created_at"], name="lead_status_created_idx"),
+            models.Index(fields=["source", "-created_at"], name="lead_source_created_idx"),
+            models.Index(fields=["utm_source", "-created_at"], name="lead_utm_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} — {self.phone}"
+
+    def save(self, *args, **kwargs):
+        self.phone_digits = phone_digits_ru(self.phone)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_digits"}
+        super().save(*args, **kwargs)
+
+
+class LeadDelivery(models.Model):
+    """Outbox: заявка, которую воркер (manage.py bitrix_worker) должен донести до Bitrix."""
+    STATUS_CHOICES = [("pending", "В очереди"), ("sent", "Отправлена"), ("failed", "Не доставлена")]
+
+    lead       = models.OneToOneField(Lead, on_delete=models.CASCADE, related_name="delivery", verbose_name="Заявка")
+    data       = models.JSONField("Данные для Bitrix", default=dict)
+    status     = models.CharField("Статус", max_length=12, choices=STATUS_CHOICES, default="pending")
+    attempts   = models.PositiveIntegerField("Попыток", default=0)
+    next_attempt_at = models.DateTimeField("Следующая попытка", default=timezone.now)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    bitrix_id  = models.CharField("ID лида в Bitrix", max_length=32, blank=True)
+    created_at = models.DateTimeField("Создано", auto_now_add=True)
+    sent_at    = models.DateTimeField("Отправлено", blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "next_attempt_at"], name="leaddelivery_due_idx")]
+        verbose_name = "Доставка в Bitrix"
+        verbose_name_plural = "Доставки в Bitrix"
+
+    def __str__(self):
+        return f"{self.lead} [{self.status}]"
     
 
 class ContactPage(models.Model):
@@ -345,4 +421,58 @@ class PrivacyPage(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)[:64]
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class ImageJob(models.Model):
+    """Обработка загруженной картинки (pages/images.py, manage.py image_worker)."""
+    STATUS_CHOICES = [("pending", "В очереди"), ("running", "В работе"), ("done", "Готово"), ("failed", "Ошибка")]
+
+    model       = models.CharField("Модель", max_length=64)
+    object_id   = models.PositiveBigIntegerField("ID объекта")
+    field       = models.CharField("Поле", max_length=64)
+    name        = models.CharField("Файл", max_length=255)
+    status      = models.CharField("Статус", max_length=12, choices=STATUS_CHOICES, default="pending")
+    attempts    = models.PositiveIntegerField("Попыток", default=0)
+    error       = models.TextField("Ошибка", blank=True)
+    created_at  = models.DateTimeField("Создано", auto_now_add=True)
+    started_at  = models.DateTimeField("Начато", blank=True, null=True)
+    finished_at = models.DateTimeField("Закончено", blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            # один и тот же файл обрабатываем один раз, повторные сохранения — no-op
+            models.UniqueConstraint(fields=["model", "object_id", "field", "name"], name="imagejob_unique_file"),
+        ]
+        indexes = [models.Index(fields=["status", "created_at"], name="imagejob_status_idx")]
+        verbose_name = "Обработка картинки"
+        verbose_name_plural = "Обработка картинок"
+
+    def __str__(self):
+        return f"{self.name} [{self.status}]"
+
+
+class ExportJob(models.Model):
+    """Выгрузка заявок в файл (pages/export.py, manage.py export_worker)."""
+    STATUS_CHOICES = [("pending", "В очереди"), ("running", "В работе"), ("done", "Готово"), ("failed", "Ошибка")]
+    FORMAT_CHOICES = [("csv", "CSV"), ("xlsx", "XLSX")]
+
+    user        = models.ForeignKey("auth.User", on_delete=models.SET_NULL, blank=True, null=True,
+                                    verbose_name="Кто запросил")
+    fmt         = models.CharField("Формат", max_length=8, choices=FORMAT_CHOICES, default="csv")
+    query       = models.BinaryField("Запрос")  # pickle Query с фильтрами из админки
+    status      = models.CharField("Статус", max_length=12, choices=STATUS_CHOICES, default="pending")
+    file        = models.FileField("Файл", upload_to="exports/", blank=True)
+    error       = models.TextField("Ошибка", blank=True)
+    created_at  = models.DateTimeField("Создано", auto_now_add=True)
+    started_at  = models.DateTimeField("Начато", blank=True, null=True)
+    finished_at = models.DateTimeField("Закончено", blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"], name="exportjob_status_idx")]
+        verbose_name = "Выгрузка заявок"
+        verbose_name_plural = "Выгрузки заявок"
+
+    def __str__(self):
+        return f"{self.get_fmt_display()} от {self.created_at:%Y-%m-%d %H:%M} [{self.status}]"
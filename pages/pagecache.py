@@ -0,0 +1,124 @@
+# pages/pagecache.py
+"""
+Кеш отрендеренных страниц.
+
+Ключ страницы содержит «поколение» контента: любое сохранение/удаление
+модели из админки двигает счётчик (см. pages/signals.py), и все старые
+записи просто перестают читаться. Пер-запросные куски (CSRF-токен)
+в кеш не попадают — рендерим с плейсхолдером и подставляем на выдаче.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render
+from django.template.loader import render_to_string
+
+GENERATION_KEY = "pages:generation"
+CSRF_PLACEHOLDER = "__pagecache_csrf_token__"
+
+
+def get_generation() -> int:
+    """
+    Текущее поколение контента. Если ключ выпал из кеша — начинаем
+    с текущего времени, чтобы не воскресить старые страницы.
+    """
+    gen = cache.get(GENERATION_KEY)
+    if gen is None:
+        cache.add(GENERATION_KEY, int(time.time()), None)
+        gen = cache.get(GENERATION_KEY, 0)
+    return gen
+
+
+async def aget_generation() -> int:
+    """get_generation для async-вьюх: кеш через aget/aadd, event loop не ждёт Redis."""
+    gen = await cache.aget(GENERATION_KEY)
+    if gen is None:
+        await cache.aadd(GENERATION_KEY, int(time.time()), None)
+        gen = await cache.aget(GENERATION_KEY, 0)
+    return gen
+
+
+def bump_generation() -> None:
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # ключа нет — get_generation заведёт новый
+        cache.add(GENERATION_KEY, int(time.time()), None)
+    except Exception:
+        # кеш лёг — страницы доживут до PAGE_CACHE_TIMEOUT
+        pass
+
+
+def page_key(name: str, *variant, generation: int | None = None) -> str:
+    parts = [f"page:{name}", f"g{get_generation() if generation is None else generation}"]
+    parts.extend(str(v) for v in variant)
+    return ":".join(parts)
+
+
+def render_cached(request, name, template_name, build_context, variant=()):
+    """
+    render() с кешем. build_context вызывается только на промахе,
+    так что на тёплом кеше запросов в БД нет вовсе.
+    variant — то, от чего зависит разметка (флаги из урла и т.п.).
+    """
+    if request.method != "GET" or not settings.PAGE_CACHE_TIMEOUT:
+        request._page_cache = "bypass"
+        return render(request, template_name, build_context())
+
+    try:
+        key = page_key(name, *variant)
+        html = cache.get(key)
+    except Exception:
+        request._page_cache = "bypass"
+        return render(request, template_name, build_context())
+
+    request._page_cache = "miss" if html is None else "hit"  # для трассировки (pages/tracing.py)
+    if html is None:
+        ctx = build_context()
+        ctx["csrf_token"] = CSRF_PLACEHOLDER
+        html = render_to_string(template_name, ctx, request)
+        try:
+            cache.set(key, html, settings.PAGE_CACHE_TIMEOUT)
+        except Exception:
+            pass
+
+    # get_token ещё и помечает, что куку csrftoken надо выставить
+    return HttpResponse(html.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+
+async def arender(request, template_name, context):
+    """
+    render() для async-вьюх — в потоке: {% fragment %} ходит в синхронный кеш,
+    а ленивые части контекста на его промахе — в БД; event loop этого не ждёт.
+    """
+    return await sync_to_async(render)(request, template_name, context)
+
+
+async def arender_cached(request, name, template_name, build_context, variant=()):
+    """render_cached для async-вьюх: build_context — корутина, в кеш через aget/aset."""
+    if request.method != "GET" or not settings.PAGE_CACHE_TIMEOUT:
+        request._page_cache = "bypass"
+        return await arender(request, template_name, await build_context())
+
+    try:
+        key = page_key(name, *variant, generation=await aget_generation())
+        html = await cache.aget(key)
+    except Exception:
+        request._page_cache = "bypass"
+        return await arender(request, template_name, await build_context())
+
+    request._page_cache = "miss" if html is None else "hit"
+    if html is None:
+        ctx = await build_context()
+        ctx["csrf_token"] = CSRF_PLACEHOLDER
+        html = await sync_to_async(render_to_string)(template_name, ctx, request)
+        try:
+            await cache.aset(key, html, settings.PAGE_CACHE_TIMEOUT)
+        except Exception:
+            pass
+
+    return HttpResponse(html.replace(CSRF_PLACEHOLDER, get_token(request)))
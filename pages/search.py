@@ -0,0 +1,61 @@
+# pages/search.py
+"""
+Поиск по каталогу.
+
+Postgres: Category.search_vector (название — вес A, описание — B, подписи
+активных фото — C; конфиг russian со стеммингом) под GIN-индексом,
+ранжирование ts_rank. Опечатки добирает pg_trgm по названию
+(word_similarity, тоже GIN). Вектор пересчитывают сигналы на сохранение
+категории и её фото, так что поиск не зависит от размера каталога.
+
+Остальные БД (SQLite локально и в тестах) — icontains по тем же полям.
+Slug в обоих случаях — icontains, как было в каталоге до полнотекста.
+"""
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, Exists, F, OuterRef, Q, Subquery, Value, When
+
+from .models import Category, CategoryPhoto
+
+CONFIG = "russian"
+
+
+def is_supported() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def _vector():
+    photos = (CategoryPhoto.objects.filter(category=OuterRef("pk"), is_active=True)
+              .order_by().values("category").annotate(t=StringAgg("title", " ")).values("t"))
+    return (SearchVector("title", weight="A", config=CONFIG)
+            + SearchVector("description", weight="B", config=CONFIG)
+            + SearchVector(Subquery(photos), weight="C", config=CONFIG))
+
+
+def update_vectors(pks=None) -> int:
+    """Пересчёт search_vector (всех категорий или pks). Не на Postgres — ничего."""
+    if not is_supported():
+        return 0
+    qs = Category.objects.all() if pks is None else Category.objects.filter(pk__in=pks)
+    return qs.update(search_vector=_vector())
+
+
+def search_categories(qs, q: str):
+    """Фильтр + сортировка по релевантности, при равенстве — как в каталоге."""
+    q = (q or "").strip()
+    if not q:
+        return qs.order_by("order", "id")
+
+    if is_supported():
+        query = SearchQuery(q, config=CONFIG, search_type="websearch")
+        # slug — как в старом поиске каталога: латиницей ("kuhni") тоже находится
+        return (qs.filter(Q(search_vector=query) | Q(title__trigram_word_similar=q) | Q(slug__icontains=q))
+                .annotate(rank=SearchRank(F("search_vector"), query) + TrigramWordSimilarity(q, "title"))
+                .order_by("-rank", "order", "id"))
+
+    photos = CategoryPhoto.objects.filter(category=OuterRef("pk"), is_active=True, title__icontains=q)
+    return (qs.filter(Q(title__icontains=q) | Q(description__icontains=q) | Q(slug__icontains=q) | Exists(photos))
+            .annotate(rank=Case(When(title__icontains=q, then=Value(2)),
+                                When(description__icontains=q, then=Value(1)), default=Value(0)))
+            .order_by("-rank", "order", "id"))
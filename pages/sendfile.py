@@ -0,0 +1,53 @@
+# pages/sendfile.py
+"""
+Отдача файлов из MEDIA.
+
+MEDIA_ACCEL_REDIRECT задан (прод за nginx) — отвечаем пустым телом с
+X-Accel-Redirect на internal-локацию (nginx/default.conf): Python только
+находит файл, саму передачу (sendfile, Range) делает nginx, воркер
+gunicorn свободен. Content-Type и Content-Disposition nginx берёт из
+нашего ответа — те же, что поставил бы FileResponse (CONTENT_TYPES).
+Не задан или storage не локальный — FileResponse. Под ASGI — aserve:
+тело идёт async-итератором с чтением в потоке, иначе Django ругается
+на синхронный итератор и буферизует файл через sync_to_async.
+"""
+import mimetypes
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+# как FileResponse.set_headers: сжатый файл — архив, а не Content-Encoding
+# (иначе "оферта.pdf.gz" браузер распакует и покажет как pdf только за nginx)
+CONTENT_TYPES = {"br": "application/x-brotli", "bzip2": "application/x-bzip", "compress": "application/x-compress",
+                 "gzip": "application/gzip", "xz": "application/x-xz"}
+
+
+def serve(fieldfile, *, as_attachment: bool = False, filename: str | None = None):
+    filename = filename or fieldfile.name.rsplit("/", 1)[-1]
+    prefix = settings.MEDIA_ACCEL_REDIRECT
+    if not prefix or not isinstance(fieldfile.storage, FileSystemStorage):
+        return FileResponse(fieldfile.open("rb"), as_attachment=as_attachment, filename=filename)
+
+    content_type, encoding = mimetypes.guess_type(filename)
+    resp = HttpResponse(content_type=CONTENT_TYPES.get(encoding, content_type) or "application/octet-stream")
+    resp["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    resp["X-Accel-Redirect"] = quote(prefix.rstrip("/") + "/" + fieldfile.name)
+    return resp
+
+
+async def aserve(fieldfile, *, as_attachment: bool = False, filename: str | None = None):
+    # открытие файла и stat для Content-Length — тоже в потоке
+    resp = await sync_to_async(serve)(fieldfile, as_attachment=as_attachment, filename=filename)
+    if isinstance(resp, FileResponse):
+        resp.streaming_content = _achunks(resp.file_to_stream, resp.block_size)
+    return resp
+
+
+async def _achunks(f, size: int):
+    read = sync_to_async(f.read, thread_sensitive=False)
+    while chunk := await read(size):
+        yield chunk
@@ -0,0 +1,58 @@
+# pages/signals.py
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import images, search, thumbs
+from .pagecache import bump_generation
+
+# модели, которые на страницах не рендерятся — их сохранения кеш не трогают
+NON_CONTENT_MODELS = {"lead", "leaddelivery", "imagejob", "exportjob"}
+
+
+def _bump(sender, **kwargs):
+    # после коммита: промах кеша до него отрендерит старые строки под новым поколением
+    transaction.on_commit(bump_generation)
+
+
+def _make_thumbs(sender, instance, raw=False, **kwargs):
+    # loaddata — без обработки, для этого есть manage.py thumbnails
+    if not raw:
+        images.enqueue_for_instance(instance)
+
+
+def _reindex_category(sender, instance, **kwargs):
+    search.update_vectors([instance.pk])
+
+
+def _remember_photo_category(sender, instance, raw=False, **kwargs):
+    # фото переносят в другую категорию — старой тоже нужен пересчёт, запоминаем её до сохранения
+    if raw or not instance.pk or not search.is_supported():
+        return
+    instance._search_prev_category_id = (
+        sender.objects.filter(pk=instance.pk).values_list("category_id", flat=True).first())
+
+
+def _reindex_photo(sender, instance, **kwargs):
+    pks = {instance.category_id, getattr(instance, "_search_prev_category_id", None)}
+    search.update_vectors(sorted(pk for pk in pks if pk is not None))
+
+
+def connect():
+    for model in apps.get_app_config("pages").get_models():
+        # задача на картинки — раньше сброса кеша (в sync-режиме рендишены будут к рендеру)
+        if thumbs.image_fields(model):
+            post_save.connect(_make_thumbs, sender=model, dispatch_uid=f"thumbs:{model._meta.label_lower}")
+
+        if model._meta.model_name in NON_CONTENT_MODELS:
+            continue
+        uid = f"pagecache:{model._meta.label_lower}"
+        post_save.connect(_bump, sender=model, dispatch_uid=uid)
+        post_delete.connect(_bump, sender=model, dispatch_uid=uid)
+
+    # поисковый вектор категории собирается и из подписей её фото
+    Category, CategoryPhoto = apps.get_model("pages", "Category"), apps.get_model("pages", "CategoryPhoto")
+    post_save.connect(_reindex_category, sender=Category, dispatch_uid="search:category")
+    pre_save.connect(_remember_photo_category, sender=CategoryPhoto, dispatch_uid="search:categoryphoto")
+    post_save.connect(_reindex_photo, sender=CategoryPhoto, dispatch_uid="search:categoryphoto")
+    post_delete.connect(_reindex_photo, sender=CategoryPhoto, dispatch_uid="search:categoryphoto")
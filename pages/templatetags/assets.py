@@ -0,0 +1,20 @@
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+
+register = template.Library()
+
+
+@lru_cache(maxsize=1)
+def _built() -> bool:
+    return finders.find("css/tailwind.css") is not None
+
+
+@register.simple_tag
+def assets_built():
+    """
+    Собраны ли ассеты (manage.py build_assets). Нет — шаблон берёт CDN,
+    чтобы dev-окружение без сборки не осталось без стилей.
+    """
+    return _built()
@@ -0,0 +1,60 @@
+"""
+{% fragment "footer" [вариант ...] %}...{% endfragment %} — кусок шаблона в кеше.
+
+Ключ — имя, поколение контента (как у кеша страниц, pages/pagecache.py) и
+варианты: сохранение в админке сбрасывает фрагменты вместе со страницами.
+Нужен на промахе кеша страниц и на страницах без него (каталог, контакты):
+хедер/футер/галерея не рендерятся заново, а ленивые части контекста
+(contact, gallery...) на попадании не идут в БД.
+
+Внутрь — только то, что не зависит от запроса: CSRF-токен, user, messages
+закешируются чужими; что зависит от даты — в варианты (год в футере).
+Кеш здесь синхронный: async-вьюхи рендерят в потоке (pagecache.arender).
+FRAGMENT_CACHE_TIMEOUT=0 — выключить.
+"""
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+from ..content import get_content
+from ..pagecache import get_generation
+
+register = template.Library()
+
+
+def fragment_key(name: str, generation: int, *variant) -> str:
+    return ":".join([f"fragment:{name}", f"g{generation}", *(str(v) for v in variant)])
+
+
+class FragmentNode(template.Node):
+    def __init__(self, name, variant, nodelist):
+        self.name, self.variant, self.nodelist = name, variant, nodelist
+
+    def render(self, context):
+        if not settings.FRAGMENT_CACHE_TIMEOUT:
+            return self.nodelist.render(context)
+        try:
+            request = context.get("request")
+            generation = get_content(request).generation if request is not None else get_generation()
+            key = fragment_key(self.name.resolve(context), generation, *(v.resolve(context) for v in self.variant))
+            html = cache.get(key)
+        except Exception:
+            # кеш лёг — рендерим как без фрагментов
+            return self.nodelist.render(context)
+        if html is None:
+            html = self.nodelist.render(context)
+            try:
+                cache.set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+            except Exception:
+                pass
+        return html
+
+
+@register.tag
+def fragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a name")
+    nodelist = parser.parse(("endfragment",))
+    parser.delete_first_token()
+    return FragmentNode(parser.compile_filter(bits[1]), [parser.compile_filter(b) for b in bits[2:]], nodelist)
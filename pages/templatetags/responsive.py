@@ -0,0 +1,24 @@
+from django import template
+from django.utils.html import format_html
+
+from pages import thumbs
+from pages.content import get_content
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def srcset(context, fieldfile, sizes="100vw", fmt="webp"):
+    """
+    srcset/sizes для <img> или <source> по рендишенам из pages/thumbs.py:
+
+        <img src="{{ s.image.url }}" {% srcset s.image "100vw" %} ...>
+
+    Рендишенов нет — ничего не выводит, остаётся оригинал из src.
+    Есть request — список рендишенов запоминается на поколение контента.
+    """
+    request = context.get("request")
+    value = thumbs.srcset(fieldfile, fmt, get_content(request).generation if request is not None else None)
+    if not value:
+        return ""
+    return format_html('srcset="{}" sizes="{}"', value, sizes)
@@ -1,3 +1,1103 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.functions import Reverse
+from django.template import Context, Template
+from django.urls import include, path
+from django.test.utils import CaptureQueriesContext
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.test import (LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.testcases import LiveServerThread
+from django.utils import timezone
+
+from . import (async_views, bench, content, delivery, export, images, keyset, pagecache, search, thumbs, throttle, timing,
+               tracing)
+from .bitrix import BitrixClient, BitrixUnavailable
+from .models import (Category, CategoryPhoto, ContactPage, ExportJob, Lead, OfferPage, PrivacyPage, GalleryImage, GallerySection, HeroSlide, ImageJob, LeadDelivery, LeadSection,
+                     Review, ReviewSection)
+import numpy
+from PIL import Image
+import loadtest
+from loadtest.plans import Plan
+from loadtest.runner import _Stats
+from loadtest import sweep
+from loadtest.servers import local_shards
+from .urls import view_patterns
+from .views import _throttle_guard
+
+try:
+    import fakeredis
+except ImportError:  # локально можно и без него
+    fakeredis = None
+
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+FAKE_REDIS = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://fake-redis:6379/0",
+        "OPTIONS": {"connection_class": getattr(fakeredis, "FakeConnection", None)},
+    }
+}
+
+
+class ThrottleMixin:
+    def setUp(self):
+        caches["default"].clear()
+
+    def test_hit_many_counts(self):
+        specs = [("t:a", 60), ("t:b", 60)]
+        self.assertEqual(throttle.hit_many(specs), [1, 1])
+        self.assertEqual(throttle.hit_many(specs), [2, 2])
+        self.assertEqual(throttle.hit_many([("t:a", 60)]), [3])
+
+    def test_guard_ip_limit(self):
+        # 3/мин на IP, телефоны разные — чтобы не упереться в лимит номера
+        for i in range(3):
+            self.assertEqual(_throttle_guard("10.0.0.1", f"+7999000000{i}"), (False, ""))
+        throttled, msg = _throttle_guard("10.0.0.1", "+79990000009")
+        self.assertTrue(throttled)
+        self.assertIn("минуту", msg)
+
+    def test_guard_phone_limit(self):
+        for i in range(2):
+            self.assertFalse(_throttle_guard(f"10.0.1.{i}", "+79991112233")[0])
+        self.assertTrue(_throttle_guard("10.0.1.9", "+79991112233")[0])
+
+
+@override_settings(CACHES=LOCMEM)
+class LocMemThrottleTests(ThrottleMixin, SimpleTestCase):
+    pass
+
+
+@unittest.skipUnless(fakeredis, "fakeredis не установлен")
+@override_settings(CACHES=FAKE_REDIS)
+class RedisThrottleTests(ThrottleMixin, SimpleTestCase):
+    def test_single_round_trip_with_ttl(self):
+        import redis
+
+        backend = caches["default"]
+        orig = redis.client.Pipeline.execute
+        with mock.patch.object(redis.client.Pipeline, "execute", autospec=True,
+                               side_effect=orig) as execute:
+            _throttle_guard("10.0.2.1", "+79990001122")
+        self.assertEqual(execute.call_count, 1)
+
+        client = backend._cache.get_client(write=True)
+        key = backend.make_and_validate_key("lead:ip:10.0.2.1:m")
+        self.assertTrue(0 < client.ttl(key) <= 60)
+        # значение читается и штатным API кеша
+        self.assertEqual(backend.get("lead:ip:10.0.2.1:m"), 1)
+
+
+class BitrixStub:
+    """Локальный HTTP-стаб вебхука Bitrix: пишет запросы, отвечает как batch."""
+
+    def __init__(self, fail=False):
+        self.requests = []
+        self.peers = set()
+        self.fail = fail
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего Bitrix
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append((self.path, body))
+                stub.peers.add(self.client_address)
+                if stub.fail:
+                    data, code = {"error": "QUERY_LIMIT_EXCEEDED"}, 503
+                else:
+                    data = {"result": {"result": {k: 100 + i for i, k in enumerate(body["cmd"])},
+                                       "result_error": []}}
+                    code = 200
+                raw = json.dumps(data).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/rest/1/token"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(CACHES=LOCMEM, BITRIX_DELIVERY_MAX_ATTEMPTS=2)
+class LeadDeliveryTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.stub = BitrixStub()
+        self.addCleanup(self.stub.close)
+        patcher = override_settings(BITRIX_WEBHOOK_URL=self.stub.url)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def submit(self, phone="+79990001122"):
+        return self.client.post("/lead/?utm_source=ya", {"name": "Иван", "phone": phone, "message": "Кухня"},
+                                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+    def test_submit_only_enqueues(self):
+        resp = self.submit()
+        self.assertEqual(resp.json(), {"ok": True})
+        self.assertEqual(self.stub.requests, [])
+        d = LeadDelivery.objects.get()
+        self.assertEqual(d.status, "pending")
+        self.assertEqual(d.data["utm"]["utm_source"], "ya")
+
+    def test_worker_sends_batch(self):
+        self.submit("+79990001122")
+        self.submit("+79990003344")
+        call_command("bitrix_worker", "--once", stdout=io.StringIO())
+
+        self.assertEqual(len(self.stub.requests), 1)
+        path, body = self.stub.requests[0]
+        self.assertEqual(path, "/rest/1/token/batch.json")
+        self.assertEqual(len(body["cmd"]), 2)
+        cmd = next(iter(body["cmd"].values()))
+        self.assertTrue(cmd.startswith("crm.lead.add?"))
+        self.assertIn("fields[PHONE][0][VALUE]=%2B7999000", cmd)
+        self.assertIn("fields[UTM_SOURCE]=ya", cmd)
+        self.assertEqual(set(LeadDelivery.objects.values_list("status", flat=True)), {"sent"})
+        self.assertTrue(LeadDelivery.objects.filter(bitrix_id="100").exists())
+
+    def test_retry_with_backoff_then_give_up(self):
+        self.stub.fail = True
+        self.submit()
+        d = LeadDelivery.objects.get()
+
+        self.assertEqual(delivery.deliver_due(), (0, 1))
+        d.refresh_from_db()
+        self.assertEqual((d.status, d.attempts), ("pending", 1))
+        self.assertGreater(d.next_attempt_at, timezone.now())
+        self.assertIn("QUERY_LIMIT_EXCEEDED", d.last_error)
+        # ещё не созрела — воркер её не трогает
+        self.assertEqual(delivery.deliver_due(), (0, 0))
+
+        LeadDelivery.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(delivery.deliver_due(), (0, 1))
+        d.refresh_from_db()
+        self.assertEqual((d.status, d.attempts), ("failed", 2))
+        self.assertIn("[BITRIX FAIL]", d.lead.admin_note)
+
+
+class BitrixClientTests(SimpleTestCase):
+    def setUp(self):
+        self.stub = BitrixStub()
+        self.addCleanup(self.stub.close)
+
+    def test_reuses_connection(self):
+        client = BitrixClient(self.stub.url)
+        for _ in range(3):
+            status, data = client.call("batch", {"cmd": {"a": "crm.lead.add?x=1"}})
+            self.assertEqual(status, 200)
+        self.assertEqual(len(self.stub.requests), 3)
+        self.assertEqual(len(self.stub.peers), 1)
+        st = client.stats()
+        self.assertEqual((st["requests"], st["errors"]), (3, 0))
+        self.assertGreater(st["latency_ms_avg"], 0)
+
+    def test_circuit_breaker(self):
+        self.stub.fail = True
+        client = BitrixClient(self.stub.url, breaker_threshold=2, breaker_cooldown=60)
+        for _ in range(2):
+            status, _ = client.call("batch", {"cmd": {}})
+            self.assertEqual(status, 503)
+        with self.assertRaises(BitrixUnavailable):
+            client.call("batch", {"cmd": {}})
+        self.assertEqual(len(self.stub.requests), 2)
+        st = client.stats()
+        self.assertEqual((st["errors"], st["short_circuited"]), (2, 1))
+        self.assertTrue(st["circuit_open"])
+
+        # остыл — пробный запрос проходит и замыкает предохранитель
+        client._opened_until = 0
+        self.stub.fail = False
+        self.assertEqual(client.call("batch", {"cmd": {}})[0], 200)
+        self.assertFalse(client.is_open)
+
+
+def make_jpeg(size=(1200, 600), orientation=None):
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new("RGB", size, (200, 120, 40)).save(buf, "JPEG", exif=exif.tobytes())
+    return SimpleUploadedFile("hero.jpg", buf.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(CACHES=LOCMEM, THUMB_WIDTHS=(480, 960, 1440, 1920), THUMB_FORMATS=("webp",))
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        patcher = override_settings(MEDIA_ROOT=self.media)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def create_slide(self, **kwargs):
+        # IMAGE_JOBS_MODE=sync: обработка идёт в on_commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return HeroSlide.objects.create(title="s", image=make_jpeg(**kwargs))
+
+    def test_renditions_on_upload(self):
+        slide = self.create_slide()
+        base = os.path.join(self.media, "renditions", slide.image.name)
+        for w in (480, 960):
+            self.assertTrue(os.path.exists(f"{base}/{w}.webp"), w)
+        # не апскейлим: третья ширина — исходные 1200px под своим именем, 1440 и 1920 не пишем
+        self.assertEqual(sorted(os.listdir(base)), ["1200.webp", "480.webp", "960.webp"])
+        self.assertEqual(Image.open(f"{base}/480.webp").size, (480, 240))
+        self.assertEqual(Image.open(f"{base}/1200.webp").size, (1200, 600))
+
+    def test_srcset_tag(self):
+        slide = self.create_slide()
+        html = Template('{% load responsive %}<img {% srcset s.image "100vw" %}>').render(Context({"s": slide}))
+        url = f"/media/renditions/{slide.image.name}"
+        # дескриптор верхней — настоящая ширина источника, а не шаг THUMB_WIDTHS
+        self.assertIn(f'srcset="{url}/480.webp 480w, {url}/960.webp 960w, {url}/1200.webp 1200w"', html)
+        self.assertIn('sizes="100vw"', html)
+        # avif не нарезан — атрибутов нет
+        self.assertEqual(Template('{% load responsive %}{% srcset s.image fmt="avif" %}')
+                         .render(Context({"s": slide})), "")
+
+    def test_srcset_lists_renditions_once_per_generation(self):
+        slide = self.create_slide()
+        tpl = Template('{% load responsive %}<img {% srcset s.image "100vw" %}>')
+        listdir = mock.patch.object(FileSystemStorage, "listdir", autospec=True, side_effect=FileSystemStorage.listdir)
+        with listdir as spy:
+            for _ in range(3):
+                html = tpl.render(Context({"s": slide, "request": RequestFactory().get("/")}))
+            self.assertEqual(spy.call_count, 1)
+            self.assertIn("1200.webp 1200w", html)
+            # новые рендишены двигают поколение — список читается заново
+            pagecache.bump_generation()
+            tpl.render(Context({"s": slide, "request": RequestFactory().get("/")}))
+            self.assertEqual(spy.call_count, 2)
+
+    def test_upload_named_like_rendition_is_an_original(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (1000, 500)).save(buf, "WEBP")
+        with self.captureOnCommitCallbacks(execute=True):
+            slide = HeroSlide.objects.create(title="s", image=SimpleUploadedFile("kitchen_w480.webp", buf.getvalue()))
+        self.assertFalse(thumbs.is_rendition(slide.image.name))
+        self.assertEqual(ImageJob.objects.get().status, "done")
+        self.assertIn("960.webp 960w", thumbs.srcset(slide.image))
+
+
+@override_settings(CACHES=LOCMEM, THUMB_WIDTHS=(480, 960), THUMB_FORMATS=("webp",), IMAGE_MAX_SIDE=1000)
+class ImageJobTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        patcher = override_settings(MEDIA_ROOT=self.media)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.section = GallerySection.objects.create()
+
+    def upload(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return GalleryImage.objects.create(section=self.section, image=make_jpeg(**kwargs))
+
+    def test_sync_normalizes_original(self):
+        # 6 = повернуть на 90°: 1600x800 с EXIF-поворотом на деле портрет
+        img = self.upload(size=(1600, 800), orientation=6)
+        old_path = os.path.join(self.media, "gallery", "hero.jpg")
+        job = ImageJob.objects.get()
+        self.assertEqual((job.status, job.attempts, job.name), ("done", 1, img.image.name))
+        # новый файл под новым именем, старый удалён после переключения поля
+        self.assertNotEqual(img.image.path, old_path)
+        self.assertFalse(os.path.exists(old_path))
+        im = Image.open(img.image.path)
+        self.assertEqual(im.size, (500, 1000))
+        self.assertNotIn("exif", im.info)
+        self.assertTrue(os.path.exists(os.path.join(self.media, "renditions", img.image.name, "480.webp")))
+
+    @override_settings(IMAGE_JOBS_MODE="queue")
+    def test_failed_write_keeps_original(self):
+        img = self.upload(size=(1600, 800))
+        with mock.patch("django.core.files.storage.FileSystemStorage.save", side_effect=OSError("disk full")), \
+                self.assertLogs("pages.images", "ERROR"):
+            images.run_inline(list(ImageJob.objects.all()))
+        job = ImageJob.objects.get()
+        self.assertEqual((job.status, job.error), ("pending", "disk full"))
+        self.assertEqual(Image.open(img.image.path).size, (1600, 800))
+
+    def test_resave_is_noop(self):
+        img = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            img.alt = "кухня"
+            img.save()
+        self.assertEqual(ImageJob.objects.count(), 1)
+
+    @override_settings(IMAGE_JOBS_MODE="queue")
+    def test_queue_worker(self):
+        img = self.upload(size=(1600, 800))
+        job = ImageJob.objects.get()
+        self.assertEqual(job.status, "pending")
+        self.assertEqual(Image.open(img.image.path).size, (1600, 800))
+
+        call_command("image_worker", "--once", "--processes", "1", stdout=io.StringIO())
+        job.refresh_from_db()
+        img.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        self.assertEqual(Image.open(img.image.path).size, (1000, 500))
+
+    @override_settings(IMAGE_JOBS_MODE="queue")
+    def test_stale_running_job_is_reclaimed(self):
+        self.upload()
+        ImageJob.objects.update(status="running", attempts=1,
+                                started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(len(images.claim(10)), 1)
+        # свежий running не трогаем
+        self.assertEqual(images.claim(10), [])
+
+
+class BuildAssetsTests(SimpleTestCase):
+    def test_runs_tailwind_over_templates(self):
+        out = mock.Mock(returncode=0, stderr="")
+        with mock.patch("pages.management.commands.build_assets.subprocess.run", return_value=out) as run, \
+                mock.patch("pathlib.Path.stat", return_value=mock.Mock(st_size=1234)):
+            call_command("build_assets", "--skip-vendor", "--tailwind", "/opt/tailwindcss", stdout=io.StringIO())
+        cmd = run.call_args.args[0]
+        self.assertEqual(cmd[0], "/opt/tailwindcss")
+        self.assertIn("--minify", cmd)
+        self.assertTrue(cmd[cmd.index("--content") + 1].endswith(os.path.join("templates", "**", "*.html")))
+        self.assertTrue(cmd[cmd.index("-o") + 1].endswith(os.path.join("static", "css", "tailwind.css")))
+
+
+MANIFEST_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage"},
+}
+
+
+@override_settings(CACHES=LOCMEM)
+class StaticManifestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ContactPage.objects.create(phone="8 (999) 123-45-67")
+        LeadSection.objects.create(title="Оставьте заявку")  # без фона — запасной фон формы
+        sec = ReviewSection.objects.create()  # и у отзывов
+        Review.objects.create(section=sec, author="Клиент", text="ok")
+        PrivacyPage.objects.create(content="Текст политики")
+        Category.objects.create(title="Кухни", slug="kitchens", image="c.jpg")
+
+    def test_pages_render_hashed_static_with_debug_off(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with override_settings(STATIC_ROOT=root, STORAGES=MANIFEST_STORAGES):
+            call_command("collectstatic", "--noinput", verbosity=0)
+            # в DEBUG манифест не используется, а ссылка мимо манифеста — ValueError, т.е. 500
+            with override_settings(DEBUG=False):
+                for url in ("/", "/catalog/", "/catalog/kitchens/", "/contacts/", "/privacy/"):
+                    r = self.client.get(url)
+                    self.assertEqual(r.status_code, 200, url)
+                    self.assertRegex(r.content.decode(), r"/static/css/main\.[0-9a-f]{12}\.css", url)
+
+
+@override_settings(CACHES=LOCMEM, PAGE_CACHE_TIMEOUT=0)
+class ActiveContentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ContactPage.objects.create(phone="8 (999) 123-45-67", address="Москва")
+        LeadSection.objects.create(title="Оставьте заявку")
+        sec = ReviewSection.objects.create()
+        for i in range(5):
+            Review.objects.create(section=sec, author=f"Клиент {i}", text="ok", order=i)
+
+    def test_contacts_fetches_contact_once(self):
+        # контакт (страница + хедер/футер) и CTA — по запросу, без дублей; третий — Last-Modified
+        with self.assertNumQueries(3):
+            r = self.client.get("/contacts/")
+        self.assertContains(r, "tel:+79991234567")
+        self.assertContains(r, "Оставьте заявку")
+
+    def test_index_query_count_does_not_grow_with_children(self):
+        self.client.get("/")
+        sec = ReviewSection.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(section=sec, author="Ещё", text="ok", order=10)
+        with self.assertNumQueries(10):  # 9 секций/детей + Last-Modified нового поколения
+            r = self.client.get("/")
+        self.assertContains(r, "Ещё")
+
+
+@override_settings(CACHES=LOCMEM)
+class ConnectionBenchmarkTests(TransactionTestCase):
+    def test_modes_open_expected_connections(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("in-memory SQLite не закрывает соединение")
+        out = io.StringIO()
+        call_command("bench_db", "--requests", "5", stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["per_request"]["connections"], 5)
+        self.assertEqual(report["persistent"]["connections"], 0)
+
+
+@override_settings(CACHES=LOCMEM)
+class ViewBenchmarkTests(TransactionTestCase):
+    """
+    Сверка с pages/bench_baseline.json (manage.py bench_views --update-baseline).
+    TransactionTestCase: без внешней транзакции теста не будет лишних SAVEPOINT в подсчёте.
+    В обычном прогоне — только запросы и статусы: время на общем CI шумит. p95 сверяется
+    с BENCH_TIME_FACTOR=<множитель> (или в manage.py bench_views).
+    """
+
+    def test_no_regressions_against_baseline(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        baseline = bench.load_baseline()
+        with override_settings(MEDIA_ROOT=media):
+            bench.seed_synthetic(**baseline["dataset"])
+            results = bench.run(repeat=10)
+        factor = float(os.environ["BENCH_TIME_FACTOR"]) if os.environ.get("BENCH_TIME_FACTOR") else None
+        self.assertEqual(bench.compare(results, baseline["results"], time_factor=factor), [])
+
+
+class CatalogSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.desc = Category.objects.create(title="Шкафы", slug="shkafy", image="c.jpg", order=0,
+                                           description="Встроенные шкафы. Кухонные пеналы")
+        cls.title = Category.objects.create(title="Кухонные гарнитуры", slug="kuhni", image="c.jpg", order=5)
+        cls.photo = Category.objects.create(title="Столы", slug="stoly", image="c.jpg", order=1)
+        CategoryPhoto.objects.create(category=cls.photo, image="p.jpg", title="Кухонный остров")
+        Category.objects.create(title="Кухонные уголки", slug="hidden", image="c.jpg", is_active=False)
+
+    def test_fallback_ranks_title_over_description_and_photos(self):
+        qs = search.search_categories(Category.objects.filter(is_active=True), "Кухонн")
+        self.assertEqual(list(qs), [self.title, self.desc, self.photo])
+
+    def test_empty_query_keeps_catalog_order(self):
+        qs = search.search_categories(Category.objects.filter(is_active=True), "  ")
+        self.assertEqual(list(qs), [self.desc, self.photo, self.title])
+
+    def test_catalog_view_searches_description(self):
+        r = self.client.get("/catalog/", {"q": "пеналы"})
+        self.assertEqual(list(r.context["categories"]), [self.desc])
+
+    def test_slug_still_matches(self):
+        qs = search.search_categories(Category.objects.filter(is_active=True), "stol")
+        self.assertEqual(list(qs), [self.photo])
+
+    def test_moved_photo_reindexes_both_categories(self):
+        photo = CategoryPhoto.objects.get()
+        with mock.patch.object(search, "is_supported", return_value=True), \
+                mock.patch.object(search, "update_vectors") as update:
+            photo.category = self.desc
+            photo.save()
+        update.assert_called_once_with(sorted([self.desc.pk, self.photo.pk]))
+
+
+@override_settings(CACHES=LOCMEM)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # одинаковые order — порядок добивает id
+        Category.objects.bulk_create(
+            Category(title=f"К{i}", slug=f"k{i}", image="c.jpg", order=i // 4) for i in range(30))
+        cls.expected = list(Category.objects.order_by("order", "id"))
+
+    def test_walks_forward_and_back_without_gaps(self):
+        qs, seen, pages, token = Category.objects.all(), [], [], None
+        while True:
+            page = keyset.paginate(qs, token, 7)
+            pages.append(page)
+            seen += page.object_list
+            if not page.has_next:
+                break
+            token = page.next_cursor
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(pages[0].has_previous)
+
+        back = keyset.paginate(qs, pages[-1].previous_cursor, 7)
+        self.assertEqual(back.object_list, pages[-2].object_list)
+        self.assertEqual(keyset.paginate(qs, pages[1].previous_cursor, 7).object_list, pages[0].object_list)
+        self.assertFalse(keyset.paginate(qs, pages[1].previous_cursor, 7).has_previous)
+
+    def test_bad_cursor_is_first_page(self):
+        for token in ("garbage", "W10", keyset.encode_cursor("n", self.expected[0])[:-3]):
+            self.assertEqual(keyset.paginate(Category.objects.all(), token, 5).object_list, self.expected[:5])
+
+    @override_settings(CATALOG_PAGINATION="keyset")
+    def test_catalog_view(self):
+        r = self.client.get("/catalog/")
+        self.assertEqual(list(r.context["categories"]), self.expected[:12])
+        self.assertEqual(r.context["page_obj"].total, 30)
+        r = self.client.get("/catalog/", {"cursor": r.context["page_obj"].next_cursor})
+        self.assertEqual(list(r.context["categories"]), self.expected[12:24])
+        self.assertContains(r, "?cursor=")
+
+
+class LeadPhoneSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+        cls.admin = User.objects.create_superuser("admin", "a@example.com", "pw")
+        cls.a = Lead.objects.create(name="Анна", phone="8 (999) 123-45-67")
+        cls.b = Lead.objects.create(name="Борис", phone="+7 916 000-11-22")
+
+    def search(self, q):
+        self.client.force_login(self.admin)
+        r = self.client.get("/admin/pages/lead/", {"q": q})
+        return set(r.context["cl"].result_list)
+
+    def test_phone_digits_filled_on_save(self):
+        self.assertEqual(self.a.phone_digits, "79991234567")
+        self.a.phone = "+7 999 765-43-21"
+        self.a.save(update_fields=["phone"])
+        self.assertEqual(Lead.objects.get(pk=self.a.pk).phone_digits, "79997654321")
+
+    def test_admin_search_by_phone(self):
+        self.assertEqual(self.search("+7 (999) 123 45 67"), {self.a})
+        self.assertEqual(self.search("89991234567"), {self.a})
+        self.assertEqual(self.search("(916)"), {self.b})
+        self.assertEqual(self.search("123"), {self.a})  # от 3 цифр — кусок из середины
+        self.assertEqual(self.search("22"), {self.b})
+        self.assertEqual(self.search("99"), set())  # 1–2 цифры — только конец номера
+        self.assertEqual(self.search("Анна"), {self.a})
+
+
+class QueryPlanTests(TestCase):
+    """Планировщик берёт индексы из 0018 под реальные запросы вьюх и админки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cat = Category.objects.create(title="Кухни", slug="kuhni", image="c.jpg")
+        CategoryPhoto.objects.create(category=cls.cat, image="p.jpg")
+        cls.sec = ReviewSection.objects.create()
+        Review.objects.create(section=cls.sec, author="А", text="ok")
+        Lead.objects.create(name="А", phone="+79991234567")
+
+    def assertUsesIndex(self, qs, name):
+        if connection.vendor == "postgresql":
+            # на паре строк Postgres честно выберет seq scan
+            with connection.cursor() as cur:
+                cur.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn(name, qs.explain())
+
+    def test_public_listings(self):
+        self.assertUsesIndex(Category.objects.filter(is_active=True).order_by("order", "id")[:12],
+                             "category_active_order_idx")
+        self.assertUsesIndex(self.cat.photos.filter(is_active=True).order_by("order", "id"),
+                             "catphoto_active_order_idx")
+        self.assertUsesIndex(Review.objects.filter(is_active=True, section_id__in=[self.sec.pk]).order_by("order", "id"),
+                             "review_active_order_idx")
+
+    def test_lead_admin(self):
+        self.assertUsesIndex(Lead.objects.order_by("-created_at")[:50], "lead_created_idx")
+        self.assertUsesIndex(Lead.objects.filter(status="new").order_by("-created_at")[:50],
+                             "lead_status_created_idx")
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "text_pattern_ops — только Postgres")
+    def test_lead_phone_suffix(self):
+        # тот же фильтр, что у LeadAdmin.get_search_results на 1-2 цифры
+        qs = Lead.objects.alias(rev=Reverse("phone_digits")).filter(rev__startswith="76")
+        self.assertUsesIndex(qs, "lead_phone_rev_idx")
+
+
+class LeadExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+        cls.admin = User.objects.create_superuser("admin", "boss@example.com", "pw")
+        for i in range(5):
+            Lead.objects.create(name=f"Клиент {i}", phone=f"+7999123456{i}", message="строка\nвторая <&>",
+                                status="done" if i % 2 else "new")
+
+    def action(self, name, **extra):
+        self.client.force_login(self.admin)
+        ids = Lead.objects.filter(status="new").values_list("pk", flat=True)
+        return self.client.post("/admin/pages/lead/", {"action": name, "_selected_action": list(ids), **extra})
+
+    def test_csv_streams_selected_rows(self):
+        r = self.action("export_csv")
+        self.assertTrue(r.streaming)
+        lines = b"".join(r.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 3)
+        self.assertIn("строка вторая <&>", lines[1])
+
+    def test_xlsx_is_a_valid_workbook(self):
+        import zipfile
+        r = self.action("export_xlsx")
+        zf = zipfile.ZipFile(io.BytesIO(b"".join(r.streaming_content)))
+        sheet = zf.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(sheet.count("<row>"), 4)
+        self.assertIn("строка вторая &lt;&amp;&gt;", sheet)
+
+    def test_export_to_file_in_background(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media):
+            self.action("export_csv_file")
+            job = ExportJob.objects.get()
+            self.assertEqual(job.status, "pending")
+            call_command("export_worker", "--once", stdout=io.StringIO())
+            job.refresh_from_db()
+            self.assertEqual(job.status, "done")
+            self.assertTrue(job.file.name.startswith("exports/"))
+
+            r = self.client.get(f"/admin/pages/exportjob/{job.pk}/download/")
+            self.assertEqual(b"".join(r.streaming_content).decode().count("\n"), 4)
+        from django.core import mail
+        self.assertEqual(mail.outbox[0].to, ["boss@example.com"])
+        self.assertIn(f"/admin/pages/exportjob/{job.pk}/download/", mail.outbox[0].body)
+
+
+@override_settings(CACHES=LOCMEM)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.contact = ContactPage.objects.create(phone="+7 999 123-45-67")
+
+    def test_revalidation_returns_304_without_rendering(self):
+        r = self.client.get("/contacts/")
+        self.assertEqual(r.status_code, 200)
+        etag, last_modified = r["ETag"], r["Last-Modified"]
+
+        with self.assertNumQueries(0):
+            r = self.client.get("/contacts/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(self.client.get("/contacts/", HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_content_change_invalidates(self):
+        etag = self.client.get("/contacts/")["ETag"]
+        self.contact.phone = "+7 999 000-00-00"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contact.save()
+        r = self.client.get("/contacts/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, "000-00-00")
+
+    def test_generation_moves_after_commit(self):
+        before = pagecache.get_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.contact.phone = "+7 999 000-00-00"
+                self.contact.save()
+                # до коммита промах кеша положил бы старые строки под новое поколение
+                self.assertEqual(pagecache.get_generation(), before)
+        self.assertNotEqual(pagecache.get_generation(), before)
+
+    def test_etag_depends_on_query_string(self):
+        etag = self.client.get("/catalog/")["ETag"]
+        self.assertEqual(self.client.get("/catalog/?page=2", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_pages_without_forms_share_etag_without_cookie(self):
+        PrivacyPage.objects.create(title="Политика", content="Текст политики")
+        first, second = self.client_class().get("/privacy/"), self.client_class().get("/privacy/")
+        self.assertEqual(first.status_code, 200)
+        self.assertNotContains(first, 'type="hidden" name="csrfmiddlewaretoken"')
+        self.assertNotIn("csrftoken", first.cookies)
+        self.assertNotIn("Cookie", first.get("Vary", ""))
+        self.assertEqual(first["ETag"], second["ETag"])
+        # страница с формой — секрет в ETag, у каждого свой
+        self.assertNotEqual(self.client_class().get("/contacts/")["ETag"], self.client_class().get("/contacts/")["ETag"])
+
+
+@override_settings(CACHES=LOCMEM)
+class OfferDownloadTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        patcher = override_settings(MEDIA_ROOT=media)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        OfferPage.objects.create(file=SimpleUploadedFile("Оферта 2025.pdf", b"%PDF-1.4 test"))
+
+    def test_dev_fallback_streams_from_python(self):
+        r = self.client.get("/offer/")
+        self.assertTrue(r.streaming)
+        self.assertNotIn("csrftoken", r.cookies)
+        self.assertEqual(b"".join(r.streaming_content), b"%PDF-1.4 test")
+        self.assertNotIn("X-Accel-Redirect", r)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT="/_protected/media/")
+    def test_accel_redirect_hands_off_to_nginx(self):
+        r = self.client.get("/offer/")
+        self.assertEqual(r.content, b"")
+        self.assertEqual(r["X-Accel-Redirect"], "/_protected/media/legal/%D0%9E%D1%84%D0%B5%D1%80%D1%82%D0%B0_2025.pdf")
+        self.assertEqual(r["Content-Type"], "application/pdf")
+        self.assertTrue(r["Content-Disposition"].startswith("inline; filename*=utf-8''"))
+
+    def test_compressed_file_headers_match_in_both_modes(self):
+        OfferPage.objects.update(is_active=False)
+        OfferPage.objects.create(file=SimpleUploadedFile("offer.pdf.gz", b"\x1f\x8b test"))
+        dev = self.client.get("/offer/")
+        with override_settings(MEDIA_ACCEL_REDIRECT="/_protected/media/"):
+            prod = self.client.get("/offer/")
+        for r in (dev, prod):
+            self.assertEqual(r["Content-Type"], "application/gzip")
+            self.assertNotIn("Content-Encoding", r)
+        self.assertEqual(dev["Content-Disposition"], prod["Content-Disposition"])
+
+
+# ASGI-режим: те же урлы, async-вьюхи
+class AsyncUrls:
+    urlpatterns = [path("", include(view_patterns(async_views)))]
+
+
+@override_settings(CACHES=LOCMEM, ROOT_URLCONF=AsyncUrls)
+class AsyncViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ContactPage.objects.create(phone="8 (999) 123-45-67")
+        LeadSection.objects.create(title="Оставьте заявку")
+        PrivacyPage.objects.create(content="Текст политики")
+        sec = ReviewSection.objects.create()
+        Review.objects.create(section=sec, author="Клиент", text="ok")
+        cat = Category.objects.create(title="Кухни", slug="kitchens", image="c.jpg")
+        CategoryPhoto.objects.create(category=cat, title="Угловая", image="p.jpg")
+
+    def setUp(self):
+        caches["default"].clear()
+
+    async def test_pages_render_without_orm_in_event_loop(self):
+        # SynchronousOnlyOperation вылез бы тут, если шаблон полезет в БД сам
+        for url, text in [("/", "Клиент"), ("/catalog/", "Кухни"), ("/catalog/kitchens/", "Угловая"),
+                          ("/contacts/", "tel:+79991234567"), ("/privacy/", "Текст политики")]:
+            r = await self.async_client.get(url)
+            self.assertContains(r, text, msg_prefix=url)
+            if url != "/privacy/":  # у политики форм нет (conditional_page forms=False)
+                self.assertContains(r, "Оставьте заявку", msg_prefix=url)
+        self.assertEqual((await self.async_client.get("/catalog/nope/")).status_code, 404)
+
+    async def test_offer_fallback_streams_asynchronously(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media):
+            await OfferPage.objects.acreate(file=SimpleUploadedFile("offer.pdf", b"%PDF-1.4 test"))
+            r = await self.async_client.get("/offer/")
+            # синхронный итератор Django буферизовал бы через sync_to_async с предупреждением
+            self.assertTrue(r.is_async)
+            self.assertEqual(b"".join([chunk async for chunk in r.streaming_content]), b"%PDF-1.4 test")
+            self.assertEqual(r["Content-Length"], "13")
+
+    async def test_generation_is_read_through_async_cache(self):
+        # синхронное чтение поколения из event loop пришло бы сюда
+        with mock.patch("pages.pagecache.get_generation") as page_gen, \
+                mock.patch("pages.content.get_generation") as content_gen:
+            for url in ("/", "/catalog/", "/contacts/"):
+                self.assertEqual((await self.async_client.get(url)).status_code, 200, url)
+        page_gen.assert_not_called()
+        content_gen.assert_not_called()
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    async def test_index_fragment_hit_skips_gallery_and_reviews(self):
+        await self.async_client.get("/")
+        make = mock.Mock(wraps=content.PARTS["reviews_section"][0])
+        with mock.patch.dict(content.PARTS, reviews_section=(make, False)):
+            r = await self.async_client.get("/")
+        self.assertContains(r, "Клиент")
+        make.assert_not_called()  # отзывы — из фрагмента
+
+    async def test_revalidation_returns_304(self):
+        etag = (await self.async_client.get("/contacts/"))["ETag"]
+        r = await self.async_client.get("/contacts/", headers={"if-none-match": etag})
+        self.assertEqual(r.status_code, 304)
+
+    async def test_lead_submit_saves_lead_with_delivery(self):
+        r = await self.async_client.post("/lead/?utm_source=ya", {"name": "Иван", "phone": "+79990001122"},
+                                         headers={"x-requested-with": "XMLHttpRequest"})
+        self.assertEqual(r.json(), {"ok": True})
+        d = await LeadDelivery.objects.select_related("lead").aget()
+        self.assertEqual((d.lead.name, d.data["utm"]["utm_source"]), ("Иван", "ya"))
+
+        r = await self.async_client.post("/lead/", {"phone": "123"}, headers={"x-requested-with": "XMLHttpRequest"})
+        self.assertEqual(r.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM, TRACE_SAMPLE=1.0, TRACE_BUFFER=2, LEAD_THROTTLE=False)
+class TraceTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        patcher = override_settings(TRACE_DIR=self.dir)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        caches["default"].clear()
+
+    def records(self):
+        with open(os.path.join(self.dir, f"trace-{os.getpid()}.jsonl"), encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_records_cache_outcome_and_queries_buffered(self):
+        self.client.get("/")
+        self.assertFalse(os.listdir(self.dir))  # одна строка — ещё в буфере
+        self.client.get("/?x=1")
+        self.client.get("/admin/login/")  # не пишем
+        self.client.post("/lead/", {"name": "Иван", "phone": "+79990001122"})
+        self.client.get("/catalog/")
+
+        first, second, lead, catalog = self.records()
+        self.assertEqual((first["view"], first["status"], first["cache"]), ("index", 200, "miss"))
+        self.assertGreater(first["db"], 0)
+        self.assertEqual((second["path"], second["cache"], second["db"]), ("/?x=1", "hit", 0))
+        self.assertEqual((lead["method"], lead["view"], lead["cache"]), ("POST", "lead_submit", None))
+        self.assertNotIn("phone", json.dumps(lead))
+        self.assertEqual((catalog["view"], catalog["cache"]), ("catalog", None))  # каталог — без кеша страниц
+
+    def test_writer_rotates_by_size(self):
+        writer = tracing.TraceWriter(self.dir, max_bytes=100, backups=2, buffer_size=1, flush_interval=60)
+        for i in range(10):
+            writer.write({"i": i, "pad": "x" * 40})
+        self.assertEqual(sorted(os.listdir(self.dir)), [os.path.basename(writer.path) + s for s in ("", ".1", ".2")])
+        self.assertEqual(loadtest.load_trace([]), [])
+
+
+TIMED_LOCMEM = {"default": {"BACKEND": "pages.timing.LocMemCache"}}
+
+
+@override_settings(CACHES=TIMED_LOCMEM, TIMING_SAMPLE=1.0, TIMING_LOG=False, METRICS_TOKEN="")
+class TimingTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        patcher = mock.patch.object(timing, "registry", timing.Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(TIMING_LOG=True)
+    def test_server_timing_log_and_metrics(self):
+        with self.assertLogs("pages.timing", "INFO") as logs:
+            cold = self.client.get("/")
+            warm = self.client.get("/")
+            body = self.client.get("/metrics").content.decode()
+        self.assertRegex(cold["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+", tpl;dur=[\d.]+;desc="1", '
+                                                 r'cache;dur=[\d.]+;desc="\d+", total;dur=[\d.]+$')
+        self.assertNotIn("db;", warm["Server-Timing"])  # тёплый кеш страниц — без БД и рендера
+        self.assertNotIn("tpl;", warm["Server-Timing"])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["view"], line["status"]), ("index", 200))
+        self.assertGreater(line["db_n"], 0)
+
+        self.assertIn('ulvis_request_duration_seconds_count{view="index"} 2', body)
+        self.assertIn('ulvis_request_duration_seconds_bucket{view="index",le="+Inf"} 2', body)
+        self.assertRegex(body, r'ulvis_request_component_seconds_total\{view="index",component="tpl"\} 0\.\d*[1-9]')
+        self.assertRegex(body, r'ulvis_request_db_queries_total\{view="index"\} [1-9]')
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+    @override_settings(TIMING_SAMPLE=0)
+    def test_off_by_default(self):
+        self.assertNotIn("Server-Timing", self.client.get("/"))
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        with timing.span("db"):  # без сбора — no-op
+            pass
+
+
+@unittest.skipUnless(fakeredis, "fakeredis не установлен")
+@override_settings(CACHES=FAKE_REDIS)
+class TimingRedisTests(SimpleTestCase):
+    def test_process_counters_merge_in_redis(self):
+        caches["default"].clear()
+        a, b = timing.Registry(), timing.Registry()
+        t = timing.Timings()
+        t.add("db", 0.002)
+        a.record("index", 0.003, t)
+        b.record("index", 0.2, t)
+        self.assertEqual(a.totals()["index\tn"], 1)  # a слил своё; b ждёт TIMING_FLUSH
+        b.flush()
+        totals = a.totals()
+        self.assertEqual(totals["index\tn"], 2)
+        self.assertEqual(totals["index\tq"], 2)
+        self.assertAlmostEqual(totals["index\tc:db"], 0.004)
+
+
+@override_settings(CACHES=LOCMEM, PAGE_CACHE_TIMEOUT=0, FRAGMENT_CACHE_TIMEOUT=60)
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ContactPage.objects.create(phone="8 (999) 123-45-67")
+        gs = GallerySection.objects.create()
+        GalleryImage.objects.create(section=gs, image="gallery/a.jpg", alt="Кухня в интерьере")
+        sec = ReviewSection.objects.create()
+        Review.objects.create(section=sec, author="Клиент", text="ok")
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def test_fragments_skip_queries_until_content_changes(self):
+        self.client.get("/")
+        with override_settings(FRAGMENT_CACHE_TIMEOUT=0), CaptureQueriesContext(connection) as off:
+            self.client.get("/")
+        # галерея и отзывы (секция + дети) и контакт хедера/футера — из фрагментов
+        with CaptureQueriesContext(connection) as warm:
+            r = self.client.get("/")
+        self.assertEqual(len(off) - len(warm), 5)
+        for text in ("Кухня в интерьере", "Клиент", "tel:+79991234567"):
+            self.assertContains(r, text)
+
+        # сохранение двигает поколение — фрагменты рендерятся заново
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(section=ReviewSection.objects.get(), author="Новый отзыв", text="ok")
+        self.assertContains(self.client.get("/"), "Новый отзыв")
+
+    def test_footer_year_is_part_of_key(self):
+        for year in (2030, 2031):
+            with mock.patch("django.template.defaulttags.datetime") as dt:
+                dt.now.return_value = timezone.datetime(year, 1, 1, tzinfo=timezone.get_current_timezone())
+                self.assertContains(self.client.get("/contacts/"), f"© {year}")
+
+    def test_header_variant_and_off_switch(self):
+        self.client.get("/")
+        self.assertContains(self.client.get("/catalog/"), "header--overlay-dark")  # не хедер главной из кеша
+        with CaptureQueriesContext(connection) as on:
+            self.client.get("/catalog/")
+        with override_settings(FRAGMENT_CACHE_TIMEOUT=0), CaptureQueriesContext(connection) as off:
+            self.client.get("/catalog/")
+        self.assertEqual(len(off) - len(on), 1)  # контакт для хедера/футера
+
+
+class LoadTestHistogramTests(SimpleTestCase):
+    def test_percentiles_within_precision_and_merge_roundtrip(self):
+        values = list(range(1, 200_001, 7))
+        a, b = loadtest.Histogram(), loadtest.Histogram()
+        for i, v in enumerate(values):
+            (a if i % 2 else b).record(v)
+        merged = loadtest.Histogram.from_dict(json.loads(json.dumps(a.to_dict()))).merge(b)
+
+        self.assertEqual(merged.total, len(values))
+        for q in (50, 99, 99.9):
+            exact = values[round(len(values) * q / 100) - 1]
+            self.assertAlmostEqual(merged.percentile(q), exact, delta=exact / 1000 + 7)
+        self.assertEqual((merged.min, merged.max), (1, values[-1]))
+
+
+class LoadTestPlanTests(SimpleTestCase):
+    def test_zipf_follows_exact_exponent(self):
+        plan = Plan.build("zipf", n_keys=1000, size=400_000, read_p=0.9, seed=1, zipf_s=0.9)
+        freq = numpy.bincount(plan.keys, minlength=1000)
+        # P(k) ~ k^-s: первый ключ чаще четвёртого в 4^s раз
+        self.assertAlmostEqual(freq[0] / freq[3], 4 ** 0.9, delta=0.1)
+        self.assertAlmostEqual(float(plan.sets.mean()), 0.1, delta=0.005)
+
+    def test_hotspot_and_save_load(self):
+        plan = Plan.build("hotspot", n_keys=1000, size=100_000, seed=2, hot_fraction=0.1, hot_p=0.9)
+        self.assertAlmostEqual(float((plan.keys < 100).mean()), 0.9, delta=0.01)
+
+        path = os.path.join(tempfile.mkdtemp(), "plan.npz")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        plan.save(path)
+        loaded = Plan.load(path)
+        self.assertEqual(loaded.meta, plan.meta)
+        self.assertTrue((loaded.keys == plan.keys).all())
+
+        sets, keys = loaded.materialize(offset=10)
+        self.assertEqual(keys[0], b"k:%d" % plan.keys[10])
+        self.assertIs(keys[keys.index(keys[0], 1)], keys[0])  # один bytes на ключ
+        self.assertEqual(sets[0], bool(plan.sets[10]))
+
+
+class LoadTestBatchTests(SimpleTestCase):
+    def test_batch_counts_every_op_and_series_by_interval(self):
+        stats = _Stats(batch=4, open_loop=False, interval=0.5)
+        stats.record({"hit": 3, "miss": 1}, t0=0, done=2_000_000, planned=0, start=0)
+        stats.record("set", t0=600_000_000, done=601_000_000, planned=600_000_000, start=0)
+
+        self.assertEqual(stats.ops, 5)
+        self.assertEqual(stats.outcomes, {"hit": 3, "miss": 1, "set": 1})
+        self.assertEqual(stats.latency.total, 5)
+        self.assertEqual(stats.batch.total, 2)  # пачки — поштучно
+        series = loadtest.Series.from_dict(json.loads(json.dumps(stats.series.to_dict())))
+        self.assertEqual([(r["t"], r["ops"], r["p99_ms"]) for r in series.summary()], [(0.0, 4, 2.0), (0.5, 1, 1.0)])
+
+
+@unittest.skipUnless(shutil.which(os.getenv("REDIS_SERVER", "redis-server")), "redis-server not installed")
+class LoadTestRedisNodesTests(SimpleTestCase):
+    def test_pipelined_asyncio_run_routes_keys_over_shards(self):
+        with local_shards(2) as nodes:
+            target = loadtest.RedisTarget(n_keys=2000, plan_size=20_000, seed=3, pipeline=16,
+                                          shards=[node.url for node in nodes])
+            report = loadtest.run(target, processes=1, connections=2, duration=0.5, mode="asyncio", interval=0.25)
+            sizes = [node.client().dbsize() for node in nodes]
+
+        self.assertNotIn("errors", report)
+        self.assertEqual(set(report["outcomes"]), {"hit", "set"})
+        self.assertEqual(report["ops"], report["batch_ms"]["count"] * 16)
+        self.assertEqual(sum(sizes), 2000)
+        self.assertTrue(all(sizes))
+        self.assertAlmostEqual(sum(report["target"]["node_share"]), 1.0, places=3)
+        self.assertGreater(report["server"]["hit_ratio"], 0.99)
+        self.assertEqual(sum(r["ops"] for r in report["timeline"]), report["ops"])
+
+
+    def test_eviction_sweep_replays_one_plan_per_policy(self):
+        result = sweep.sweep(["3mb"], ["allkeys-lru", "noeviction"], n_keys=5000, plan_size=20_000, seed=4,
+                             duration=0.3)
+        lru, noevict = result["rows"]
+
+        self.assertEqual(result["plan"]["seed"], 4)
+        self.assertEqual((lru["policy"], lru["maxmemory_bytes"], lru["populated"]), ("allkeys-lru", 3 * 1024**2, 5000))
+        self.assertGreater(lru["evicted_keys"], 0)
+        self.assertEqual(lru["oom"], 0)
+        # без вытеснения лимит виден как отказы SET и недолитые ключи
+        self.assertEqual(noevict["evicted_keys"], 0)
+        self.assertGreater(noevict["oom"], 0)
+        self.assertLess(noevict["populated"], 5000)
+        self.assertIn("allkeys-lru", sweep.table(result["rows"]))
+
+
+class _NoDelayServer(ThreadedWSGIServer):
+    # wsgiref пишет заголовки и тело отдельно: без TCP_NODELAY ответ ждёт
+    # отложенного ACK клиента (~40 мс), и open loop не успевает в график
+    def get_request(self):
+        sock, addr = super().get_request()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock, addr
+
+
+class _NoDelayLiveServerThread(LiveServerThread):
+    server_class = _NoDelayServer
+
+
+@override_settings(CACHES=LOCMEM, LEAD_THROTTLE=False)
+class LoadTestHttpTests(LiveServerTestCase):
+    server_thread_class = _NoDelayLiveServerThread
+
+    def test_open_loop_run_submits_leads_with_csrf(self):
+        target = loadtest.HttpTarget(self.live_server_url, "/contacts/=1,POST /lead/=1")
+        report = loadtest.run(target, processes=2, duration=0.5, rate=40)
+
+        self.assertNotIn("errors", report)
+        # на стенде хвост расписания может не уйти (прогон по часам) — но всё отправленное 200
+        self.assertEqual(set(report["outcomes"]) - {"unsent"}, {"200"})
+        self.assertEqual(report["latency_ms"]["count"], report["ops"])
+        self.assertTrue(Lead.objects.filter(source="loadtest").exists())
+
+    def test_replay_follows_recorded_timing(self):
+        trace = [(100.0, "GET", "/contacts/"), (100.2, "GET", "/contacts/?a=1"), (100.4, "POST", "/lead/"),
+                 (100.6, "GET", "/nope/")]
+        target = loadtest.ReplayTarget(self.live_server_url, trace, speed=2)
+        report = loadtest.run(target, processes=1, connections=2, duration=target.span + 1)
+
+        self.assertNotIn("errors", report)
+        self.assertEqual(report["outcomes"], {"200": 3, "404": 1})
+        self.assertEqual(report["target"]["mix"]["GET /contacts/"], 2)
+        self.assertGreaterEqual(report["elapsed"], 0.3)  # 0.6 с трейса вдвое быстрее
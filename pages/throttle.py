@@ -0,0 +1,47 @@
+# pages/throttle.py
+"""
+Счётчики с TTL для антиспама.
+
+На Redis все ключи инкрементятся одним MULTI/EXEC (SET NX EX + INCR на
+ключ) — один round trip и общий счёт на все воркеры gunicorn. На любом
+другом бэкенде (LocMem в dev) — по старинке через add/incr.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+from . import timing
+
+
+def _hit_redis(backend: RedisCache, specs) -> list[int]:
+    client = backend._cache.get_client(write=True)
+    pipe = client.pipeline(transaction=True)
+    for key, ttl in specs:
+        k = backend.make_and_validate_key(key)
+        # NX: TTL ставим только новому ключу, окно не продлевается
+        pipe.set(k, 0, ex=ttl, nx=True)
+        pipe.incr(k)
+    res = pipe.execute()
+    return [int(v) for v in res[1::2]]
+
+
+def _hit_generic(backend, key: str, ttl: int) -> int:
+    if backend.add(key, 1, ttl):  # если ключа нет — создаст со значением 1
+        return 1
+    try:
+        return backend.incr(key)
+    except ValueError:
+        # ключ истёк между add и incr
+        backend.add(key, 1, ttl)
+        return 1
+
+
+def hit_many(specs, alias: str = "default") -> list[int]:
+    """
+    specs: [(key, ttl), ...]. Возвращает значения счётчиков после инкремента
+    в том же порядке.
+    """
+    backend = caches[alias]
+    if isinstance(backend, RedisCache):
+        with timing.span("cache"):
+            return _hit_redis(backend, specs)
+    return [_hit_generic(backend, key, ttl) for key, ttl in specs]
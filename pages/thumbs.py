@@ -0,0 +1,166 @@
+# pages/thumbs.py
+"""
+Рендишены картинок: WebP/AVIF нескольких ширин в отдельном каталоге THUMB_DIR,
+по подкаталогу на оригинал, имя файла — настоящая ширина:
+
+    slides/hero.jpg -> renditions/slides/hero.jpg/480.webp, .../480.avif, ...
+
+Рендишен узнаём по каталогу, а не по имени файла: загрузка, названная
+как-нибудь вроде kitchen_w480.webp, остаётся оригиналом.
+
+Оригинал не апскейлим: ширины больше исходной пропускаем, кроме первой —
+она пишется в исходном размере (и под исходной шириной), чтобы в srcset был
+полноразмерный вариант с честным дескриптором.
+
+Список рендишенов для srcset — listdir; в шаблонах он запоминается на
+поколение контента (новые рендишены поколение двигают: images.finish,
+manage.py thumbnails), иначе каждая картинка каталога — поход в ФС.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import models
+from PIL import Image, ImageOps, features
+
+log = logging.getLogger(__name__)
+
+# формат -> параметры Image.save
+ENCODERS = {
+    "avif": {"format": "AVIF", "quality": 55},
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+}
+
+
+def formats() -> list[str]:
+    return [f for f in settings.THUMB_FORMATS if f in ENCODERS and features.check(f)]
+
+
+def rendition_dir(name: str) -> str:
+    return f"{settings.THUMB_DIR}/{name}"
+
+
+def rendition_name(name: str, width: int, fmt: str) -> str:
+    return f"{rendition_dir(name)}/{width}.{fmt}"
+
+
+def is_rendition(name: str) -> bool:
+    return name.startswith(f"{settings.THUMB_DIR}/")
+
+
+def renditions(storage, name: str, fmt: str) -> list[tuple[int, str]]:
+    """(ширина, имя) уже нарезанных рендишенов формата fmt, по возрастанию ширины."""
+    directory = rendition_dir(name)
+    try:
+        _, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return []
+    found = []
+    for f in files:
+        stem, ext = os.path.splitext(f)
+        if ext == f".{fmt}" and stem.isdigit():
+            found.append((int(stem), f"{directory}/{f}"))
+    return sorted(found)
+
+
+# (поколение, {(storage, имя, формат): рендишены}) — в процессе, на одно поколение
+_listed = (None, {})
+
+
+def cached_renditions(storage, name: str, fmt: str, generation) -> list[tuple[int, str]]:
+    global _listed
+    current, items = _listed
+    if current != generation:
+        items = {}
+        _listed = (generation, items)
+    key = (getattr(storage, "location", None), name, fmt)
+    if key not in items:
+        items[key] = renditions(storage, name, fmt)
+    return items[key]
+
+
+def image_fields(model) -> list[str]:
+    return [f.name for f in model._meta.get_fields() if isinstance(f, models.ImageField)]
+
+
+def _target_widths(orig_w: int) -> list[int]:
+    out = []
+    for w in sorted(settings.THUMB_WIDTHS):
+        out.append(w)
+        if w >= orig_w:
+            break
+    return out
+
+
+def generate(fieldfile, force: bool = False) -> list[str]:
+    """Создаёт недостающие рендишены для FieldFile. Возвращает имена записанных файлов."""
+    if not fieldfile:
+        return []
+    return generate_file(fieldfile.storage, fieldfile.name, force=force)
+
+
+def generate_file(storage, name: str, force: bool = False) -> list[str]:
+    if is_rendition(name):
+        return []
+    fmts = formats()
+    if not force and all(renditions(storage, name, f) for f in fmts):
+        # уже нарезано — сохранение без новой картинки ничего не стоит
+        return []
+    if force:
+        # оригинал мог поменять размер — старые ширины srcset'у не нужны
+        for f in fmts:
+            for _, rname in renditions(storage, name, f):
+                storage.delete(rname)
+
+    with storage.open(name, "rb") as fh:
+        im = Image.open(fh)
+        im = ImageOps.exif_transpose(im)
+        im.load()
+    if im.mode not in ("RGB", "RGBA"):
+        im = im.convert("RGBA" if "transparency" in im.info or im.mode in ("LA", "PA") else "RGB")
+
+    written = []
+    for w in _target_widths(im.width):
+        w = min(w, im.width)
+        resized = None
+        for fmt in fmts:
+            rname = rendition_name(name, w, fmt)
+            if not force and storage.exists(rname):
+                continue
+            if resized is None:
+                if w < im.width:
+                    resized = im.resize((w, round(im.height * w / im.width)), Image.LANCZOS)
+                else:
+                    resized = im
+            buf = BytesIO()
+            resized.save(buf, **ENCODERS[fmt])
+            if storage.exists(rname):
+                storage.delete(rname)
+            written.append(storage.save(rname, ContentFile(buf.getvalue())))
+    return written
+
+
+def generate_for_instance(instance, force: bool = False) -> list[str]:
+    written = []
+    for field in image_fields(type(instance)):
+        ff = getattr(instance, field)
+        if not ff:
+            continue
+        try:
+            written += generate(ff, force=force)
+        except Exception:
+            # битый/отсутствующий файл не должен ронять сохранение в админке
+            log.exception("thumbnail generation failed for %s", ff.name)
+    return written
+
+
+def srcset(fieldfile, fmt: str = "webp", generation=None) -> str:
+    """srcset по существующим рендишенам; пустая строка, если их нет. С generation — без listdir на повторах."""
+    if not fieldfile or fmt not in ENCODERS:
+        return ""
+    storage = fieldfile.storage
+    found = (renditions(storage, fieldfile.name, fmt) if generation is None
+             else cached_renditions(storage, fieldfile.name, fmt, generation))
+    return ", ".join(f"{storage.url(rname)} {w}w" for w, rname in found)
@@ -0,0 +1,337 @@
+# pages/timing.py
+"""
+Куда уходит время запроса: БД, шаблоны, кеш, внешние HTTP (Bitrix).
+
+API — span(name) / add(name, seconds): пишут в Timings текущего запроса,
+если он выбран в выборку (TIMING_SAMPLE), иначе — один ContextVar.get и
+выход. Источники:
+    db    — execute_wrapper на каждом соединении (только при включённой выборке);
+    tpl   — бэкенд шаблонов Templates, рендер верхнего шаблона;
+    cache — бэкенды кеша RedisCache/LocMemCache отсюда и throttle.hit_many;
+    http  — BitrixClient.call.
+
+TimingMiddleware на выбранных запросах ставит Server-Timing, пишет
+строку JSON в лог pages.timing и копит гистограммы по имени урла. Счётчики
+процесса раз в TIMING_FLUSH сек сливаются в Redis (HINCRBYFLOAT), так что
+/metrics (Prometheus text) отдаёт сумму по всем воркерам gunicorn; без
+Redis — только свой процесс. При TIMING_SAMPLE=0 middleware выключается
+(MiddlewareNotUsed), обёртка БД не ставится, /metrics — 404.
+"""
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends import locmem, redis
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template
+
+log = logging.getLogger(__name__)
+
+COMPONENTS = ("db", "tpl", "cache", "http")
+METRICS_KEY = "metrics:requests"
+
+_current = contextvars.ContextVar("timings", default=None)
+
+
+class Timings:
+    """Время и число операций по компонентам одного запроса."""
+    __slots__ = ("spent", "counts")
+
+    def __init__(self):
+        self.spent, self.counts = {}, {}
+
+    def add(self, name: str, seconds: float, n: int = 1) -> None:
+        self.spent[name] = self.spent.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + n
+
+
+def add(name: str, seconds: float, n: int = 1) -> None:
+    t = _current.get()
+    if t is not None:
+        t.add(name, seconds, n)
+
+
+class span:
+    """with span("db"): ... — без выборки почти бесплатно (класс, а не генератор)."""
+    __slots__ = ("name", "timings", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = _current.get()
+        if self.timings is not None:
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timings is not None:
+            self.timings.add(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+class collect:
+    """Включить сбор на время блока; если сбор уже идёт (другой middleware) — тот же Timings."""
+    __slots__ = ("timings", "token")
+
+    def __enter__(self) -> Timings:
+        self.timings, self.token = _current.get(), None
+        if self.timings is None:
+            self.timings = Timings()
+            self.token = _current.set(self.timings)
+        return self.timings
+
+    def __exit__(self, *exc):
+        if self.token is not None:
+            _current.reset(self.token)
+        return False
+
+
+# --- источники ---------------------------------------------------------------
+
+def _db_wrapper(execute, sql, params, many, context):
+    t = _current.get()
+    if t is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        t.add("db", time.perf_counter() - t0)
+
+
+def install_db_wrapper(sender=None, connection=connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def connect():
+    """Из AppConfig.ready: обёртка на каждое новое соединение — только если кому-то нужна."""
+    if settings.TIMING_SAMPLE > 0 or settings.TRACE_SAMPLE > 0:
+        connection_created.connect(install_db_wrapper, dispatch_uid="timing:db")
+
+
+class _TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with span("tpl"):
+            return super().render(context, request)
+
+
+class Templates(DjangoTemplates):
+    """DjangoTemplates, у которого render() верхнего шаблона идёт в tpl."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name).template, self)
+
+
+class _TimedCache:
+    def get(self, *args, **kwargs):
+        with span("cache"):
+            return super().get(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        with span("cache"):
+            return super().set(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        with span("cache"):
+            return super().add(*args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        with span("cache"):
+            return super().incr(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with span("cache"):
+            return super().delete(*args, **kwargs)
+
+    def get_many(self, *args, **kwargs):
+        with span("cache"):
+            return super().get_many(*args, **kwargs)
+
+    def set_many(self, *args, **kwargs):
+        with span("cache"):
+            return super().set_many(*args, **kwargs)
+
+
+class RedisCache(_TimedCache, redis.RedisCache):
+    pass
+
+
+class LocMemCache(_TimedCache, locmem.LocMemCache):
+    pass
+
+
+# --- агрегаты ----------------------------------------------------------------
+
+class Registry:
+    """
+    Счётчики процесса: поле "<урл>\\t<что>" -> число. b<i> — попадания в
+    i-ю корзину TIMING_BUCKETS (последняя — +Inf), sum/n — сумма и число,
+    c:<компонент> — секунды, q — запросы в БД.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending, self.flushed_at = {}, time.monotonic()
+
+    def record(self, view: str, total: float, timings: Timings) -> None:
+        buckets = settings.TIMING_BUCKETS
+        i = next((n for n, le in enumerate(buckets) if total <= le), len(buckets))
+        fields = {f"b{i}": 1, "sum": total, "n": 1, "q": timings.counts.get("db", 0)}
+        for name, seconds in timings.spent.items():
+            fields[f"c:{name}"] = seconds
+        with self.lock:
+            p = self.pending
+            for field, v in fields.items():
+                key = f"{view}\t{field}"
+                p[key] = p.get(key, 0) + v
+            due = time.monotonic() - self.flushed_at >= settings.TIMING_FLUSH
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Слить накопленное в Redis; без Redis копим у себя."""
+        backend = caches["default"]
+        if not isinstance(backend, redis.RedisCache):
+            return
+        with self.lock:
+            pending, self.pending, self.flushed_at = self.pending, {}, time.monotonic()
+        if not pending:
+            return
+        try:
+            client = backend._cache.get_client(write=True)
+            key = backend.make_and_validate_key(METRICS_KEY)
+            pipe = client.pipeline(transaction=False)
+            for field, v in pending.items():
+                pipe.hincrbyfloat(key, field, v)
+            pipe.execute()
+        except Exception:
+            # Redis лёг — эти секунды метрик теряем, запросу не мешаем
+            pass
+
+    def totals(self) -> dict:
+        self.flush()
+        backend = caches["default"]
+        if isinstance(backend, redis.RedisCache):
+            client = backend._cache.get_client()
+            raw = client.hgetall(backend.make_and_validate_key(METRICS_KEY))
+            return {k.decode(): float(v) for k, v in raw.items()}
+        with self.lock:
+            return dict(self.pending)
+
+
+registry = Registry()
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_metrics(totals: dict) -> str:
+    views = {}
+    for key, v in totals.items():
+        view, _, field = key.partition("\t")
+        views.setdefault(view, {})[field] = v
+    buckets = settings.TIMING_BUCKETS
+    lines = ["# HELP ulvis_request_duration_seconds Request duration by URL name (sampled requests).",
+             "# TYPE ulvis_request_duration_seconds histogram"]
+    for view, f in sorted(views.items()):
+        cum = 0
+        for i, le in enumerate([*buckets, "+Inf"]):
+            cum += f.get(f"b{i}", 0)
+            lines.append(f'ulvis_request_duration_seconds_bucket{{view="{_label(view)}",le="{le}"}} {cum:g}')
+        lines.append(f'ulvis_request_duration_seconds_sum{{view="{_label(view)}"}} {f.get("sum", 0):.6f}')
+        lines.append(f'ulvis_request_duration_seconds_count{{view="{_label(view)}"}} {f.get("n", 0):g}')
+    lines += ["# HELP ulvis_request_component_seconds_total Time spent in db/tpl/cache/http by URL name.",
+              "# TYPE ulvis_request_component_seconds_total counter"]
+    for view, f in sorted(views.items()):
+        for name in COMPONENTS:
+            lines.append(f'ulvis_request_component_seconds_total{{view="{_label(view)}",component="{name}"}} '
+                         f'{f.get(f"c:{name}", 0):.6f}')
+    lines += ["# HELP ulvis_request_db_queries_total DB queries by URL name.",
+              "# TYPE ulvis_request_db_queries_total counter"]
+    for view, f in sorted(views.items()):
+        lines.append(f'ulvis_request_db_queries_total{{view="{_label(view)}"}} {f.get("q", 0):g}')
+    return "\n".join(lines) + "\n"
+
+
+def metrics(request):
+    if settings.TIMING_SAMPLE <= 0:
+        raise Http404
+    if settings.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(registry.totals()), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# --- middleware --------------------------------------------------------------
+
+def server_timing(timings: Timings, total: float) -> str:
+    parts = []
+    for name in COMPONENTS:
+        if name in timings.counts:
+            parts.append(f'{name};dur={timings.spent[name] * 1000:.2f};desc="{timings.counts[name]}"')
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class TimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.TIMING_SAMPLE <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample = settings.TIMING_SAMPLE
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= self.sample:
+            return self.get_response(request)
+        install_db_wrapper()  # соединение могло открыться до подключения сигнала
+        with collect() as timings:
+            t0 = time.perf_counter()
+            response = self.get_response(request)
+            self._finish(request, response, timings, time.perf_counter() - t0)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample:
+            return await self.get_response(request)
+        with collect() as timings:
+            t0 = time.perf_counter()
+            response = await self.get_response(request)
+            self._finish(request, response, timings, time.perf_counter() - t0)
+        return response
+
+    def _finish(self, request, response, timings: Timings, total: float):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+        if settings.TIMING_HEADER:
+            response["Server-Timing"] = server_timing(timings, total)
+        if settings.TIMING_LOG:
+            line = {"view": view, "method": request.method, "path": request.path, "status": response.status_code,
+                    "ms": round(total * 1000, 3)}
+            for name in COMPONENTS:
+                if name in timings.counts:
+                    line[f"{name}_ms"] = round(timings.spent[name] * 1000, 3)
+                    line[f"{name}_n"] = timings.counts[name]
+            log.info(json.dumps(line, ensure_ascii=False))
+        registry.record(view, total, timings)
@@ -0,0 +1,136 @@
+# pages/tracing.py
+"""
+Запись реального трафика для нагрузочных прогонов.
+
+TraceMiddleware пишет долю запросов (TRACE_SAMPLE) строками JSONL:
+время, метод, путь с query, имя урла, статус, длительность, исход кеша
+страниц (hit/miss/bypass, ставит pagecache) и число запросов в БД
+(через pages/timing.py). Тела
+запросов не пишем — заявки при повторе синтезирует loadtest.
+
+Строки копятся в буфере и уходят в файл пачкой (TRACE_BUFFER строк или
+раз в TRACE_FLUSH сек, фоновым потоком) — на запрос только json.dumps
+и append. Файл свой у каждого процесса (trace-<pid>.jsonl, воркеры
+gunicorn не пишут в один), ротация по размеру: .1, .2, ... TRACE_BACKUPS.
+
+Повтор: python -m loadtest replay traces/trace-*.jsonl --speed 2
+"""
+import atexit
+import json
+import os
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import timing
+
+class TraceWriter:
+    def __init__(self, directory, max_bytes: int, backups: int, buffer_size: int, flush_interval: float):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"trace-{os.getpid()}.jsonl")
+        self.max_bytes, self.backups = max_bytes, backups
+        self.buffer_size, self.flush_interval = buffer_size, flush_interval
+        self.lock = threading.Lock()
+        self.buffer, self.flushed_at = [], time.monotonic()
+        # uvicorn-воркер по SIGTERM умирает от самого сигнала, atexit не успевает —
+        # фоновый сброс, чтобы терялось не больше flush_interval
+        threading.Thread(target=self._flush_loop, daemon=True, name="trace-flush").start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            self.buffer.append(line)
+            if len(self.buffer) >= self.buffer_size or time.monotonic() - self.flushed_at >= self.flush_interval:
+                self._flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.flushed_at = time.monotonic()
+        if not self.buffer:
+            return
+        data = ("\n".join(self.buffer) + "\n").encode("utf-8")
+        self.buffer = []
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "ab") as f:
+                f.write(data)
+        except OSError:
+            # диск — не повод ронять запрос; пачка теряется
+            pass
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class TraceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.TRACE_SAMPLE <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample = settings.TRACE_SAMPLE
+        self.exclude = tuple(settings.TRACE_EXCLUDE)
+        self.writer = TraceWriter(settings.TRACE_DIR, settings.TRACE_MAX_BYTES, settings.TRACE_BACKUPS,
+                                  settings.TRACE_BUFFER, settings.TRACE_FLUSH)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _sampled(self, request) -> bool:
+        return random.random() < self.sample and not request.path.startswith(self.exclude)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._sampled(request):
+            return self.get_response(request)
+        timing.install_db_wrapper()  # соединение могло открыться до подключения сигнала
+        with timing.collect() as timings:
+            started, t0 = time.time(), time.perf_counter()
+            response = self.get_response(request)
+            self._record(request, response, started, t0, timings)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sampled(request):
+            return await self.get_response(request)
+        with timing.collect() as timings:
+            started, t0 = time.time(), time.perf_counter()
+            response = await self.get_response(request)
+            self._record(request, response, started, t0, timings)
+        return response
+
+    def _record(self, request, response, started, t0, timings):
+        match = getattr(request, "resolver_match", None)
+        self.writer.write({
+            "ts": round(started, 6),
+            "method": request.method,
+            "path": request.get_full_path(),
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "ms": round((time.perf_counter() - t0) * 1000, 3),
+            "cache": getattr(request, "_page_cache", None),
+            "db": timings.counts.get("db", 0),
+        })
@@ -1,12 +1,21 @@
+from django.conf import settings
 from django.urls import path
-from . import views
-
-urlpatterns = [
-    path('', views.index, name='index'),
-    path('catalog/', views.catalog, name='catalog'),
-    path('catalog/<slug:slug>/', views.category_detail, name='category_detail'),
-    path('contacts/', views.contacts, name='contacts'),
-    path('lead/', views.lead_submit, name='lead_submit'),  # POST формы
-    path("offer/", views.offer_page, name="offer"),
-    path("privacy/", views.privacy_page, name="privacy"),
-]
\ No newline at end of file
+from . import async_views, timing, views
+
+
+def view_patterns(views):
+    return [
+        path('', views.index, name='index'),
+        path('catalog/', views.catalog, name='catalog'),
+        path('catalog/<slug:slug>/', views.category_detail, name='category_detail'),
+        path('contacts/', views.contacts, name='contacts'),
+        path('lead/', views.lead_submit, name='lead_submit'),  # POST формы
+        path("offer/", views.offer_page, name="offer"),
+        path("privacy/", views.privacy_page, name="privacy"),
+    ]
+
+
+# ASGI-режим: те же имена, async-реализации (pages/async_views.py)
+urlpatterns = view_patterns(async_views if settings.ASYNC_VIEWS else views) + [
+    path("metrics", timing.metrics, name="metrics"),  # Prometheus; снаружи закрыт в nginx
+]
@@ -1,4 +1,3 @@
-import re
 from django.shortcuts import get_object_or_404, render, redirect
 from django.core.mail import send_mail
 from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse
@@ -9,89 +8,63 @@ from django.urls import reverse
 from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
 from django.db.models import Q
-
-
-def get_contact_context():
-    """Возвращает первый активный контакт, если есть"""
-    page = ContactPage.objects.filter(is_active=True).first()
-    tel_href = None
-    if page and page.phone:
-        import re
-        digits = re.sub(r"\D+", "", page.phone)
-        if digits.startswith("8"):
-            digits = "7" + digits[1:]
-        if not digits.startswith("7"):
-            digits = "7" + digits
-        tel_href = f"+{digits}"
-    return {"contact": page, "tel_href": tel_href}
-
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from . import keyset, search, sendfile
+from .conditional import conditional_page
+from .content import get_content
+from .pagecache import render_cached
+
+INDEX_STEPS = [
+    {"num": 1, "text": "Вы оставляете заявку"},
+    {"num": 2, "text": "Замер и проект"},
+    {"num": 3, "text": "Изготовление и сборка"},
+    {"num": 4, "text": "Доставка и гарантия"},
+]
+
+
+@conditional_page("index")
 def index(request):
-    slides = HeroSlide.objects.filter(is_active=True).order_by("order", "id")
-    categories = Category.objects.filter(is_active=True).order_by("order", "id")[:6]
-    usp = USPSection.objects.filter(is_active=True).order_by("order","id").first()
-    usp_items = usp.items.filter(is_active=True).order_by("order","id") if usp else []
-    about = AboutSection.objects.filter(is_active=True).order_by("order","id").first()
-    gallery = GallerySection.objects.filter(is_active=True).order_by("order", "id").first()
-    gallery_images = gallery.images.filter(is_active=True).order_by("order","id") if gallery else []
-    rev_sec = ReviewSection.objects.filter(is_active=True).order_by("order","id").first()
-    reviews = rev_sec.reviews.filter(is_active=True) if rev_sec else []
-    cta = LeadSection.objects.filter(is_active=True).order_by("order","id").first()
-    steps = [
-        {"num": 1, "text": "Вы оставляете заявку"},
-        {"num": 2, "text": "Замер и проект"},
-        {"num": 3, "text": "Изготовление и сборка"},
-        {"num": 4, "text": "Доставка и гарантия"},
-    ]
-
-    success = request.GET.get("success")  # <-- флаг из урла
-    
-    ctx = {
-        'slides': slides,
-        "categories_db": categories,
-        "usp": usp,
-        "about": about,
-        "usp_items": usp_items,
-        "gallery": gallery,
-        "gallery_images": gallery_images,
-        "rev_sec": rev_sec,
-        "reviews": reviews,
-        "cta": cta,
-        "success": success,    
-        "steps": steps,       # <-- в шаблон
-    }
-    ctx.update(get_contact_context())
-    return render(request, 'pages/index.html', ctx)
-
+    success = "1" if request.GET.get("success") else None  # <-- флаг из урла
+
+    def build_ctx():
+        content = get_content(request)
+        usp = content.usp
+        ctx = {
+            'slides': content.slides,
+            "categories_db": content.top_categories,
+            "usp": usp,
+            "about": content.about,
+            "usp_items": usp.active_items if usp else [],
+            # лениво: внутри {% fragment %}, на его попадании в БД не идём
+            "gallery": SimpleLazyObject(lambda: content.gallery),
+            "rev_sec": SimpleLazyObject(lambda: content.reviews_section),
+            "success": success,
+            "steps": INDEX_STEPS,       # <-- в шаблон
+        }
+        return ctx
+
+    # success влияет на разметку — отдельный вариант в кеше
+    return render_cached(request, "index", "pages/index.html", build_ctx,
+                         variant=("s1" if success else "s0",))
 
 from django.http import JsonResponse, Http404
 from django.shortcuts import redirect
 from django.urls import reverse
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.contrib import messages
+from django.db import transaction
 
 from .models import Lead, ru_phone_validator
-from .bitrix import send_lead_to_bitrix, normalize_phone_ru
-
-def _throttle_hit(key: str, limit: int, ttl: int) -> bool:
-    """
-    инкрементит счётчик key с TTL. True = превышено.
-    """
-    try:
-        added = cache.add(key, 1, ttl)  # если ключа нет — создаст со значением 1
-        if added:
-            return False
-        # если уже есть — инкрементим
-        val = cache.incr(key)
-        return val > limit
-    except Exception:
-        # на всякий пожарный — не душим юзера, если кеш лёг
-        return False
+from .bitrix import normalize_phone_ru
+from . import delivery, throttle
 
 def _throttle_guard(ip: str, phone: str) -> tuple[bool, str]:
     """
     True/err — троттл сработал. Лимиты: IP 3/мин, 15/час; телефон 2/мин, 6/час
     """
+    if not settings.LEAD_THROTTLE:
+        return False, ""
     ip = ip or "0.0.0.0"
     phone_key = "".join(ch for ch in (phone or "") if ch.isdigit()) or "na"
 
@@ -102,170 +75,165 @@ def _throttle_guard(ip: str, phone: str) -> tuple[bool, str]:
         (f"lead:ph:{phone_key}:m", 2,   60,   "Слишком много попыток с этого номера."),
         (f"lead:ph:{phone_key}:h", 6,   3600, "Лимит обращений по номеру исчерпан."),
     ]
-    for key, limit, ttl, msg in limits:
-        if _throttle_hit(key, limit, ttl):
+    try:
+        # все четыре счётчика — одним запросом в кеш
+        counts = throttle.hit_many([(key, ttl) for key, _, ttl, _ in limits])
+    except Exception:
+        # на всякий пожарный — не душим юзера, если кеш лёг
+        return False, ""
+    for (key, limit, ttl, msg), val in zip(limits, counts):
+        if val > limit:
             return True, msg
     return False, ""
 
-def lead_submit(request):
-    if request.method != "POST":
-        return redirect(reverse("index") + "#lead")
+def _is_xhr(request) -> bool:
+    return request.headers.get("x-requested-with") == "XMLHttpRequest"
 
-    # honeypot
-    if (request.POST.get("website") or "").strip():
-        # молча прикидываемся успехом
-        if request.headers.get("x-requested-with") == "XMLHttpRequest":
-            return JsonResponse({"ok": True})
-        messages.success(request, "Заявка принята.")
-        return redirect(reverse("index") + "?success=1#lead")
 
-    name = (request.POST.get("name") or "").strip()
-    phone = (request.POST.get("phone") or "").strip()
-    message = (request.POST.get("message") or "").strip()
-    src = (request.POST.get("source") or "").strip()
+def _lead_ok(request, msg="Заявка принята. Перезвоним."):
+    if _is_xhr(request):
+        return JsonResponse({"ok": True})
+    messages.success(request, msg)
+    return redirect(reverse("index") + "?success=1#lead")
+
+
+def _lead_error(request, status, error, page_msg):
+    if _is_xhr(request):
+        return JsonResponse({"ok": False, "error": error}, status=status)
+    messages.error(request, page_msg)
+    return redirect(reverse("index") + "#lead")
+
+
+def _lead_fields(request) -> dict:
+    """Всё, что нужно для заявки, из запроса — чтобы дальше request не трогать."""
+    def utm(key):
+        return request.GET.get(key, "") or request.COOKIES.get(key, "")
+
+    return {
+        "name": (request.POST.get("name") or "").strip(),
+        "phone": (request.POST.get("phone") or "").strip(),
+        "message": (request.POST.get("message") or "").strip(),
+        "source": (request.POST.get("source") or "").strip(),
+        "ip": request.META.get("REMOTE_ADDR"),
+        "referer": request.META.get("HTTP_REFERER", ""),
+        "host": request.get_host(),
+        "utm": {k: utm(k) for k in ("utm_source", "utm_medium", "utm_campaign", "utm_content", "utm_term")},
+    }
+
 
+def _check_lead(f: dict):
+    """None — можно сохранять, иначе (status, ошибка для XHR, текст для страницы)."""
     # троттлинг
-    ip = request.META.get("REMOTE_ADDR")
-    throttled, tmsg = _throttle_guard(ip, phone)
+    throttled, tmsg = _throttle_guard(f["ip"], f["phone"])
     if throttled:
-        if request.headers.get("x-requested-with") == "XMLHttpRequest":
-            return JsonResponse({"ok": False, "error": tmsg}, status=429)
-        messages.error(request, tmsg)
-        return redirect(reverse("index") + "#lead")
+        return 429, tmsg, tmsg
 
     # валидация телефона
     try:
-        ru_phone_validator(phone)
+        ru_phone_validator(f["phone"])
     except ValidationError as e:
-        if request.headers.get("x-requested-with") == "XMLHttpRequest":
-            return JsonResponse({"ok": False, "error": e.message}, status=400)
-        messages.error(request, "Неверный номер: " + e.message)
-        return redirect(reverse("index") + "#lead")
+        return 400, e.message, "Неверный номер: " + e.message
+    return None
+
+
+def _save_lead(f: dict) -> Lead:
+    # пишем в БД; в битрикс отправит воркер (manage.py bitrix_worker)
+    with transaction.atomic():
+        lead = Lead.objects.create(
+            name=f["name"],
+            phone=f["phone"],
+            message=f["message"],
+            utm_source=f["utm"]["utm_source"],
+            utm_medium=f["utm"]["utm_medium"],
+            utm_campaign=f["utm"]["utm_campaign"],
+            referer=f["referer"],
+            ip=f["ip"],
+            source=f["source"],
+        )
+        delivery.enqueue(
+            lead,
+            utm=f["utm"],
+            source=f["source"] or f"site:{f['host']}",
+            referer=f["referer"],
+        )
+    return lead
 
-    # собираем utm
-    utm = {
-        "utm_source":   request.GET.get("utm_source","")   or request.COOKIES.get("utm_source",""),
-        "utm_medium":   request.GET.get("utm_medium","")   or request.COOKIES.get("utm_medium",""),
-        "utm_campaign": request.GET.get("utm_campaign","") or request.COOKIES.get("utm_campaign",""),
-        "utm_content":  request.GET.get("utm_content","")  or request.COOKIES.get("utm_content",""),
-        "utm_term":     request.GET.get("utm_term","")     or request.COOKIES.get("utm_term",""),
-    }
 
-    # пишем в БД
-    lead = Lead.objects.create(
-        name=name,
-        phone=phone,
-        message=message,
-        utm_source=utm["utm_source"],
-        utm_medium=utm["utm_medium"],
-        utm_campaign=utm["utm_campaign"],
-        referer=request.META.get("HTTP_REFERER",""),
-        ip=ip,
-        source=src,
-    )
-
-    # пушим в битрикс (не роняем UX, если битра офнулась)
-    ok, err = send_lead_to_bitrix(
-        name=name,
-        phone=phone,
-        message=message,
-        utm=utm,
-        source=src or f"site:{request.get_host()}",
-        referer=request.META.get("HTTP_REFERER",""),
-    )
-    if not ok:
-        # добавим отметку в заметку лида (если есть поле)
-        try:
-            lead.admin_note = (lead.admin_note or "") + f"\n[BITRIX FAIL] {err}"
-            lead.save(update_fields=["admin_note"])
-        except Exception:
-            pass
-
-    if request.headers.get("x-requested-with") == "XMLHttpRequest":
-        return JsonResponse({"ok": True})
+def lead_submit(request):
+    if request.method != "POST":
+        return redirect(reverse("index") + "#lead")
 
-    messages.success(request, "Заявка принята. Перезвоним.")
-    return redirect(reverse("index") + "?success=1#lead")
+    # honeypot — молча прикидываемся успехом
+    if (request.POST.get("website") or "").strip():
+        return _lead_ok(request, "Заявка принята.")
+
+    fields = _lead_fields(request)
+    error = _check_lead(fields)
+    if error:
+        return _lead_error(request, *error)
+    _save_lead(fields)
+    return _lead_ok(request)
 
 
+@conditional_page("catalog")
 def catalog(request):
     q = (request.GET.get("q") or "").strip()
-    qs = Category.objects.filter(is_active=True)
-    if q:
-        qs = qs.filter(Q(title__icontains=q) | Q(slug__icontains=q))
-
-    qs = qs.order_by("order", "id")
-    paginator = Paginator(qs, 12)  # по 12 категорий на страницу
-    page_obj = paginator.get_page(request.GET.get("page"))
-    cta = LeadSection.objects.filter(is_active=True).order_by("order","id").first()
+    # полнотекстовый на Postgres, icontains на остальных (pages/search.py)
+    qs = search.search_categories(Category.objects.filter(is_active=True).defer("search_vector"), q)
+    if settings.CATALOG_PAGINATION == "keyset" and not q:
+        # поиск сортирует по релевантности — там ключа (order, id) нет, остаётся offset
+        page_obj = keyset.paginate(qs, request.GET.get("cursor"), 12, count_name="catalog")
+    else:
+        paginator = Paginator(qs, 12)  # по 12 категорий на страницу
+        page_obj = paginator.get_page(request.GET.get("page"))
     ctx = {
-        "cta": cta,
         "q": q,
         "page_obj": page_obj,
         "categories": page_obj.object_list,
         "meta_title": "Каталог — ULVIS",
         "meta_description": "Каталог категорий: кухни, шкафы, гардеробные, столы и другое. Индивидуальные проекты ULVIS.",
     }
-    ctx.update(get_contact_context())
     return render(request, "pages/catalog_list.html", ctx)
 
+@conditional_page("category_detail")
 def category_detail(request, slug):
-    cta = LeadSection.objects.filter(is_active=True).order_by("order","id").first()
     category = get_object_or_404(Category, slug=slug, is_active=True)
     photos = category.photos.filter(is_active=True).order_by("order","id")
     ctx = {
-        "cta": cta,
         "category": category,
         "photos": photos,
         "meta_title": category.meta_title or f"{category.title} — Каталог",
         "meta_description": category.meta_description or (category.description[:150] if category.description else ""),
     }
-    ctx.update(get_contact_context())
     return render(request, "pages/category_detail.html", ctx)
 
 
+@conditional_page("contacts")
 def contacts(request):
-    cta = LeadSection.objects.filter(is_active=True).order_by("order","id").first()
-    page = ContactPage.objects.filter(is_active=True).first()
-
-    tel_href = None
-    if page and page.phone:
-        # выкинуть всё кроме цифр
-        digits = re.sub(r"\D+", "", page.phone)
-        # нормализуем под РФ
-        if digits.startswith("8"):
-            digits = "7" + digits[1:]
-        if not digits.startswith("7"):
-            # если как-то вообще без кода — принудительно +7
-            digits = "7" + digits
-        tel_href = f"+{digits}"
+    content = get_content(request)
     ctx = {
-        "cta": cta,
-        "page": page,
-        "tel_href": tel_href,
+        "page": content.contact,
+        "tel_href": content.tel_href,
     }
-    ctx.update(get_contact_context())
     return render(request, "pages/contacts.html", ctx)
 
 
 
+@conditional_page("offer", forms=False)
 def offer_page(request):
     offer = OfferPage.objects.filter(is_active=True).first()
     if not offer or not offer.file:
         raise Http404("Файл оферты не найден")
 
-    return FileResponse(
-        offer.file.open("rb"),
-        as_attachment=False,  # если хочешь — True, чтобы сразу скачивался
-        filename=offer.file.name.split("/")[-1],
-    )
+    # за nginx — X-Accel-Redirect, в dev — FileResponse (pages/sendfile.py)
+    return sendfile.serve(offer.file, as_attachment=False)  # если хочешь — True, чтобы сразу скачивался
 
 
+@conditional_page("privacy", forms=False)
 def privacy_page(request, slug="privacy"):
     page = PrivacyPage.objects.filter(is_active=True, slug=slug).first()
     if not page:
         raise Http404("Политика не найдена")
     ctx = {"page": page}
-    ctx.update(get_contact_context())
     return render(request, "pages/privacy.html", ctx)
 